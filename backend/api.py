@@ -1,9 +1,75 @@
-from fastapi import FastAPI, UploadFile
+import asyncio
+import json
+import os
+import tarfile
+import tempfile
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from typing import List
 
-from cd.parser import parse_cd
-from validator.validate import validate_cd as real_validate_cd
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pyasn1.error import PyAsn1Error
 
-app = FastAPI()
+from cd.parser import parse_cd_tlv, unwrap_cd
+from cd.signature import get_signing_key_store, verify_cd_parts
+from config.define import api_batch_concurrency, api_batch_max_file_size, api_batch_max_total_size, \
+    cd_signing_keys_path
+from dcl.client import create_async_client
+from utils import metrics
+from validator.cache import cd_digest, dcl_data_version, get_result_cache, report_variant
+from validator.validate import dcl_query_paths, validate_cd_async
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 所有请求共享一个带连接池的DCL客户端
+    app.state.dcl_client = create_async_client()
+    # 配置了CD签名证书目录时校验签名，证书在启动时加载一次
+    app.state.signing_keys = get_signing_key_store(cd_signing_keys_path) if cd_signing_keys_path else None
+    # 相同的CD文件直接返回缓存的校验报告
+    app.state.result_cache = get_result_cache()
+    metrics.register_collector(_collect_cache_metrics)
+    yield
+    metrics.unregister_collector(_collect_cache_metrics)
+    await app.state.dcl_client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# 请求耗时按这些路径分别统计，其他路径合并为other
+_METRIC_PATHS = {"/status", "/metrics", "/validate_cd", "/validate_cd_batch"}
+
+
+def _collect_cache_metrics():
+    # 缓存命中数在各缓存对象中已有统计，输出/metrics时读取即可
+    requests = []
+    ratios = []
+    caches = [("dcl", app.state.dcl_client, ["hits", "stale_hits", "misses"]),
+              ("cd_result", app.state.result_cache, ["hits", "misses"])]
+    for cache, obj, fields in caches:
+        if not hasattr(obj, "hits"):
+            continue
+        counts = {field: getattr(obj, field) for field in fields}
+        requests.extend(({"cache": cache, "result": field}, count) for field, count in counts.items())
+        total = sum(counts.values())
+        ratios.append(({"cache": cache}, (total - counts["misses"]) / total if total else 0.0))
+    return [
+        ("cd_validator_cache_requests_total", "counter", "Cache lookups by result", requests),
+        ("cd_validator_cache_hit_ratio", "gauge", "Share of cache lookups served from the cache", ratios),
+    ]
+
+
+@app.middleware("http")
+async def record_request_duration(request: Request, call_next):
+    if not metrics.enabled():
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    path = request.url.path if request.url.path in _METRIC_PATHS else "other"
+    metrics.observe_request(path, time.perf_counter() - start)
+    return response
 
 
 @app.get("/status")
@@ -11,20 +77,194 @@ def get_status():
     return {"status": "ok"}
 
 
-@app.post("/validate_cd")
-async def validate_cd(file: UploadFile):
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus文本格式的指标，多进程部署时为处理本次请求的工作进程的数据"""
+    return PlainTextResponse(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def _cached_report(digest, variant, dcl_paths):
+    # 读取DCL数据版本与缓存的报告，都要查询SQLite，在线程中执行
+    dcl_version = dcl_data_version(app.state.dcl_client, dcl_paths)
+    return app.state.result_cache.get_report(digest, variant, dcl_version)
+
+
+def _store_report(digest, report_data, variant, dcl_paths):
+    # 校验时查询的DCL数据可能刚写入缓存，版本要在校验之后读取
+    dcl_version = dcl_data_version(app.state.dcl_client, dcl_paths)
+    app.state.result_cache.put_report(digest, report_data, variant, dcl_version)
+
+
+async def _validate_cd_file(cd_file_data):
     try:
-        cd = parse_cd(await file.read())
+        parts = unwrap_cd(cd_file_data)
+    except PyAsn1Error:
+        metrics.count_error("der_decode")
+        return {"error": "Failed to parse CD file"}
+
+    try:
+        cd = parse_cd_tlv(parts.econtent)
     except Exception as e:
+        metrics.count_error("parse")
         return {"error": str(e)}
 
-    if not cd:
-        return {"error": "Failed to parse CD file"}
+    # 报告按CD文件、校验选项与报告用到的DCL数据的版本缓存，命中时不需要校验签名与查询DCL
+    digest = cd_digest(cd_file_data)
+    variant = report_variant(signature=app.state.signing_keys is not None)
+    dcl_paths = dcl_query_paths(cd)
+    report_data = await asyncio.to_thread(_cached_report, digest, variant, dcl_paths)
+    if report_data is not None:
+        return report_data
 
-    report_data = real_validate_cd(cd)
+    try:
+        signature = verify_cd_parts(parts, app.state.signing_keys) if app.state.signing_keys else None
+    except Exception as e:
+        metrics.count_error("parse")
+        return {"error": str(e)}
+
+    report_data = await validate_cd_async(cd, app.state.dcl_client, signature=signature)
+    await asyncio.to_thread(_store_report, digest, report_data, variant, dcl_paths)
     return report_data
 
 
+@app.post("/validate_cd")
+async def validate_cd(file: UploadFile, timings: bool = False):
+    """校验上传的CD文件，timings为true时在报告中加入各阶段耗时（秒），命中结果缓存时只有total"""
+    cd_file_data = await file.read()
+    if not timings:
+        return await _validate_cd_file(cd_file_data)
+    with metrics.collect_timings() as stage_timings:
+        start = time.perf_counter()
+        report_data = await _validate_cd_file(cd_file_data)
+        stage_timings["total"] = time.perf_counter() - start
+    return {**report_data, "timings": stage_timings}
+
+
+# 上传文件超过这个大小时暂存到磁盘
+_SPOOL_MAX_SIZE = 1 << 20
+
+
+async def _detach_uploads(files):
+    # 处理函数返回后FastAPI会关闭上传的文件，而结果是在这之后流式返回的，需要自己保留一份
+    detached = []
+    for upload in files:
+        spooled = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE)
+        while chunk := await upload.read(_SPOOL_MAX_SIZE):
+            spooled.write(chunk)
+        detached.append((upload.filename, spooled))
+    return detached
+
+
+def _upload_entries(filename, file):
+    # zip与tar包展开为其中的各个文件，返回(名称, 声明的大小, 读取内容的函数)，读取函数须在取下一项之前调用
+    file.seek(0)
+    if zipfile.is_zipfile(file):
+        file.seek(0)
+        with zipfile.ZipFile(file) as archive:
+            for info in archive.infolist():
+                if not info.is_dir():
+                    def read(limit):
+                        with archive.open(info) as member_file:
+                            return member_file.read(limit)
+
+                    yield f"{filename}/{info.filename}", info.file_size, read
+        return
+    file.seek(0)
+    if tarfile.is_tarfile(file):
+        file.seek(0)
+        with tarfile.open(fileobj=file, mode="r:*") as archive:
+            for member in archive:
+                if member.isfile():
+                    yield f"{filename}/{member.name}", member.size, archive.extractfile(member).read
+        return
+    size = file.seek(0, os.SEEK_END)
+    file.seek(0)
+    yield filename, size, file.read
+
+
+def _iter_uploads(files, max_file_size=api_batch_max_file_size, max_total_size=api_batch_max_total_size):
+    """遍历(文件名, 文件对象)，zip与tar包展开为其中的各个文件，返回(名称, 文件内容, 错误)；每次只读取一个文件
+
+    超过max_file_size的文件不读取，内容为None并给出错误；所有文件解压后的总字节数（包括跳过的文件）超过max_total_size时
+    给出错误并停止。读取与解压是阻塞操作，在异步代码中应放到线程中执行。
+    """
+    remaining = max_total_size
+    for filename, file in files:
+        for name, size, read in _upload_entries(filename, file):
+            remaining -= size
+            if remaining < 0:
+                yield name, None, f"解压后的总大小超过上限{max_total_size}字节，其余文件未校验"
+                return
+            if size > max_file_size:
+                yield name, None, f"文件大小{size}字节超过上限{max_file_size}字节"
+                continue
+            # zip中声明的大小可能与实际不符，最多读取上限加一个字节
+            data = read(max_file_size + 1)
+            remaining -= max(0, len(data) - size)
+            if len(data) > max_file_size:
+                yield name, None, f"文件大小超过上限{max_file_size}字节"
+                continue
+            yield name, data, None
+
+
+async def _stream_batch(files):
+    # 同时校验与等待输出的文件数不超过api_batch_concurrency，有空位时才在线程中读取、解压下一个文件；
+    # 客户端断开连接时取消所有未完成的校验
+    semaphore = asyncio.Semaphore(api_batch_concurrency)
+    results = asyncio.Queue(maxsize=api_batch_concurrency)
+    tasks = set()
+
+    async def run(name, cd_file_data):
+        try:
+            try:
+                report = await _validate_cd_file(cd_file_data)
+            except Exception as e:
+                report = {"error": f"{type(e).__name__}: {e}"}
+            await results.put((name, report))
+        finally:
+            semaphore.release()
+
+    async def produce():
+        entries = _iter_uploads(files)
+        try:
+            while True:
+                await semaphore.acquire()
+                entry = await asyncio.to_thread(next, entries, None)
+                if entry is None:
+                    semaphore.release()
+                    break
+                name, cd_file_data, error = entry
+                if error is not None:
+                    semaphore.release()
+                    await results.put((name, {"error": error}))
+                    continue
+                task = asyncio.create_task(run(name, cd_file_data))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except Exception as e:
+            await results.put(("", {"error": f"{type(e).__name__}: {e}"}))
+        await asyncio.gather(*tasks)
+        await results.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while (item := await results.get()) is not None:
+            name, report = item
+            yield json.dumps({"file": name, "report": report}, ensure_ascii=False) + "\n"
+    finally:
+        producer.cancel()
+        for task in list(tasks):
+            task.cancel()
+        for _, file in files:
+            file.close()
+
+
+@app.post("/validate_cd_batch")
+async def validate_cd_batch(files: List[UploadFile]):
+    """批量校验，files可以是多个CD文件或zip/tar包，每完成一个文件返回一行JSON（NDJSON）"""
+    return StreamingResponse(_stream_batch(await _detach_uploads(files)), media_type="application/x-ndjson")
+
+
 if __name__ == "__main__":
     import uvicorn
 
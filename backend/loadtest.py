@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+import httpx
+
+from dcl.fake import FakeDclServer
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_load(url, cd_files, concurrency, duration):
+    """在duration秒内以concurrency个并发连接循环上传cd_files，返回统计结果"""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client, offset):
+        nonlocal errors
+        index = offset
+        while time.perf_counter() < deadline:
+            name, data = cd_files[index % len(cd_files)]
+            index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{url}/validate_cd", files={"file": (name, data)})
+                if response.status_code != 200 or "error" in response.json():
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(client, i) for i in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "throughput": round(count / elapsed, 1),
+        "p50_ms": round(latencies[count // 2] * 1000, 2) if count else None,
+        "p99_ms": round(latencies[min(count - 1, int(count * 0.99))] * 1000, 2) if count else None,
+    }
+
+
+def _wait_ready(url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程退出，返回码{process.returncode}")
+        try:
+            if httpx.get(f"{url}/status", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("等待服务启动超时")
+
+
+def run_with_workers(workers, cd_files, concurrency, duration, env):
+    """启动workers个工作进程的服务并压测，结束后正常关闭服务"""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    root = pathlib.Path(__file__).parents[1]
+    with tempfile.TemporaryDirectory() as cache_dir:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "backend.serve", "--port", str(port), "--workers", str(workers),
+             "--cache-dir", cache_dir, "--log-level", "warning"],
+            cwd=root, env=env,
+        )
+        try:
+            _wait_ready(url, process)
+            return asyncio.run(run_load(url, cd_files, concurrency, duration))
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure /validate_cd Throughput Against Worker Count")
+    parser.add_argument("cd_files", type=str, nargs="+", help="CD Files to upload in turn")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare")
+    parser.add_argument("-c", "--concurrency", type=int, default=32, help="Concurrent connections")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="Seconds per run")
+    parser.add_argument("--fixtures", type=str,
+                        help="Serve these DCL fixtures ({path: response} JSON) from a local fake DCL")
+    parser.add_argument("--dcl-latency", type=float, default=0.0, help="Extra delay of the fake DCL in seconds")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="Keep the CD result cache enabled, by default every request is validated again")
+    args = parser.parse_args()
+
+    cd_files = []
+    for path in args.cd_files:
+        with open(path, "rb") as f:
+            cd_files.append((os.path.basename(path), f.read()))
+
+    env = dict(os.environ)
+    if not args.result_cache:
+        env["CD_RESULT_CACHE_SIZE"] = "0"
+        env["CD_RESULT_CACHE_PATH"] = ""
+    fake = None
+    if args.fixtures:
+        with open(args.fixtures, encoding="utf-8") as f:
+            fake = FakeDclServer(json.load(f), latency=args.dcl_latency).start()
+        env["DCL_BASE_URL"] = fake.url
+
+    try:
+        baseline = None
+        for workers in args.workers:
+            result = run_with_workers(workers, cd_files, args.concurrency, args.duration, env)
+            baseline = baseline or result["throughput"]
+            result["speedup"] = round(result["throughput"] / baseline, 2) if baseline else None
+            print(json.dumps({"workers": workers, **result}), flush=True)
+    finally:
+        if fake:
+            fake.stop()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import pathlib
+import sys
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+import uvicorn
+
+from config import define as config
+from config.define import api_cache_dir, api_graceful_shutdown, api_host, api_port, api_workers
+
+
+def shared_cache_env(cache_dir):
+    """多个工作进程共享的缓存配置
+
+    DCL响应缓存与CD校验结果缓存都是WAL模式的SQLite文件，可以被多个进程同时读写，
+    这样一个进程查询过的DCL数据其他进程直接使用，不必各自预热。已设置的环境变量保持不变，设置为空时不启用该缓存。
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = {"DCL_CACHE_PATH": "dcl.db", "CD_RESULT_CACHE_PATH": "cd_result.db"}
+    return {name: os.path.join(cache_dir, file) for name, file in paths.items() if name not in os.environ}
+
+
+def serve(host=api_host, port=api_port, workers=api_workers, cache_dir=api_cache_dir,
+          graceful_shutdown=api_graceful_shutdown, log_level="info"):
+    """启动backend.api，workers大于1时使用多个进程
+
+    工作进程在启动时读取环境变量，因此共享缓存的配置在这里写入os.environ后才启动uvicorn。
+    收到SIGINT/SIGTERM后停止接受新连接，最多等待graceful_shutdown秒让进行中的请求完成。
+    """
+    if cache_dir:
+        os.environ.update(shared_cache_env(cache_dir))
+        # 单个工作进程时uvicorn在当前进程中加载应用，此时config.define已经导入，需要同步更新
+        config.dcl_cache_path = os.environ["DCL_CACHE_PATH"] or None
+        config.cd_result_cache_path = os.environ["CD_RESULT_CACHE_PATH"] or None
+    uvicorn.run(
+        "backend.api:app",
+        host=host,
+        port=port,
+        workers=workers,
+        timeout_graceful_shutdown=graceful_shutdown,
+        log_level=log_level,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve The CD Validation API")
+    parser.add_argument("--host", type=str, default=api_host)
+    parser.add_argument("--port", type=int, default=api_port)
+    parser.add_argument("-w", "--workers", type=int, default=api_workers, help="Number of worker processes")
+    parser.add_argument("--cache-dir", type=str, default=api_cache_dir,
+                        help="Directory of the SQLite caches shared by the workers, empty to disable")
+    parser.add_argument("--graceful-shutdown", type=float, default=api_graceful_shutdown,
+                        help="Seconds to wait for in-flight requests on shutdown")
+    parser.add_argument("--log-level", type=str, default="info")
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.cache_dir, args.graceful_shutdown, args.log_level)
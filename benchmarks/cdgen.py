@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""生成用于性能测试的CD文件与对应的DCL数据
+
+CD内容用TLVWriter编码，再用固定的测试密钥签名封装为CMS SignedData，结构与CSA签发的CD相同。
+同样的参数总是生成相同的文件（ECDSA签名除外），便于在不同版本之间比较。
+"""
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from pyasn1.codec.der.encoder import encode as der_encoder
+from pyasn1.type import tag, univ
+from pyasn1_modules import rfc5652
+
+from chip.tlv import TLVWriter, uint
+from dcl.export import ROOT_CERTIFICATES_PATH, certificates_path, compliance_info_path, model_path, vendor_info_path
+
+_SHA256 = "2.16.840.1.101.3.4.2.1"
+_ECDSA_WITH_SHA256 = "1.2.840.10045.4.3.2"
+_ID_DATA = "1.2.840.113549.1.7.1"
+
+# 规模：(PID数量, 授权PAA数量)，CD规范中PID最多100个，授权PAA最多10个
+PROFILES = {
+    "small": (1, 0),
+    "medium": (10, 3),
+    "large": (100, 10),
+}
+
+
+def signing_key(seed=1):
+    return ec.derive_private_key(seed, ec.SECP256R1())
+
+
+def subject_key_id(public_key):
+    """按RFC 5280 4.2.1.2方法1计算SKID（公钥的SHA-1）"""
+    return hashlib.sha1(public_key.public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint)).digest()
+
+
+def paa_key_id(index):
+    return hashlib.sha1(f"paa-{index}".encode()).digest()
+
+
+def cd_content(vendor_id=0xFFF1, product_ids=(0x8000,), certificate_id="CSA00000SWC00000-00", version_number=1,
+               paa_key_ids=None, origin=None):
+    """CD的TLV结构，可直接传给TLVWriter.put"""
+    content = {
+        0: uint(1),
+        1: uint(vendor_id),
+        2: [uint(pid) for pid in product_ids],
+        3: uint(0x0016),
+        4: certificate_id,
+        5: uint(0),
+        6: uint(0),
+        7: uint(version_number),
+        8: uint(0),
+    }
+    if origin is not None:
+        content[9] = uint(origin[0])
+        content[10] = uint(origin[1])
+    if paa_key_ids:
+        content[11] = [bytes(key_id) for key_id in paa_key_ids]
+    return content
+
+
+def encode_cd(content):
+    writer = TLVWriter()
+    writer.put(None, content)
+    return bytes(writer.encoding)
+
+
+def _signed_attributes(cd_tlv):
+    # RFC 5652 5.3：有签名属性时至少包含内容类型与消息摘要
+    signed_attrs = rfc5652.SignedAttributes().subtype(
+        implicitTag=tag.Tag(tag.tagClassContext, tag.tagFormatConstructed, 0))
+    for attr_type, value in ((rfc5652.id_contentType, univ.ObjectIdentifier(_ID_DATA)),
+                             (rfc5652.id_messageDigest, univ.OctetString(hashlib.sha256(cd_tlv).digest()))):
+        attribute = rfc5652.Attribute()
+        attribute["attrType"] = attr_type
+        attribute["attrValues"].append(univ.Any(der_encoder(value)))
+        signed_attrs.append(attribute)
+    return signed_attrs
+
+
+def wrap_cms(cd_tlv, key=None, signed_attributes=False):
+    """用key签名cd_tlv并封装为CMS ContentInfo（DER），signerInfo以SKID标识签名证书
+
+    signed_attributes为True时带内容类型与消息摘要两个签名属性，签名覆盖属性集合而不是cd_tlv。
+    """
+    key = key if key is not None else signing_key()
+
+    signed_data = rfc5652.SignedData()
+    signed_data["version"] = 3
+    digest_algorithm = rfc5652.DigestAlgorithmIdentifier()
+    digest_algorithm["algorithm"] = univ.ObjectIdentifier(_SHA256)
+    signed_data["digestAlgorithms"].append(digest_algorithm)
+    signed_data["encapContentInfo"]["eContentType"] = univ.ObjectIdentifier(_ID_DATA)
+    signed_data["encapContentInfo"]["eContent"] = cd_tlv
+
+    signer_info = rfc5652.SignerInfo()
+    signer_info["version"] = 3
+    signer_info["sid"]["subjectKeyIdentifier"] = rfc5652.SubjectKeyIdentifier(subject_key_id(key.public_key())).subtype(
+        implicitTag=tag.Tag(tag.tagClassContext, tag.tagFormatSimple, 0))
+    signer_info["digestAlgorithm"]["algorithm"] = univ.ObjectIdentifier(_SHA256)
+    signer_info["signatureAlgorithm"]["algorithm"] = univ.ObjectIdentifier(_ECDSA_WITH_SHA256)
+    signed_data_bytes = cd_tlv
+    if signed_attributes:
+        signer_info["signedAttrs"] = _signed_attributes(cd_tlv)
+        # 签名覆盖按SET OF编码的属性集合
+        signed_data_bytes = b"\x31" + der_encoder(signer_info["signedAttrs"])[1:]
+    signer_info["signature"] = key.sign(signed_data_bytes, ec.ECDSA(hashes.SHA256()))
+    signed_data["signerInfos"].append(signer_info)
+
+    content_info = rfc5652.ContentInfo()
+    content_info["contentType"] = rfc5652.id_signedData
+    content_info["content"] = der_encoder(signed_data)
+    return der_encoder(content_info)
+
+
+def generate_cds(profile="small", count=1, vendor_id=0xFFF1, key=None):
+    """生成count个profile规模的CD，返回[(文件名, CD文件内容, CD的TLV结构)]，各CD的PID与证书ID不同"""
+    product_count, paa_count = PROFILES[profile]
+    key = key if key is not None else signing_key()
+    contents = []
+    for i in range(count):
+        first_pid = 0x8000 + i * product_count
+        contents.append(cd_content(
+            vendor_id=vendor_id,
+            product_ids=range(first_pid, first_pid + product_count),
+            certificate_id=f"CSA{i:05d}SWC{product_count:05d}-{paa_count:02d}",
+            paa_key_ids=[paa_key_id(j) for j in range(paa_count)],
+        ))
+    # 所有CD一次编码到同一个缓冲区中，再按偏移切分
+    writer = TLVWriter()
+    offsets = writer.putMany(contents) + [len(writer.encoding)]
+    cds = []
+    for i, content in enumerate(contents):
+        cd_tlv = bytes(writer.encoding[offsets[i]:offsets[i + 1]])
+        cds.append((f"cd_{profile}_{i}.der", wrap_cms(cd_tlv, key), content))
+    return cds
+
+
+def _key_id_text(key_id):
+    return ":".join(f"{b:02X}" for b in key_id)
+
+
+def dcl_fixtures(contents):
+    """生成的CD都能通过校验的DCL数据，格式为FakeDclServer的fixtures（{路径: 响应}）"""
+    fixtures = {}
+    roots = []
+    for content in contents:
+        vid, pid, version = int(content[1]), int(content[2][-1]), int(content[7])
+        fixtures[vendor_info_path(vid)] = {"vendorInfo": {"vendorID": vid, "vendorName": "Benchmark Vendor"}}
+        fixtures[model_path(vid, pid)] = {"model": {
+            "vid": vid, "pid": pid, "productName": "Benchmark Product", "productLabel": "Benchmark Label"}}
+        fixtures[compliance_info_path(vid, pid, version)] = {"complianceInfo": {
+            "vid": vid, "pid": pid, "softwareVersion": version, "certificationType": "matter",
+            "cDCertificateId": content[4]}}
+        for key_id in content.get(11, ()):
+            subject, key_id_text = f"PAA-{key_id.hex()[:8]}", _key_id_text(key_id)
+            if certificates_path(subject, key_id_text) in fixtures:
+                continue
+            roots.append({"subject": subject, "subjectKeyId": key_id_text})
+            fixtures[certificates_path(subject, key_id_text)] = {"approvedCertificates": {
+                "subject": subject, "subjectKeyId": key_id_text,
+                "certs": [{"subjectKeyId": key_id_text, "subjectAsText": f"CN=Benchmark {subject}"}]}}
+    fixtures[ROOT_CERTIFICATES_PATH] = {"approvedRootCertificates": {"certs": roots}}
+    return fixtures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate Synthetic CD Files And Matching DCL Fixtures")
+    parser.add_argument("output_dir", type=str)
+    parser.add_argument("--profile", type=str, choices=sorted(PROFILES), default="small")
+    parser.add_argument("-n", "--count", type=int, default=1, help="Number of CD files")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cds = generate_cds(args.profile, args.count)
+    for name, data, _ in cds:
+        with open(os.path.join(args.output_dir, name), "wb") as f:
+            f.write(data)
+    with open(os.path.join(args.output_dir, "dcl_fixtures.json"), "w", encoding="utf-8") as f:
+        json.dump(dcl_fixtures([content for _, _, content in cds]), f, indent=4)
+    print(f"{len(cds)} CD files written to {args.output_dir}")
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""TLV编解码、CD解析与端到端校验的性能测试
+
+    python benchmarks/run.py run -o results.json                 # 运行并保存结果
+    python benchmarks/run.py run -o new.json --baseline old.json  # 运行后与之前的结果比较
+    python benchmarks/run.py compare old.json new.json            # 比较两次结果
+
+微基准用timeit自动确定每轮次数，取多轮中每次调用耗时的中位数与最小值。端到端测试在本地FakeDclServer上
+校验生成的CD，latency模拟DCL的网络延迟，记录平均每个CD的耗时。冷启动测试每次启动新的解释器，以--offline
+解析一个CD，命令行比空解释器多出的启动耗时超过预算时返回码为1。比较时中位数变慢超过阈值的项目视为性能回退，
+返回码为1。
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from prettytable import PrettyTable
+
+from benchmarks.cdgen import PROFILES, dcl_fixtures, generate_cds
+from cd import query as cd_query
+from cd.define import CD_SCHEMA
+from cd.parser import parse_cd
+from chip.tlv import TLVReader, TLVWriter, backend, useBackend
+from dcl.client import AsyncDclClient, DclClient
+from dcl.fake import FakeDclServer
+from validator.validate import validate_cd, validate_cd_async
+
+
+def measure(func, repeat=5):
+    """func每次调用的耗时（秒）"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return {"median": statistics.median(times), "min": min(times), "number": number, "repeat": repeat}
+
+
+# tlv_writer_put_many每次编码的CD数量
+_PUT_MANY_RECORDS = 100
+
+
+def micro_benchmarks(profiles, repeat=5):
+    results = {}
+    for profile in profiles:
+        name, data, content = generate_cds(profile)[0]
+        writer = TLVWriter()
+        writer.put(None, content)
+        cd_tlv = bytes(writer.encoding)
+
+        records = [content] * _PUT_MANY_RECORDS
+
+        def tlv_writer_put():
+            TLVWriter().put(None, content)
+
+        def tlv_writer_put_many():
+            TLVWriter().putMany(records)
+
+        results[f"tlv_reader_get[{profile}]"] = measure(lambda: TLVReader(cd_tlv).get(), repeat)
+        results[f"tlv_schema_decode[{profile}]"] = measure(lambda: CD_SCHEMA.decode(cd_tlv), repeat)
+        results[f"tlv_writer_put[{profile}]"] = measure(tlv_writer_put, repeat)
+        result = measure(tlv_writer_put_many, repeat)
+        # 与tlv_writer_put一样记录每个CD的耗时
+        result.update(median=result["median"] / len(records), min=result["min"] / len(records))
+        results[f"tlv_writer_put_many[{profile}]"] = result
+        results[f"parse_cd[{profile}]"] = measure(lambda: parse_cd(data), repeat)
+
+        def parse_cd_lazy():
+            # 按需解码面向的场景：只读取vendor_id与product_id_array
+            cd = parse_cd(data, lazy=True)
+            return cd.vendor_id, cd.product_id_array
+
+        results[f"parse_cd_lazy[{profile}]"] = measure(parse_cd_lazy, repeat)
+    return results
+
+
+class _ClientQuery:
+    # validate_cd需要的dcl对象，查询时使用指定的客户端而不是进程内共享的客户端
+    def __init__(self, client):
+        self.client = client
+
+    def query_vendor_info(self, cd):
+        return cd_query.query_vendor_info(cd, self.client)
+
+    def query_model_info(self, cd):
+        return cd_query.query_model_info(cd, self.client)
+
+    def query_compliance_info(self, cd):
+        return cd_query.query_compliance_info(cd, self.client)
+
+
+def _check_report(name, report):
+    # 生成的CD与DCL数据一致，校验不通过说明测试环境有问题，此时的耗时没有意义
+    if not report["validator"]["is_valid"]:
+        raise RuntimeError(f"{name}校验失败:{report['validator']}")
+
+
+def _per_cd(run, count, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) / count)
+    return {"median": statistics.median(times), "min": min(times), "number": count, "repeat": repeat}
+
+
+async def _per_cd_async(run, count, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await run()
+        times.append((time.perf_counter() - start) / count)
+    return {"median": statistics.median(times), "min": min(times), "number": count, "repeat": repeat}
+
+
+def end_to_end_benchmarks(profiles, latency=0.0, count=20, repeat=3):
+    """在本地FakeDclServer上依次校验每种规模的count个CD，同步与异步客户端各一组"""
+    # 每种规模使用不同的厂商ID，避免PID重复
+    cds = {profile: generate_cds(profile, count, vendor_id=0xFFF1 - i) for i, profile in enumerate(profiles)}
+    fixtures = dcl_fixtures(content for profile_cds in cds.values() for _, _, content in profile_cds)
+    results = {}
+    with FakeDclServer(fixtures, latency=latency) as server:
+        client = DclClient(base_url=server.url)
+        dcl = _ClientQuery(client)
+
+        async def run_async(profile_cds):
+            # 与同步客户端一样整组测试共用一个客户端与连接池，先校验一遍建立连接
+            async with AsyncDclClient(base_url=server.url) as async_client:
+                async def run():
+                    for name, data, _ in profile_cds:
+                        _check_report(name, await validate_cd_async(parse_cd(data), async_client))
+
+                await run()
+                return await _per_cd_async(run, count, repeat)
+
+        for profile, profile_cds in cds.items():
+            def run_sync():
+                for name, data, _ in profile_cds:
+                    _check_report(name, validate_cd(parse_cd(data), dcl))
+
+            run_sync()
+            results[f"validate_cd[{profile}]"] = _per_cd(run_sync, count, repeat)
+            results[f"validate_cd_async[{profile}]"] = asyncio.run(run_async(profile_cds))
+        client.close()
+    return results
+
+
+# 命令行以--offline解析CD时，比空解释器（python -c pass）多出的冷启动耗时上限（秒）
+COLD_START_BUDGET = 0.1
+
+
+def _per_process(command, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=pathlib.Path(__file__).parents[1], stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return {"median": statistics.median(times), "min": min(times), "number": 1, "repeat": repeat}
+
+
+def cold_start_benchmarks(repeat=20):
+    """空解释器与命令行只解析CD（--offline --text）的启动耗时，每次启动新的进程"""
+    _, data, _ = generate_cds("small")[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        cd_file = os.path.join(tmp, "cd.der")
+        with open(cd_file, "wb") as f:
+            f.write(data)
+        return {
+            "python_startup": _per_process([sys.executable, "-c", "pass"], repeat),
+            "cli_cold_start[offline]": _per_process(
+                [sys.executable, "-m", "validator.validate", "--offline", "--text", cd_file], repeat),
+        }
+
+
+def cold_start_overhead(results):
+    """命令行比空解释器多出的启动耗时（中位数），没有冷启动测试结果时返回None"""
+    results = results["results"]
+    if "cli_cold_start[offline]" not in results or "python_startup" not in results:
+        return None
+    return results["cli_cold_start[offline]"]["median"] - results["python_startup"]["median"]
+
+
+def run(profiles, latency=0.0, count=20, repeat=5, micro=True, end_to_end=True, cold_start=True):
+    results = {}
+    if micro:
+        results.update(micro_benchmarks(profiles, repeat))
+    if end_to_end:
+        results.update(end_to_end_benchmarks(profiles, latency, count, min(repeat, 3)))
+    if cold_start:
+        results.update(cold_start_benchmarks(max(repeat, 20)))
+    return {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "tlv_backend": backend(),
+            "dcl_latency": latency,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    """比较两次结果的中位数，返回(各项[(名称, 原耗时, 新耗时, 变化比例)], 回退的名称列表)"""
+    rows = []
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        change = result["median"] / base["median"] - 1
+        rows.append((name, base["median"], result["median"], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def _format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} us"
+    return f"{seconds * 1e3:.2f} ms"
+
+
+def print_results(results):
+    table = PrettyTable()
+    table.field_names = ["Benchmark", "Median", "Min"]
+    table.align = "r"
+    table.align["Benchmark"] = "l"
+    for name, result in results["results"].items():
+        table.add_row([name, _format_time(result["median"]), _format_time(result["min"])])
+    print(table)
+
+
+def print_comparison(rows, regressions):
+    table = PrettyTable()
+    table.field_names = ["Benchmark", "Baseline", "Current", "Change"]
+    table.align = "r"
+    table.align["Benchmark"] = "l"
+    for name, base, current, change in rows:
+        marker = " !" if name in regressions else ""
+        table.add_row([name, _format_time(base), _format_time(current), f"{change:+.1%}{marker}"])
+    print(table)
+    if regressions:
+        print(f"{len(regressions)}项性能回退: {', '.join(regressions)}")
+
+
+def _load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark TLV Codec, CD Parsing And Validation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("-o", "--output", type=str, help="Save the results to this JSON file")
+    run_parser.add_argument("--baseline", type=str, help="Compare with earlier results")
+    run_parser.add_argument("--profiles", type=str, nargs="+", choices=sorted(PROFILES), default=list(PROFILES))
+    run_parser.add_argument("--backend", type=str, choices=["python", "compiled"],
+                            help="TLV codec backend, defaults to the compiled one when available")
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timing rounds per benchmark")
+    run_parser.add_argument("--skip-micro", action="store_true", help="Only run the end-to-end benchmarks")
+    run_parser.add_argument("--skip-e2e", action="store_true", help="Only run the micro benchmarks")
+    run_parser.add_argument("--skip-cold-start", action="store_true", help="Skip the CLI cold start benchmark")
+    run_parser.add_argument("--cold-start-budget", type=float, default=COLD_START_BUDGET,
+                            help="Allowed CLI startup time in seconds on top of a bare interpreter")
+    run_parser.add_argument("--count", type=int, default=20, help="CD files per profile in end-to-end runs")
+    run_parser.add_argument("--dcl-latency", type=float, default=0.0, help="Delay of the fake DCL in seconds")
+    run_parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown counted as regression")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("current", type=str)
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Slowdown counted as regression")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.backend:
+            useBackend(args.backend)
+        current = run(args.profiles, args.dcl_latency, args.count, args.repeat, not args.skip_micro,
+                      not args.skip_e2e, not args.skip_cold_start)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(current, f, indent=4)
+        print_results(current)
+        baseline = _load(args.baseline) if args.baseline else None
+    else:
+        baseline, current = _load(args.baseline), _load(args.current)
+
+    failed = False
+    overhead = cold_start_overhead(current) if args.command == "run" else None
+    if overhead is not None:
+        print(f"命令行冷启动比空解释器多{_format_time(overhead)}，预算{_format_time(args.cold_start_budget)}")
+        failed = overhead > args.cold_start_budget
+    if baseline is not None:
+        rows, regressions = compare(baseline, current, args.threshold)
+        print_comparison(rows, regressions)
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
@@ -2,10 +2,13 @@ import json
 import os
 import pathlib
 import sys
+import threading
+from array import array
 
-sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
 
-from prettytable import PrettyTable
+from chip.tlv.schema import Array, ByteString, Field, Structure, TLVSchemaError, UnsignedInt, Utf8String
 
 """
 参考自：
@@ -14,24 +17,24 @@ from prettytable import PrettyTable
 """
 
 
-class CertificationElements:
-    def __init__(self):
-        self.format_version = 0
-        self.vendor_id = 0
-        self.product_id_array = []
-        self.product_ids_count = 0
-        self.device_type_id = 0
-        self.certificate_id = ""
-        self.security_level = 0
-        self.security_info = 0
-        self.version_number = 0
-        self.certification_type = 0
-        self.origin_vid = 0
-        self.origin_pid = 0
-        self.paa_authority_list = []
-        self.paa_authority_count = 0
-
-        self._paa_authority_list_name = []
+class _CertificationElementsBase:
+    """CertificationElements与LazyCertificationElements共用的只读限制与输出，字段由子类提供"""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"CertificationElements为只读对象，不能修改{name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"CertificationElements为只读对象，不能删除{name}")
+
+    @property
+    def product_ids_count(self):
+        return len(self.product_id_array)
+
+    @property
+    def paa_authority_count(self):
+        return len(self.paa_authority_list)
 
     def __str__(self):
         product_ids_str = ", ".join(f"{pid} (0x{pid:X})" for pid in self.product_id_array)
@@ -66,7 +69,10 @@ class CertificationElements:
 
         return output
 
-    def to_ascii_table(self, alignment='l'):
+    def to_ascii_table(self, alignment='l', paa_names=()):
+        """paa_names为与paa_authority_list对应的PAA名称（validator.validate.map_paa_with_name的结果），未知的为None"""
+        from prettytable import PrettyTable
+
         table = PrettyTable()
         table.field_names = ["Element", "Raw Value", "Pretty Value"]
 
@@ -89,11 +95,9 @@ class CertificationElements:
             table.add_row(["DAC Origin Product ID", self.origin_pid, f"0x{self.origin_pid:X}"])
 
         if self.paa_authority_count > 0:
-            for idx, paa in enumerate(self.paa_authority_list, ):
-                if idx < len(self._paa_authority_list_name):
-                    table.add_row([f"Authorized PAA {idx + 1}", paa.hex().upper(), self._paa_authority_list_name[idx]])
-                else:
-                    table.add_row([f"Authorized PAA {idx + 1}", paa.hex().upper(), ""])
+            for idx, paa in enumerate(self.paa_authority_list):
+                name = paa_names[idx] if idx < len(paa_names) else None
+                table.add_row([f"Authorized PAA {idx + 1}", paa.hex().upper(), name or ""])
             table.add_row(["Authorized PAA List Count", self.paa_authority_count, f"0x{self.paa_authority_count:X}"])
 
         if alignment == 'c':
@@ -103,5 +107,163 @@ class CertificationElements:
 
         return table
 
-    def append_paa_authority_list_name(self, paa_name):
-        self._paa_authority_list_name.append(paa_name)
+
+class CertificationElements(_CertificationElementsBase):
+    """CD内容，创建后只读
+
+    使用__slots__减少内存占用，product_id_array以array('H')保存，便于同时在内存中保留大量CD。
+    """
+
+    __slots__ = (
+        "format_version",
+        "vendor_id",
+        "product_id_array",
+        "device_type_id",
+        "certificate_id",
+        "security_level",
+        "security_info",
+        "version_number",
+        "certification_type",
+        "origin_vid",
+        "origin_pid",
+        "paa_authority_list",
+    )
+
+    def __init__(self, format_version=0, vendor_id=0, product_id_array=(), device_type_id=0, certificate_id="",
+                 security_level=0, security_info=0, version_number=0, certification_type=0, origin_vid=0,
+                 origin_pid=0, paa_authority_list=()):
+        _set = object.__setattr__
+        _set(self, "format_version", format_version)
+        _set(self, "vendor_id", vendor_id)
+        _set(self, "product_id_array", array("H", product_id_array))
+        _set(self, "device_type_id", device_type_id)
+        _set(self, "certificate_id", certificate_id)
+        _set(self, "security_level", security_level)
+        _set(self, "security_info", security_info)
+        _set(self, "version_number", version_number)
+        _set(self, "certification_type", certification_type)
+        _set(self, "origin_vid", origin_vid)
+        _set(self, "origin_pid", origin_pid)
+        _set(self, "paa_authority_list", tuple(paa_authority_list))
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in CertificationElements.__slots__}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+
+# CD 中各字段的 TLV context tag 与缺省值
+CD_FIELD_TAGS = {
+    "format_version": (0, None),
+    "vendor_id": (1, None),
+    "product_id_array": (2, None),
+    "device_type_id": (3, None),
+    "certificate_id": (4, None),
+    "security_level": (5, None),
+    "security_info": (6, None),
+    "version_number": (7, None),
+    "certification_type": (8, None),
+    "origin_vid": (9, 0),
+    "origin_pid": (10, 0),
+    "paa_authority_list": (11, ()),
+}
+
+
+# CD的TLV结构（Matter规范6.3.1），解码时按字段宽度检查取值范围，缺少必选字段或类型不符时抛出TLVSchemaError
+CD_SCHEMA = Structure([
+    Field(0, "format_version", UnsignedInt(maximum=0xFF)),
+    Field(1, "vendor_id", UnsignedInt(maximum=0xFFFF)),
+    Field(2, "product_id_array", Array(UnsignedInt(maximum=0xFFFF), minCount=1, maxCount=100, typecode="H")),
+    Field(3, "device_type_id", UnsignedInt(maximum=0xFFFFFFFF)),
+    Field(4, "certificate_id", Utf8String(minLength=19, maxLength=19)),
+    Field(5, "security_level", UnsignedInt(maximum=0xFF)),
+    Field(6, "security_info", UnsignedInt(maximum=0xFFFF)),
+    Field(7, "version_number", UnsignedInt(maximum=0xFFFF)),
+    Field(8, "certification_type", UnsignedInt(maximum=0xFF)),
+    Field(9, "origin_vid", UnsignedInt(maximum=0xFFFF), optional=True, default=0),
+    Field(10, "origin_pid", UnsignedInt(maximum=0xFFFF), optional=True, default=0),
+    Field(11, "paa_authority_list", Array(ByteString(minLength=20, maxLength=20), maxCount=10), optional=True,
+          default=()),
+], factory=CertificationElements)
+
+
+def _lazy_field(name):
+    default = CD_FIELD_TAGS[name][1]
+    convert = _LAZY_FIELD_CONVERTERS.get(name)
+
+    def getter(self):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        value = self._decode(name, default)
+        if convert is not None:
+            value = convert(value)
+        self._values[name] = value
+        return value
+
+    return property(getter, doc=f"TLV tag {CD_FIELD_TAGS[name][0]}, decoded on first access")
+
+
+# 与CertificationElements.__init__中的转换保持一致，product_id_array由CD_SCHEMA直接解码为array('H')
+_LAZY_FIELD_CONVERTERS = {
+    "paa_authority_list": tuple,
+}
+
+
+class LazyCertificationElements(_CertificationElementsBase):
+    """按需解码的CertificationElements
+
+    构造时不做任何解码，第一次访问字段时用CD_SCHEMA的字段解码器按编码顺序解码到该字段为止并缓存，
+    之后的字段在再次访问时从上次停下的位置继续。适用于只需要vendor_id/product_id_array等靠前少数字段的场景。
+    格式错误（包括缺少必选字段）在访问到相应位置时才抛出TLVSchemaError，之后访问未解码的字段会再次抛出同一错误。
+    """
+
+    __slots__ = ("_cd_tlv", "_members", "_values", "_lock", "_error")
+
+    def __init__(self, cd_tlv):
+        _set = object.__setattr__
+        _set(self, "_cd_tlv", bytes(cd_tlv))
+        _set(self, "_members", CD_SCHEMA.iterMembers(self._cd_tlv))
+        _set(self, "_values", {})
+        _set(self, "_lock", threading.Lock())
+        _set(self, "_error", None)
+
+    def _decode(self, name, default):
+        # 同一对象可能在多个线程中使用，生成器不能并发推进
+        with self._lock:
+            if name in self._values:
+                return self._values[name]
+            if self._error is not None:
+                raise self._error
+            try:
+                for member, value in self._members:
+                    if member == name:
+                        return value
+                    convert = _LAZY_FIELD_CONVERTERS.get(member)
+                    self._values[member] = convert(value) if convert is not None else value
+            except TLVSchemaError as e:
+                object.__setattr__(self, "_error", e)
+                raise
+            return default
+
+    def __getstate__(self):
+        return {"_cd_tlv": self._cd_tlv}
+
+    def __setstate__(self, state):
+        LazyCertificationElements.__init__(self, state["_cd_tlv"])
+
+    format_version = _lazy_field("format_version")
+    vendor_id = _lazy_field("vendor_id")
+    product_id_array = _lazy_field("product_id_array")
+    device_type_id = _lazy_field("device_type_id")
+    certificate_id = _lazy_field("certificate_id")
+    security_level = _lazy_field("security_level")
+    security_info = _lazy_field("security_info")
+    version_number = _lazy_field("version_number")
+    certification_type = _lazy_field("certification_type")
+    origin_vid = _lazy_field("origin_vid")
+    origin_pid = _lazy_field("origin_pid")
+    paa_authority_list = _lazy_field("paa_authority_list")
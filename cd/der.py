@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""按tag/长度直接定位CD文件（CMS SignedData）中的eContent与signerInfos
+
+pyasn1按schema解码整个ContentInfo/SignedData开销很大，而解析CD只需要其中的eContent。
+这里按下面的结构检查各元素的tag、长度（必须是最短编码，各层内容必须正好在长度所示位置结束）、contentType
+（id-signedData）与eContentType（id-data），signerInfos只检查各SignerInfo成员的tag与DER结构，不解码算法等字段。
+带certificates或crls的文件以及其他不符合预期的数据都抛出DerError，调用方可以退回pyasn1完整解码。
+
+    ContentInfo ::= SEQUENCE { contentType OID, content [0] EXPLICIT SignedData }
+    SignedData ::= SEQUENCE { version, digestAlgorithms SET, encapContentInfo, [0] certificates, [1] crls,
+                              signerInfos SET }
+    EncapsulatedContentInfo ::= SEQUENCE { eContentType OID, eContent [0] EXPLICIT OCTET STRING }
+    SignerInfo ::= SEQUENCE { version, sid, digestAlgorithm, [0] IMPLICIT signedAttrs OPTIONAL, signatureAlgorithm,
+                              signature OCTET STRING, [1] IMPLICIT unsignedAttrs OPTIONAL }
+
+corpus/下是用benchmarks/cdgen.py生成的几个CD（包括一个带签名属性的），python cd/der.py不带参数时对其及其变形做差异检查。
+"""
+import argparse
+import os
+import pathlib
+import sys
+from collections import namedtuple
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_OID = 0x06
+_SEQUENCE = 0x30
+_SET = 0x31
+_CONTEXT_0 = 0xA0
+_CONTEXT_1 = 0xA1
+_CONTEXT_0_PRIMITIVE = 0x80
+
+# OID的内容编码
+_ID_SIGNED_DATA = bytes.fromhex("2A864886F70D010702")    # 1.2.840.113549.1.7.2
+_ID_DATA = bytes.fromhex("2A864886F70D010701")           # 1.2.840.113549.1.7.1
+
+_CORPUS_DIR = pathlib.Path(__file__).parent / "corpus"
+
+ID_DATA = "1.2.840.113549.1.7.1"
+
+# econtent_type为eContentType的点分形式，快速路径只接受id-data
+SignedDataParts = namedtuple("SignedDataParts", ["econtent", "signer_infos", "econtent_type"])
+
+
+class DerError(ValueError):
+    pass
+
+
+def _header(buf, pos, end):
+    """读取pos处元素的头部，返回(tag, 内容起始位置, 内容结束位置)"""
+    if pos + 2 > end:
+        raise DerError(f"位置{pos}处数据不完整")
+    tag = buf[pos]
+    if tag & 0x1F == 0x1F:
+        raise DerError(f"位置{pos}处为多字节tag")
+    length = buf[pos + 1]
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7F
+        if count == 0 or count > 4 or pos + count > end:
+            raise DerError(f"位置{pos - 1}处长度编码无效")
+        length = int.from_bytes(buf[pos:pos + count], "big")
+        if length < 0x80 or buf[pos] == 0:
+            raise DerError(f"位置{pos - 1}处长度不是最短编码")
+        pos += count
+    if pos + length > end:
+        raise DerError(f"位置{pos}处长度{length}超出数据范围")
+    return tag, pos, pos + length
+
+
+def _expect(buf, pos, end, tag):
+    actual, start, stop = _header(buf, pos, end)
+    if actual != tag:
+        raise DerError(f"位置{pos}处应为tag 0x{tag:02X}，实际为0x{actual:02X}")
+    return start, stop
+
+
+def _expect_end(pos, end, what):
+    if pos != end:
+        raise DerError(f"{what}结束于位置{pos}，与外层结束位置{end}不一致")
+
+
+def _expect_oid(buf, pos, end, oid, what):
+    start, stop = _expect(buf, pos, end, _OID)
+    if buf[start:stop] != oid:
+        raise DerError(f"{what}不是预期的OID")
+    return stop
+
+
+def _check_elements(buf, pos, end):
+    """检查[pos, end)是一串完整的DER元素，递归检查其中的构造类型"""
+    while pos < end:
+        tag, start, stop = _header(buf, pos, end)
+        if tag & 0x20:
+            _check_elements(buf, start, stop)
+        elif tag == _OID and (start == stop or buf[stop - 1] & 0x80):
+            raise DerError(f"位置{pos}处OID编码无效")
+        elif tag == _INTEGER and start == stop:
+            raise DerError(f"位置{pos}处INTEGER为空")
+        pos = stop
+
+
+def _check_algorithm(buf, pos, end):
+    """检查pos处的AlgorithmIdentifier ::= SEQUENCE { algorithm OID, parameters ANY OPTIONAL }，返回其结束位置"""
+    start, stop = _expect(buf, pos, end, _SEQUENCE)
+    _check_elements(buf, start, stop)
+    _expect(buf, start, stop, _OID)
+    return stop
+
+
+def _check_attributes(buf, pos, end):
+    """检查[pos, end)中的每个Attribute ::= SEQUENCE { attrType OID, attrValues SET }"""
+    while pos < end:
+        start, stop = _expect(buf, pos, end, _SEQUENCE)
+        _check_elements(buf, start, stop)
+        _, values_pos = _expect(buf, start, stop, _OID)
+        _, values_end = _expect(buf, values_pos, stop, _SET)
+        _expect_end(values_end, stop, "Attribute")
+        pos = stop
+
+
+def _check_signer_info(buf, pos, end):
+    _, pos = _expect(buf, pos, end, _INTEGER)                   # version
+    tag, start, stop = _header(buf, pos, end)                   # sid
+    if tag not in (_SEQUENCE, _CONTEXT_0_PRIMITIVE):
+        raise DerError(f"位置{pos}处应为sid，实际为0x{tag:02X}")
+    _check_elements(buf, pos, stop)
+    pos = _check_algorithm(buf, stop, end)                      # digestAlgorithm
+    tag, start, stop = _header(buf, pos, end)
+    if tag == _CONTEXT_0:                                       # signedAttrs
+        _check_attributes(buf, start, stop)
+        pos = stop
+    pos = _check_algorithm(buf, pos, end)                       # signatureAlgorithm
+    _, pos = _expect(buf, pos, end, _OCTET_STRING)              # signature
+    if pos < end:
+        start, pos = _expect(buf, pos, end, _CONTEXT_1)         # unsignedAttrs
+        _check_attributes(buf, start, pos)
+    _expect_end(pos, end, "SignerInfo")
+
+
+def split_signed_data(cd_file_data) -> SignedDataParts:
+    """返回(eContent, signerInfos, eContentType)，eContent为CD的TLV数据，signerInfos为完整的SET编码"""
+    buf = memoryview(cd_file_data).cast("B") if not isinstance(cd_file_data, memoryview) else cd_file_data
+    end = len(buf)
+
+    start, stop = _expect(buf, 0, end, _SEQUENCE)               # ContentInfo
+    _expect_end(stop, end, "ContentInfo")
+    pos = _expect_oid(buf, start, end, _ID_SIGNED_DATA, "contentType")
+    start, stop = _expect(buf, pos, end, _CONTEXT_0)            # content
+    _expect_end(stop, end, "content")
+    start, stop = _expect(buf, start, end, _SEQUENCE)           # SignedData
+    _expect_end(stop, end, "SignedData")
+    _, pos = _expect(buf, start, end, _INTEGER)                 # version
+    start, pos = _expect(buf, pos, end, _SET)                   # digestAlgorithms
+    while start < pos:
+        start = _check_algorithm(buf, start, pos)
+
+    start, pos = _expect(buf, pos, end, _SEQUENCE)              # encapContentInfo
+    content_pos = _expect_oid(buf, start, pos, _ID_DATA, "eContentType")
+    start, stop = _expect(buf, content_pos, pos, _CONTEXT_0)    # eContent
+    _expect_end(stop, pos, "encapContentInfo")
+    start, content_end = _expect(buf, start, stop, _OCTET_STRING)
+    _expect_end(content_end, stop, "eContent")
+    econtent = bytes(buf[start:content_end])
+
+    tag, start, stop = _header(buf, pos, end)
+    if tag in (_CONTEXT_0, _CONTEXT_1):
+        raise DerError(f"位置{pos}处为certificates或crls")
+    if tag != _SET:
+        raise DerError(f"位置{pos}处应为signerInfos，实际为0x{tag:02X}")
+    _expect_end(stop, end, "signerInfos")
+    while start < stop:
+        start, signer_end = _expect(buf, start, stop, _SEQUENCE)
+        _check_signer_info(buf, start, signer_end)
+        start = signer_end
+    return SignedDataParts(econtent, bytes(buf[pos:stop]), ID_DATA)
+
+
+def _mutations(data, count):
+    # 截断与单字节翻转，用于比较两种实现对异常输入的处理
+    step = max(1, len(data) // count)
+    for pos in range(0, len(data), step):
+        yield f"truncate@{pos}", data[:pos]
+        yield f"flip@{pos}", data[:pos] + bytes([data[pos] ^ 0xFF]) + data[pos + 1:]
+
+
+def differential_check(corpus, mutations=0):
+    """比较split_signed_data与pyasn1完整解码的结果，返回不一致的(名称, 说明)列表
+
+    快速路径失败时调用方会退回pyasn1，因此不算不一致；快速路径成功时pyasn1也必须成功，且结果完全相同。
+    """
+    from pyasn1.error import PyAsn1Error
+
+    from cd.parser import unwrap_cd
+
+    problems = []
+    for name, data in corpus:
+        cases = [(name, data)]
+        if mutations:
+            cases.extend((f"{name}:{label}", mutated) for label, mutated in _mutations(data, mutations))
+        for case, case_data in cases:
+            try:
+                fast = split_signed_data(case_data)
+            except DerError:
+                continue
+            try:
+                strict = unwrap_cd(case_data, strict=True)
+            except (PyAsn1Error, TypeError, ValueError) as e:
+                problems.append((case, f"快速路径成功而pyasn1解码失败:{e}"))
+                continue
+            if fast != strict:
+                problems.append((case, "eContent或signerInfos不一致"))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare The Fast CMS Unwrapping With The pyasn1 Decoder")
+    parser.add_argument("cd_files", type=str, nargs="*", help="CD Files, defaults to the files in cd/corpus")
+    parser.add_argument("--mutations", type=int, default=None,
+                        help="Also compare this many truncated and byte-flipped variants of each file, "
+                             "defaults to every byte position for cd/corpus and 0 for other files")
+    args = parser.parse_args()
+
+    paths = args.cd_files or sorted(str(path) for path in _CORPUS_DIR.glob("*.der"))
+    mutations = args.mutations
+    if mutations is None:
+        mutations = 0 if args.cd_files else sys.maxsize
+    corpus = []
+    for path in paths:
+        with open(path, "rb") as f:
+            corpus.append((path, f.read()))
+    problems = differential_check(corpus, mutations)
+    for case, problem in problems:
+        print(f"{case}: {problem}")
+    print(f"{len(corpus)} CD files, {len(problems)} mismatches", file=sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -3,54 +3,77 @@ import os
 import pathlib
 import sys
 
-sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
 
-from cd.define import CertificationElements
+from cd.define import CD_SCHEMA, LazyCertificationElements
+from cd.der import DerError, SignedDataParts, split_signed_data
+from chip.tlv import backend
+from chip.tlv.schema import TLVSchemaError
 
-from chip.tlv import TLVReader
+from utils.metrics import span
 
-from pyasn1.codec.der.decoder import decode as der_decoder
 from pyasn1.error import PyAsn1Error
-from pyasn1_modules import rfc5652
 
 
-def parse_cd(cd_file_data):
-    cert_elements = CertificationElements()
+def decode_signed_data(cd_file_data):
+    """用pyasn1完整解码CD文件外层的ContentInfo，返回其中的SignedData，格式错误时抛出PyAsn1Error"""
+    # pyasn1_modules.rfc5652的导入耗时较长，只在需要完整解码时加载
+    from pyasn1.codec.der.decoder import decode as der_decoder
+    from pyasn1_modules import rfc5652
 
+    temp, _ = der_decoder(cd_file_data, asn1Spec=rfc5652.ContentInfo())
+    layer1 = dict(temp)
+    signed_data, _ = der_decoder(layer1['content'].asOctets(), asn1Spec=rfc5652.SignedData())
+    return signed_data
+
+
+def unwrap_cd(cd_file_data, strict=False) -> SignedDataParts:
+    """取出CD文件中的(eContent, signerInfos, eContentType)
+
+    默认按DER结构直接定位，结构不符合预期时退回pyasn1完整解码；strict为True时总是使用pyasn1。
+    格式错误时抛出PyAsn1Error。
+    """
+    with span("der_decode"):
+        if not strict:
+            try:
+                return split_signed_data(cd_file_data)
+            except DerError:
+                pass
+        from pyasn1.codec.der.encoder import encode as der_encoder
+
+        signed_data = decode_signed_data(cd_file_data)
+        return SignedDataParts(bytes(signed_data['encapContentInfo']['eContent']),
+                               der_encoder(signed_data['signerInfos']),
+                               str(signed_data['encapContentInfo']['eContentType']))
+
+
+def parse_cd_tlv(cd_tlv, lazy=False):
+    """从eContent（CD的TLV数据）中解析CD字段
+
+    按CD_SCHEMA一次完成解码与类型、取值范围检查，格式不符时抛出TLVSchemaError。
+    lazy只在纯Python后端下生效：编译后端完整解码一个CD只需几微秒，按需解码并不会更快，此时仍完整解码。
+    """
+    if lazy and backend() == "python":
+        return LazyCertificationElements(cd_tlv)
+
+    with span("tlv_decode"):
+        return CD_SCHEMA.decode(cd_tlv)
+
+
+def parse_cd(cd_file_data, lazy=False, strict=False):
+    """解析CD文件
+
+    CMS结构或CD内容格式错误时在stderr输出原因并返回None。
+    lazy为True且使用纯Python TLV后端时返回LazyCertificationElements，字段在访问时才解码，CD内容的格式错误也在访问时才抛出。
+    strict为True时用pyasn1完整解码CMS结构，否则直接定位eContent。
+    """
     try:
-        temp, _ = der_decoder(cd_file_data, asn1Spec=rfc5652.ContentInfo())
-    except PyAsn1Error as e:
-        print(e)
+        return parse_cd_tlv(unwrap_cd(cd_file_data, strict).econtent, lazy)
+    except (PyAsn1Error, TLVSchemaError) as e:
+        print(f"CD文件格式错误:{e}", file=sys.stderr)
         return None
 
-    layer1 = dict(temp)
-    temp, _ = der_decoder(layer1['content'].asOctets(), asn1Spec=rfc5652.SignedData())
-
-    signed_data = dict(temp)
-    encap_content_info = dict(signed_data['encapContentInfo'])
-    cd_tlv = bytes(encap_content_info['eContent'])
-
-    cd_content = TLVReader(cd_tlv).get()["Any"]
-    cert_elements.format_version = cd_content[0]
-    cert_elements.vendor_id = cd_content[1]
-    cert_elements.product_id_array = cd_content[2]
-    cert_elements.device_type_id = cd_content[3]
-    cert_elements.certificate_id = cd_content[4]
-    cert_elements.security_level = cd_content[5]
-    cert_elements.security_info = cd_content[6]
-    cert_elements.version_number = cd_content[7]
-    cert_elements.certification_type = cd_content[8]
-    if 9 in cd_content.keys():
-        cert_elements.origin_vid = cd_content[9]
-    if 10 in cd_content.keys():
-        cert_elements.origin_pid = cd_content[10]
-    if 11 in cd_content.keys():
-        cert_elements.paa_authority_list = cd_content[11]
-
-    cert_elements.product_ids_count = len(cert_elements.product_id_array)
-    cert_elements.paa_authority_count = len(cert_elements.paa_authority_list)
-    return cert_elements
-
 
 # Example usage
 if __name__ == "__main__":
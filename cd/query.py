@@ -1,53 +1,102 @@
-import json
+from http import HTTPStatus
 
-import requests
+from dcl.client import get_client
+from dcl.export import compliance_info_path, model_path, vendor_info_path
+from utils.metrics import count_error, dcl_span
 
-from config.define import baseUrl
 
+def _vendor_info_path(cd):
+    return vendor_info_path(cd.vendor_id)
+
+
+def _vendor_info_result(cd, status_code, resp_data) -> (bool, str, object):
+    if status_code == HTTPStatus.NOT_FOUND:
+        return False, f"厂商ID:{cd.vendor_id}不在DCL上", None
+    if status_code != HTTPStatus.OK:
+        return False, f"错误码:{status_code}", None
+    return True, "", resp_data["vendorInfo"]
+
+
+def _model_info_path(cd):
+    return model_path(cd.vendor_id, cd.product_id_array[-1])
+
+
+def _model_info_result(cd, status_code, resp_data) -> (bool, str, object):
+    if status_code == HTTPStatus.NOT_FOUND:
+        return False, f"产品ID:{cd.product_id_array[-1]}不在DCL上", None
+    if status_code != HTTPStatus.OK:
+        return False, f"错误码:{status_code}", None
+    return True, "", resp_data["model"]
+
+
+def _compliance_info_path(cd):
+    return compliance_info_path(cd.vendor_id, cd.product_id_array[-1], cd.version_number)
+
+
+def _compliance_info_result(cd, status_code, resp_data) -> (bool, str, object):
+    if status_code == HTTPStatus.NOT_FOUND:
+        return False, f"{cd.vendor_id}/{cd.product_id_array[-1]}/{cd.version_number}合约信息不在DCL上", None
+    if status_code != HTTPStatus.OK:
+        return False, f"错误码:{status_code}", None
+    return True, "", resp_data["complianceInfo"]
+
+
+_PATHS = {
+    "vendor_info": _vendor_info_path,
+    "model_info": _model_info_path,
+    "compliance_info": _compliance_info_path,
+}
 
-def query_vendor_info(cd) -> (bool, str, object):
-    try:
-        response = requests.get(
-            f"{baseUrl}/dcl/vendorinfo/vendors/"
-            f"{cd.vendor_id}"
-        )
-        if response.status_code == requests.codes.not_found:
-            return False, f"厂商ID:{cd.vendor_id}不在DCL上", None
-        if response.status_code != requests.codes.ok:
-            return False, f"错误码:{response.status_code}", None
-        resp_data = response.json()
-        return True, "", resp_data["vendorInfo"]
-    except Exception as e:
-        return False, str(e), None
 
+def query_paths(cd, inputs) -> list:
+    """返回inputs（vendor_info/model_info/compliance_info）对应的DCL查询路径"""
+    return [_PATHS[name](cd) for name in inputs]
 
-def query_model_info(cd) -> (bool, str, object):
+
+def _query(cd, client, endpoint, path_func, result_func):
     try:
-        response = requests.get(
-            f"{baseUrl}/dcl/model/models/"
-            f"{cd.vendor_id}/{cd.product_id_array[-1]}"
-        )
-        if response.status_code == requests.codes.not_found:
-            return False, f"产品ID:{cd.product_id_array[-1]}不在DCL上", None
-        if response.status_code != requests.codes.ok:
-            return False, f"错误码:{response.status_code}", None
-        resp_data = response.json()
-        return True, "", resp_data["model"]
+        with dcl_span(endpoint):
+            status_code, resp_data = (client or get_client()).get(path_func(cd))
+        result = result_func(cd, status_code, resp_data)
     except Exception as e:
-        return False, str(e), None
+        result = False, str(e), None
+    if not result[0]:
+        count_error("dcl." + endpoint)
+    return result
 
 
-def query_compliance_info(cd) -> (bool, str, object):
+async def _async_query(cd, client, endpoint, path_func, result_func):
     try:
-        response = requests.get(
-            f"{baseUrl}/dcl/compliance/compliance-info/"
-            f"{cd.vendor_id}/{cd.product_id_array[-1]}/{cd.version_number}/matter"
-        )
-        if response.status_code == requests.codes.not_found:
-            return False, f"{cd.vendor_id}/{cd.product_id_array[-1]}/{cd.version_number}合约信息不在DCL上", None
-        if response.status_code != requests.codes.ok:
-            return False, f"错误码:{response.status_code}", None
-        resp_data = response.json()
-        return True, "", resp_data["complianceInfo"]
+        with dcl_span(endpoint):
+            status_code, resp_data = await client.get(path_func(cd))
+        result = result_func(cd, status_code, resp_data)
     except Exception as e:
-        return False, str(e), None
+        result = False, str(e), None
+    if not result[0]:
+        count_error("dcl." + endpoint)
+    return result
+
+
+def query_vendor_info(cd, client=None) -> (bool, str, object):
+    return _query(cd, client, "vendor_info", _vendor_info_path, _vendor_info_result)
+
+
+def query_model_info(cd, client=None) -> (bool, str, object):
+    return _query(cd, client, "model_info", _model_info_path, _model_info_result)
+
+
+def query_compliance_info(cd, client=None) -> (bool, str, object):
+    return _query(cd, client, "compliance_info", _compliance_info_path, _compliance_info_result)
+
+
+async def async_query_vendor_info(cd, client) -> (bool, str, object):
+    return await _async_query(cd, client, "vendor_info", _vendor_info_path, _vendor_info_result)
+
+
+async def async_query_model_info(cd, client) -> (bool, str, object):
+    return await _async_query(cd, client, "model_info", _model_info_path, _model_info_result)
+
+
+async def async_query_compliance_info(cd, client) -> (bool, str, object):
+    return await _async_query(cd, client, "compliance_info", _compliance_info_path, _compliance_info_result)
+
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import pathlib
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature, UnsupportedAlgorithm
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from pyasn1.codec.der.decoder import decode as der_decoder
+from pyasn1.codec.der.encoder import encode as der_encoder
+from pyasn1.error import PyAsn1Error
+from pyasn1.type import univ
+from pyasn1_modules import rfc5652
+
+from cd.der import ID_DATA, SignedDataParts
+from cd.parser import unwrap_cd
+from config.define import cd_signing_keys_path
+from utils.metrics import span
+
+_DIGEST_ALGORITHMS = {
+    "2.16.840.1.101.3.4.2.1": hashes.SHA256,
+    "2.16.840.1.101.3.4.2.2": hashes.SHA384,
+    "2.16.840.1.101.3.4.2.3": hashes.SHA512,
+}
+
+_SIGNATURE_ALGORITHMS = {
+    "1.2.840.10045.4.3.2": hashes.SHA256,
+    "1.2.840.10045.4.3.3": hashes.SHA384,
+    "1.2.840.10045.4.3.4": hashes.SHA512,
+}
+
+# 部分签名工具在signatureAlgorithm中只写id-ecPublicKey，此时哈希算法取digestAlgorithm
+_EC_PUBLIC_KEY = "1.2.840.10045.2.1"
+
+_CONTENT_TYPE = "1.2.840.113549.1.9.3"
+_MESSAGE_DIGEST = "1.2.840.113549.1.9.4"
+
+_PEM_BEGIN = b"-----BEGIN CERTIFICATE-----"
+
+
+class SigningKeyStore:
+    """CD签名证书的公钥索引
+
+    证书只解析一次，公钥按subjectKeyIdentifier（原始字节）与(issuer, serialNumber)建立索引，
+    之后同一签名者的CD直接复用已解析的公钥。线程安全。
+    """
+
+    def __init__(self, path=None):
+        self._by_key_id = {}
+        self._by_issuer_serial = {}
+        self._lock = threading.Lock()
+        if path:
+            self.load_directory(path)
+
+    def add_certificate(self, data: bytes):
+        """添加PEM（可包含多个证书）或DER格式的证书，返回添加的证书数"""
+        if _PEM_BEGIN in data:
+            certificates = x509.load_pem_x509_certificates(data)
+        else:
+            certificates = [x509.load_der_x509_certificate(data)]
+        with self._lock:
+            for certificate in certificates:
+                public_key = certificate.public_key()
+                try:
+                    key_id = certificate.extensions.get_extension_for_class(x509.SubjectKeyIdentifier).value.digest
+                except x509.ExtensionNotFound:
+                    key_id = x509.SubjectKeyIdentifier.from_public_key(public_key).digest
+                self._by_key_id[key_id] = public_key
+                self._by_issuer_serial[(certificate.issuer.public_bytes(), certificate.serial_number)] = public_key
+        return len(certificates)
+
+    def load_directory(self, path):
+        """加载目录下所有.pem/.crt/.cer/.der证书，返回加载的证书数"""
+        count = 0
+        for file in sorted(pathlib.Path(path).iterdir()):
+            if file.suffix.lower() in (".pem", ".crt", ".cer", ".der"):
+                count += self.add_certificate(file.read_bytes())
+        return count
+
+    def get(self, key_id: bytes):
+        return self._by_key_id.get(bytes(key_id))
+
+    def get_by_issuer_serial(self, issuer_der: bytes, serial_number: int):
+        return self._by_issuer_serial.get((bytes(issuer_der), int(serial_number)))
+
+    def __len__(self):
+        return len(self._by_key_id)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_signing_key_store(path=None):
+    """进程内按目录共享的SigningKeyStore，path默认为CD_SIGNING_KEYS_PATH"""
+    path = path or cd_signing_keys_path
+    if not path:
+        raise ValueError("未配置CD签名证书目录，请设置CD_SIGNING_KEYS_PATH")
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                store = _stores[path] = SigningKeyStore(path)
+    return store
+
+
+def _signer_public_key(signer_info, store):
+    sid = signer_info['sid']
+    if sid.getName() == 'subjectKeyIdentifier':
+        key_id = bytes(sid['subjectKeyIdentifier'])
+        return store.get(key_id), key_id.hex().upper()
+    issuer_and_serial = sid['issuerAndSerialNumber']
+    serial_number = int(issuer_and_serial['serialNumber'])
+    public_key = store.get_by_issuer_serial(der_encoder(issuer_and_serial['issuer']), serial_number)
+    return public_key, f"序列号{serial_number:X}"
+
+
+def _signed_attribute(signed_attrs, attr_type, asn1_spec):
+    """返回签名属性attr_type的唯一取值，属性不存在时为None，格式错误时抛出PyAsn1Error"""
+    for attribute in signed_attrs:
+        if str(attribute['attrType']) == attr_type:
+            if len(attribute['attrValues']) != 1:
+                raise PyAsn1Error(f"签名属性{attr_type}应只有一个取值")
+            value, _ = der_decoder(bytes(attribute['attrValues'][0]), asn1Spec=asn1_spec)
+            return value
+    return None
+
+
+def _signed_bytes(signer_info, content, content_type, digest_algorithm):
+    """返回签名覆盖的数据；有签名属性时签名覆盖的是属性集合，并按RFC 5652 5.3检查其中的内容类型与消息摘要"""
+    signed_attrs = signer_info['signedAttrs']
+    if not signed_attrs.isValue or len(signed_attrs) == 0:
+        return content, None
+    try:
+        attr_content_type = _signed_attribute(signed_attrs, _CONTENT_TYPE, univ.ObjectIdentifier())
+        message_digest = _signed_attribute(signed_attrs, _MESSAGE_DIGEST, univ.OctetString())
+    except PyAsn1Error as e:
+        return None, f"签名属性格式错误:{str(e) or type(e).__name__}"
+    if attr_content_type is None:
+        return None, "签名属性中缺少内容类型"
+    if str(attr_content_type) != content_type:
+        return None, f"签名属性中的内容类型{attr_content_type}与eContentType{content_type}不一致"
+    if message_digest is None:
+        return None, "签名属性中缺少消息摘要"
+    digest = hashes.Hash(digest_algorithm())
+    digest.update(content)
+    if bytes(message_digest) != digest.finalize():
+        return None, "CD内容与签名属性中的摘要不一致"
+    # 签名属性在SignerInfo中是[0] IMPLICIT，计算签名时按SET OF编码
+    encoded = bytearray(der_encoder(signed_attrs))
+    encoded[0] = 0x31
+    return bytes(encoded), None
+
+
+def verify_signer_infos(content, signer_infos, store, content_type=ID_DATA) -> (bool, str):
+    """校验signerInfos（pyasn1的rfc5652.SignerInfos）中每个签名者对content的签名
+
+    content_type为eContentType（点分形式），有签名属性时须与其中的内容类型一致。签名算法中的哈希须与digestAlgorithm一致，
+    消息摘要按digestAlgorithm计算。
+    """
+    if len(signer_infos) == 0:
+        return False, "CD没有签名"
+    for signer_info in signer_infos:
+        public_key, signer = _signer_public_key(signer_info, store)
+        if public_key is None:
+            return False, f"签名密钥{signer}不在CD签名证书中"
+        if not isinstance(public_key, ec.EllipticCurvePublicKey):
+            return False, f"签名密钥{signer}不是ECDSA密钥"
+
+        digest_oid = str(signer_info['digestAlgorithm']['algorithm'])
+        digest_algorithm = _DIGEST_ALGORITHMS.get(digest_oid)
+        if digest_algorithm is None:
+            return False, f"不支持的摘要算法{digest_oid}"
+        signature_algorithm = str(signer_info['signatureAlgorithm']['algorithm'])
+        if signature_algorithm == _EC_PUBLIC_KEY:
+            hash_algorithm = digest_algorithm
+        else:
+            hash_algorithm = _SIGNATURE_ALGORITHMS.get(signature_algorithm)
+            if hash_algorithm is None:
+                return False, f"不支持的签名算法{signature_algorithm}"
+            if hash_algorithm is not digest_algorithm:
+                return False, f"签名算法{signature_algorithm}与摘要算法{digest_oid}不一致"
+
+        data, problem = _signed_bytes(signer_info, content, content_type, digest_algorithm)
+        if problem:
+            return False, problem
+        try:
+            public_key.verify(bytes(signer_info['signature']), data, ec.ECDSA(hash_algorithm()))
+        except (InvalidSignature, UnsupportedAlgorithm):
+            return False, f"CD签名校验失败，签名密钥{signer}"
+    return True, ""
+
+
+def verify_signed_data(signed_data, store) -> (bool, str):
+    """校验pyasn1解码的SignedData中每个签名者对eContent的签名"""
+    encap_content_info = signed_data['encapContentInfo']
+    return verify_signer_infos(bytes(encap_content_info['eContent']), signed_data['signerInfos'], store,
+                               str(encap_content_info['eContentType']))
+
+
+def verify_cd_parts(parts: SignedDataParts, store) -> (bool, str):
+    """校验cd.parser.unwrap_cd取出的(eContent, signerInfos, eContentType)，只用pyasn1解码signerInfos部分"""
+    with span("signature"):
+        try:
+            signer_infos, _ = der_decoder(parts.signer_infos, asn1Spec=rfc5652.SignerInfos())
+        except PyAsn1Error as e:
+            return False, f"CD签名信息格式错误:{str(e) or type(e).__name__}"
+        return verify_signer_infos(parts.econtent, signer_infos, store, parts.econtent_type)
+
+
+def verify_cd_signature(cd_file_data, store=None, strict=False) -> (bool, str):
+    """校验CD文件的CMS签名，store默认为CD_SIGNING_KEYS_PATH目录对应的SigningKeyStore"""
+    store = store if store is not None else get_signing_key_store()
+    try:
+        parts = unwrap_cd(cd_file_data, strict)
+    except PyAsn1Error as e:
+        return False, f"CD文件格式错误:{str(e) or type(e).__name__}"
+    return verify_cd_parts(parts, store)
+
+
+_worker_keys_path = None
+
+
+def _init_worker(keys_path):
+    global _worker_keys_path
+    _worker_keys_path = keys_path
+
+
+def _verify_one(item):
+    name, data = item
+    ok, msg = verify_cd_signature(data, get_signing_key_store(_worker_keys_path))
+    return name, ok, msg
+
+
+def verify_many(items, keys_path=None, jobs=None, chunksize=64):
+    """在进程池中批量校验签名，items为(名称, CD文件内容)，按输入顺序返回(名称, ok, msg)
+
+    每个工作进程只加载一次签名证书。
+    """
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(keys_path,)) as pool:
+        yield from pool.map(_verify_one, items, chunksize=chunksize)
+
+
+def _read_files(paths):
+    for path in paths:
+        with open(path, "rb") as f:
+            yield path, f.read()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify The CMS Signatures Of CD Files")
+    parser.add_argument("cd_files", type=str, nargs="+", help="CD Files")
+    parser.add_argument("--keys", type=str, default=cd_signing_keys_path,
+                        help="Directory of CD signing certificates, defaults to CD_SIGNING_KEYS_PATH")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    total = failed = 0
+    for name, ok, msg in verify_many(_read_files(args.cd_files), args.keys, args.jobs):
+        total += 1
+        if not ok:
+            failed += 1
+            print(f"{name}: {msg}")
+    print(f"{total} CD files, {failed} failed, {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    sys.exit(1 if failed else 0)
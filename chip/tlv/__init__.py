@@ -27,6 +27,8 @@
 
 from __future__ import absolute_import, print_function
 
+import importlib
+import os
 import struct
 from collections import OrderedDict
 from collections.abc import Mapping, Sequence
@@ -198,6 +200,13 @@ class TLVWriter(object):
           the first integer encoded as the profile id and the second as the tag number.
         If tag is None, it is encoded as a TLV anonymous tag.
         """
+        if _tlvcodec is not None:
+            _tlvcodec.put(self, tag, val)
+        else:
+            self._putPython(tag, val)
+
+    def _putPython(self, tag, val):
+        """Pure-Python implementation of put(), the reference for the compiled codec."""
         if val is None:
             self.putNull(tag)
         elif isinstance(val, Enum):
@@ -224,21 +233,61 @@ class TLVWriter(object):
                            key=lambda item: tlvTagToSortKey(item[0]))
                 )
             for containedTag, containedVal in val.items():
-                self.put(containedTag, containedVal)
+                self._putPython(containedTag, containedVal)
             self.endContainer()
         elif isinstance(val, TLVList):
             self.startPath(tag)
             for containedTag, containedVal in val:
-                self.put(containedTag, containedVal)
+                self._putPython(containedTag, containedVal)
             self.endContainer()
         elif isinstance(val, Sequence):
             self.startArray(tag)
             for containedVal in val:
-                self.put(None, containedVal)
+                self._putPython(None, containedVal)
             self.endContainer()
         else:
             raise ValueError("Attempt to TLV encode unsupported value")
 
+    def encodedSize(self, tag, val):
+        """Number of bytes put(tag, val) would write at the current position, without writing anything."""
+        plan = _TLVPlan(self._implicitProfile, self._containerStack)
+        plan.add(tag, val)
+        return plan.size
+
+    def putMany(self, vals, tag=None):
+        """Write each value in vals as a separate element with the specified TLV tag.
+
+        The result is the same as calling put(tag, val) for every value, but it is meant for encoding many
+        records (e.g. a corpus of CDs) into one buffer. Nothing is written if any value cannot be encoded.
+        Returns the offset of each element within encoding.
+
+        With the pure-Python backend all values are validated and sized in a first pass, then packed into a
+        single preallocated buffer with pack_into.
+        """
+        offsets = []
+        if _tlvcodec is not None:
+            base = len(self._encoding)
+            containerStack = list(self._containerStack)
+            try:
+                for val in vals:
+                    offsets.append(len(self._encoding))
+                    _tlvcodec.put(self, tag, val)
+            except Exception:
+                del self._encoding[base:]
+                self._containerStack[:] = containerStack
+                raise
+            return offsets
+
+        plan = _TLVPlan(self._implicitProfile, self._containerStack)
+        for val in vals:
+            offsets.append(plan.size)
+            plan.add(tag, val)
+        buf = bytearray(plan.size)
+        plan.write(buf)
+        base = len(self._encoding)
+        self._encoding.extend(buf)
+        return [base + offset for offset in offsets]
+
     def putSignedInt(self, tag, val):
         """Write a value as a TLV signed integer with the specified TLV tag."""
         if val >= INT8_MIN and val <= INT8_MAX:
@@ -450,30 +499,352 @@ class TLVWriter(object):
             raise ValueError("Invalid TLV container type")
 
 
+# Length field of the control byte, indexed by the size in bytes of the value or of its length.
+_lenOfLenOrValBits = (0, 0, 1, 0, 2, 0, 0, 0, 3)
+
+
+def _unsignedFormat(val):
+    if val < 0:
+        raise ValueError("Integer value out of range")
+    if val <= UINT8_MAX:
+        return "B", 1
+    elif val <= UINT16_MAX:
+        return "H", 2
+    elif val <= UINT32_MAX:
+        return "L", 4
+    elif val <= UINT64_MAX:
+        return "Q", 8
+    raise ValueError("Integer value out of range")
+
+
+def _itemSortKey(item):
+    return tlvTagToSortKey(item[0])
+
+
+class _TLVPlan(object):
+    """First pass of TLVWriter.putMany(): validates values and collects the struct format and arguments encoding them.
+
+    Control bytes, tags, fixed-size values and lengths become struct fields, string contents "<n>s" fields, so the
+    size is known before anything is written and write() packs everything with a single pack_into call.
+    """
+
+    # The reference tag encoder only needs _containerStack and _implicitProfile, used for profile tags.
+    _encodeControlAndTag = TLVWriter._encodeControlAndTag
+
+    def __init__(self, implicitProfile, containerStack):
+        self._implicitProfile = implicitProfile
+        self._containerStack = list(containerStack)
+        self.formats = []
+        self.args = []
+        self.size = 0
+
+    def _element(self, elementType, tag, lenOfLenOrVal=0, format="", val=None):
+        """Adds the control byte and tag, followed by val packed with format when given."""
+        controlByte = elementType | _lenOfLenOrValBits[lenOfLenOrVal]
+        containerStack = self._containerStack
+        if tag is None:
+            if containerStack and containerStack[0] == TLV_TYPE_STRUCTURE:
+                raise ValueError("Attempt to encode anonymous tag within TLV structure")
+            self.formats.append("B" + format)
+            self.args.append(controlByte)
+            self.size += 1
+        elif tag.__class__ is int:
+            if tag < 0 or tag > UINT8_MAX:
+                raise ValueError("Context-specific TLV tag number out of range")
+            if not containerStack:
+                raise ValueError("Attempt to encode context-specific TLV tag at top level")
+            if containerStack[0] == TLV_TYPE_ARRAY:
+                raise ValueError("Attempt to encode context-specific tag within TLV array")
+            self.formats.append("BB" + format)
+            self.args += (controlByte | TLV_TAG_CONTROL_CONTEXT_SPECIFIC, tag)
+            self.size += 2
+        else:
+            # Profile tags and unusual tag objects are rare, defer to the reference implementation.
+            encoded = bytes(self._encodeControlAndTag(elementType, tag, lenOfLenOrVal=lenOfLenOrVal))
+            self.formats.append("%ds%s" % (len(encoded), format))
+            self.args.append(encoded)
+            self.size += len(encoded)
+        if format:
+            self.args.append(val)
+            self.size += lenOfLenOrVal
+
+    def _raw(self, data):
+        self.formats.append("%ds" % len(data))
+        self.args.append(data)
+        self.size += len(data)
+
+    def _addNull(self, tag, val):
+        self._element(TLV_TYPE_NULL, tag)
+
+    def _addBool(self, tag, val):
+        self._element(TLVBoolean_True if val else TLVBoolean_False, tag)
+
+    def _addUnsignedInt(self, tag, val):
+        format, size = _unsignedFormat(val)
+        self._element(TLV_TYPE_UNSIGNED_INTEGER, tag, size, format, val)
+
+    def _addSignedInt(self, tag, val):
+        if val >= INT8_MIN and val <= INT8_MAX:
+            format, size = "b", 1
+        elif val >= INT16_MIN and val <= INT16_MAX:
+            format, size = "h", 2
+        elif val >= INT32_MIN and val <= INT32_MAX:
+            format, size = "l", 4
+        elif val >= INT64_MIN and val <= INT64_MAX:
+            format, size = "q", 8
+        else:
+            raise ValueError("Integer value out of range")
+        self._element(TLV_TYPE_SIGNED_INTEGER, tag, size, format, val)
+
+    def _addFloat(self, tag, val):
+        # TLVWriter packs floats in native byte order, keep them as raw bytes so the result matches on every host.
+        self._element(TLV_TYPE_FLOATING_POINT_NUMBER, tag, 4)
+        self._raw(struct.pack("f", val))
+
+    def _addDouble(self, tag, val):
+        self._element(TLV_TYPE_FLOATING_POINT_NUMBER, tag, 8)
+        self._raw(struct.pack("d", val))
+
+    def _addString(self, tag, val):
+        self._addData(TLV_TYPE_UTF8_STRING, tag, val.encode("utf-8"))
+
+    def _addBytes(self, tag, val):
+        self._addData(TLV_TYPE_BYTE_STRING, tag, bytes(val))
+
+    def _addData(self, elementType, tag, data):
+        format, size = _unsignedFormat(len(data))
+        self._element(elementType, tag, size, format, len(data))
+        self._raw(data)
+
+    def _startContainer(self, tag, containerType):
+        self._element(containerType, tag)
+        self._containerStack.insert(0, containerType)
+
+    def _endContainer(self):
+        self._containerStack.pop(0)
+        self.formats.append("B")
+        self.args.append(TLVEndOfContainer)
+        self.size += 1
+
+    def _addStructure(self, tag, val):
+        self._startContainer(tag, TLV_TYPE_STRUCTURE)
+        for containedTag, containedVal in sorted(val.items(), key=_itemSortKey) if type(val) is dict else val.items():
+            self.add(containedTag, containedVal)
+        self._endContainer()
+
+    def _addPath(self, tag, val):
+        self._startContainer(tag, TLV_TYPE_PATH)
+        for containedTag, containedVal in val:
+            self.add(containedTag, containedVal)
+        self._endContainer()
+
+    def _addArray(self, tag, val):
+        self._startContainer(tag, TLV_TYPE_ARRAY)
+        formats = self.formats
+        args = self.args
+        for containedVal in val:
+            # Arrays of small unsigned integers (e.g. product IDs) are common, encode them without the dispatch.
+            if containedVal.__class__ is uint and containedVal <= UINT16_MAX:
+                if containedVal <= UINT8_MAX:
+                    formats.append("BB")
+                    args += (TLV_TYPE_UNSIGNED_INTEGER, containedVal)
+                    self.size += 2
+                else:
+                    formats.append("BH")
+                    args += (TLV_TYPE_UNSIGNED_INTEGER | 1, containedVal)
+                    self.size += 3
+            else:
+                self.add(None, containedVal)
+        self._endContainer()
+
+    def _addUnsupported(self, tag, val):
+        raise ValueError("Attempt to TLV encode unsupported value")
+
+    def add(self, tag, val):
+        try:
+            adder = _planDispatch[val.__class__]
+        except KeyError:
+            adder = _planDispatch[val.__class__] = _resolvePlanAdder(val.__class__)
+        adder(self, tag, val)
+
+    def write(self, buf, offset=0):
+        """Second pass: packs everything into buf, which must have room for size bytes from offset."""
+        struct.pack_into("<" + "".join(self.formats), buf, offset, *self.args)
+
+
+def _resolvePlanAdder(valType):
+    """Mirrors the isinstance chain of TLVWriter.put, resolved once per Python type."""
+    if valType is type(None):
+        return _TLVPlan._addNull
+    elif issubclass(valType, Enum):
+        return _TLVPlan._addUnsignedInt
+    elif issubclass(valType, bool):
+        return _TLVPlan._addBool
+    elif issubclass(valType, uint):
+        return _TLVPlan._addUnsignedInt
+    elif issubclass(valType, int):
+        return _TLVPlan._addSignedInt
+    elif issubclass(valType, float32):
+        return _TLVPlan._addFloat
+    elif issubclass(valType, float):
+        return _TLVPlan._addDouble
+    elif issubclass(valType, str):
+        return _TLVPlan._addString
+    elif issubclass(valType, (bytes, bytearray)):
+        return _TLVPlan._addBytes
+    elif issubclass(valType, Mapping):
+        return _TLVPlan._addStructure
+    elif issubclass(valType, TLVList):
+        return _TLVPlan._addPath
+    elif issubclass(valType, Sequence):
+        return _TLVPlan._addArray
+    return _TLVPlan._addUnsupported
+
+
+# Python type -> _TLVPlan method encoding values of that type.
+_planDispatch = {}
+
+
+_structU8 = struct.Struct("<B")
+_structU16 = struct.Struct("<H")
+_structU32 = struct.Struct("<L")
+_structU64 = struct.Struct("<Q")
+_structS8 = struct.Struct("<b")
+_structS16 = struct.Struct("<h")
+_structS32 = struct.Struct("<l")
+_structS64 = struct.Struct("<q")
+_structF32 = struct.Struct("<f")
+_structF64 = struct.Struct("<d")
+_structU16U16 = struct.Struct("<HH")
+
+
+# Tag forms, in the order of the tag control field (upper 3 bits of the control byte).
+_TAG_ANONYMOUS = 0
+_TAG_CONTEXT = 1
+_TAG_COMMON_PROFILE = 2
+_TAG_IMPLICIT_PROFILE = 3
+_TAG_FULLY_QUALIFIED = 4
+
+_tagControlDecoders = {
+    TLV_TAG_CONTROL_ANONYMOUS: (_TAG_ANONYMOUS, None, 0),
+    TLV_TAG_CONTROL_CONTEXT_SPECIFIC: (_TAG_CONTEXT, _structU8, 1),
+    TLV_TAG_CONTROL_COMMON_PROFILE_2Bytes: (_TAG_COMMON_PROFILE, _structU16, 2),
+    TLV_TAG_CONTROL_COMMON_PROFILE_4Bytes: (_TAG_COMMON_PROFILE, _structU32, 4),
+    TLV_TAG_CONTROL_IMPLICIT_PROFILE_2Bytes: (_TAG_IMPLICIT_PROFILE, _structU16, 2),
+    TLV_TAG_CONTROL_IMPLICIT_PROFILE_4Bytes: (_TAG_IMPLICIT_PROFILE, _structU32, 4),
+    TLV_TAG_CONTROL_FULLY_QUALIFIED_6Bytes: (_TAG_FULLY_QUALIFIED, _structU16, 6),
+    TLV_TAG_CONTROL_FULLY_QUALIFIED_8Bytes: (_TAG_FULLY_QUALIFIED, _structU32, 8),
+}
+
+# Value forms, resolved from the element type field (lower 5 bits of the control byte).
+_VAL_UNSIGNED = 0
+_VAL_SIGNED = 1
+_VAL_FLOAT32 = 2
+_VAL_FLOAT64 = 3
+_VAL_UTF8_STRING = 4
+_VAL_BYTE_STRING = 5
+_VAL_CONSTANT = 6
+_VAL_STRUCTURE = 7
+_VAL_ARRAY = 8
+_VAL_PATH = 9
+_VAL_END_OF_CONTAINER = 10
+
+_elementTypeDecoders = {
+    0x00: (_VAL_SIGNED, _structS8, 1),
+    0x01: (_VAL_SIGNED, _structS16, 2),
+    0x02: (_VAL_SIGNED, _structS32, 4),
+    0x03: (_VAL_SIGNED, _structS64, 8),
+    0x04: (_VAL_UNSIGNED, _structU8, 1),
+    0x05: (_VAL_UNSIGNED, _structU16, 2),
+    0x06: (_VAL_UNSIGNED, _structU32, 4),
+    0x07: (_VAL_UNSIGNED, _structU64, 8),
+    0x08: (_VAL_CONSTANT, False, 0),
+    0x09: (_VAL_CONSTANT, True, 0),
+    0x0A: (_VAL_FLOAT32, _structF32, 4),
+    0x0B: (_VAL_FLOAT64, _structF64, 8),
+    0x0C: (_VAL_UTF8_STRING, _structU8, 1),
+    0x0D: (_VAL_UTF8_STRING, _structU16, 2),
+    0x0E: (_VAL_UTF8_STRING, _structU32, 4),
+    0x0F: (_VAL_UTF8_STRING, _structU64, 8),
+    0x10: (_VAL_BYTE_STRING, _structU8, 1),
+    0x11: (_VAL_BYTE_STRING, _structU16, 2),
+    0x12: (_VAL_BYTE_STRING, _structU32, 4),
+    0x13: (_VAL_BYTE_STRING, _structU64, 8),
+    0x14: (_VAL_CONSTANT, None, 0),
+    0x15: (_VAL_STRUCTURE, None, 0),
+    0x16: (_VAL_ARRAY, None, 0),
+    0x17: (_VAL_PATH, None, 0),
+    0x18: (_VAL_END_OF_CONTAINER, None, 0),
+}
+
+
+def _buildControlByteTable():
+    """Resolve every possible control byte to (tagForm, tagStruct, tagLen, valForm, valArg, valLen) up front,
+    so the decoder does a single list index per element. Reserved element types map to None."""
+    table = []
+    for controlByte in range(256):
+        elementType = _elementTypeDecoders.get(controlByte & 0x1F)
+        if elementType is None:
+            table.append(None)
+        else:
+            table.append(_tagControlDecoders[controlByte & 0xE0] + elementType)
+    return table
+
+
+_controlByteTable = _buildControlByteTable()
+
+
 class TLVReader(object):
-    def __init__(self, tlv):
+    def __init__(self, tlv, trace=False):
+        """Constructs a TLVReader over tlv, any object supporting the buffer protocol.
+
+        When trace is True, a verbose per-element description of the input is recorded in `decoding` while
+        decoding. Otherwise the table driven decoder is used and the trace is only rebuilt if `decoding` is read.
+        """
         self._tlv = tlv
+        self._trace = trace
         self._bytesRead = 0
         self._decodings = []
+        self._decoded = False
 
     @property
     def decoding(self):
+        if self._decoded and not self._trace:
+            tracer = TLVReader(self._tlv, trace=True)
+            tracer.get()
+            self._decodings = tracer._decodings
+            self._trace = True
         return self._decodings
 
     def get(self):
         """Get the dictionary representation of tlv data"""
         out = {}
-        self._get(self._tlv, self._decodings, out)
+        # All decoding is done over a single memoryview with a moving cursor, values are unpacked in place with
+        # Struct.unpack_from, so no intermediate slices of the input are created.
+        with memoryview(self._tlv) as tlv:
+            if tlv.format != "B" or tlv.ndim != 1:
+                tlv = tlv.cast("B")
+            if self._trace:
+                self._get(tlv, self._decodings, out)
+            elif _tlvcodec is not None:
+                self._decoded = True
+                out, self._bytesRead = _tlvcodec.decode(tlv, self._bytesRead)
+            else:
+                self._decoded = True
+                self._getFast(tlv, out)
         return out
 
+    def _unpack(self, tlv, fmt, size):
+        (val,) = fmt.unpack_from(tlv, self._bytesRead)
+        self._bytesRead += size
+        return val
+
     def _decodeControlByte(self, tlv, decoding):
-        (controlByte,) = struct.unpack(
-            "<B", tlv[self._bytesRead: self._bytesRead + 1])
+        controlByte = self._unpack(tlv, _structU8, 1)
         controlTypeIndex = controlByte & 0xE0
         decoding["tagControl"] = TagControls[controlTypeIndex]
         elementtypeIndex = controlByte & 0x1F
         decoding["type"] = ElementTypes[elementtypeIndex]
-        self._bytesRead += 1
 
     def _decodeControlAndTag(self, tlv, decoding):
         """The control byte specifies the type of a TLV element and how its tag, length and value fields are encoded.
@@ -488,54 +859,31 @@ class TLVReader(object):
             decoding["tag"] = None
             decoding["tagLen"] = 0
         elif decoding["tagControl"] == "Context 1-byte":
-            (decoding["tag"],) = struct.unpack(
-                "<B", tlv[self._bytesRead: self._bytesRead + 1]
-            )
+            decoding["tag"] = self._unpack(tlv, _structU8, 1)
             decoding["tagLen"] = 1
-            self._bytesRead += 1
         elif decoding["tagControl"] == "Common Profile 2-byte":
-            profile = 0
-            (tag,) = struct.unpack(
-                "<H", tlv[self._bytesRead: self._bytesRead + 2])
-            decoding["profileTag"] = (profile, tag)
+            decoding["profileTag"] = (0, self._unpack(tlv, _structU16, 2))
             decoding["tagLen"] = 2
-            self._bytesRead += 2
         elif decoding["tagControl"] == "Common Profile 4-byte":
-            profile = 0
-            (tag,) = struct.unpack(
-                "<L", tlv[self._bytesRead: self._bytesRead + 4])
-            decoding["profileTag"] = (profile, tag)
+            decoding["profileTag"] = (0, self._unpack(tlv, _structU32, 4))
             decoding["tagLen"] = 4
-            self._bytesRead += 4
         elif decoding["tagControl"] == "Implicit Profile 2-byte":
-            profile = None
-            (tag,) = struct.unpack(
-                "<H", tlv[self._bytesRead: self._bytesRead + 2])
-            decoding["profileTag"] = (profile, tag)
+            decoding["profileTag"] = (None, self._unpack(tlv, _structU16, 2))
             decoding["tagLen"] = 2
-            self._bytesRead += 2
         elif decoding["tagControl"] == "Implicit Profile 4-byte":
-            profile = None
-            (tag,) = struct.unpack(
-                "<L", tlv[self._bytesRead: self._bytesRead + 4])
-            decoding["profileTag"] = (profile, tag)
+            decoding["profileTag"] = (None, self._unpack(tlv, _structU32, 4))
             decoding["tagLen"] = 4
-            self._bytesRead += 4
         elif decoding["tagControl"] == "Fully Qualified 6-byte":
-            (vendorId, profileNum) = struct.unpack(
-                "<HH", tlv[self._bytesRead: self._bytesRead + 4])
+            (vendorId, profileNum) = _structU16U16.unpack_from(tlv, self._bytesRead)
             profile = (vendorId << 16) | profileNum
-            (tag,) = struct.unpack(
-                "<H", tlv[self._bytesRead + 4: self._bytesRead + 6])
+            (tag,) = _structU16.unpack_from(tlv, self._bytesRead + 4)
             decoding["profileTag"] = (profile, tag)
             decoding["tagLen"] = 2
             self._bytesRead += 6
         elif decoding["tagControl"] == "Fully Qualified 8-byte":
-            (vendorId, profileNum) = struct.unpack(
-                "<HH", tlv[self._bytesRead: self._bytesRead + 4])
+            (vendorId, profileNum) = _structU16U16.unpack_from(tlv, self._bytesRead)
             profile = (vendorId << 16) | profileNum
-            (tag,) = struct.unpack(
-                "<L", tlv[self._bytesRead + 4: self._bytesRead + 8])
+            (tag,) = _structU32.unpack_from(tlv, self._bytesRead + 4)
             decoding["profileTag"] = (profile, tag)
             decoding["tagLen"] = 4
             self._bytesRead += 8
@@ -545,33 +893,29 @@ class TLVReader(object):
         the element type field. If the element type needs a length field grab the next bytes as length"""
         if "length" in decoding["type"]:
             if "1-byte" in decoding["type"]:
-                (decoding["strDataLen"],) = struct.unpack(
-                    "<B", tlv[self._bytesRead: self._bytesRead + 1]
-                )
+                decoding["strDataLen"] = self._unpack(tlv, _structU8, 1)
                 decoding["strDataLenLen"] = 1
-                self._bytesRead += 1
             elif "2-byte" in decoding["type"]:
-                (decoding["strDataLen"],) = struct.unpack(
-                    "<H", tlv[self._bytesRead: self._bytesRead + 2]
-                )
+                decoding["strDataLen"] = self._unpack(tlv, _structU16, 2)
                 decoding["strDataLenLen"] = 2
-                self._bytesRead += 2
             elif "4-byte" in decoding["type"]:
-                (decoding["strDataLen"],) = struct.unpack(
-                    "<L", tlv[self._bytesRead: self._bytesRead + 4]
-                )
+                decoding["strDataLen"] = self._unpack(tlv, _structU32, 4)
                 decoding["strDataLenLen"] = 4
-                self._bytesRead += 4
             elif "8-byte" in decoding["type"]:
-                (decoding["strDataLen"],) = struct.unpack(
-                    "<Q", tlv[self._bytesRead: self._bytesRead + 8]
-                )
+                decoding["strDataLen"] = self._unpack(tlv, _structU64, 8)
                 decoding["strDataLenLen"] = 8
-                self._bytesRead += 8
         else:
             decoding["strDataLen"] = 0
             decoding["strDataLenLen"] = 0
 
+    def _decodeStrData(self, tlv, decoding):
+        start = self._bytesRead
+        end = start + decoding["strDataLen"]
+        if end > len(tlv):
+            raise struct.error("unpack requires a buffer of %d bytes" % decoding["strDataLen"])
+        self._bytesRead = end
+        return tlv[start:end].tobytes()
+
     def _decodeVal(self, tlv, decoding):
         """decode primitive tlv value to the corresponding python value, tlv array and path are decoded as
         python list, tlv structure is decoded as python dictionary"""
@@ -596,85 +940,41 @@ class TLVReader(object):
         elif decoding["type"] == "Boolean False":
             decoding["value"] = False
         elif decoding["type"] == "Unsigned Integer 1-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<B", tlv[self._bytesRead: self._bytesRead + 1]
-            )
-            decoding["value"] = uint(decoding["value"])
-            self._bytesRead += 1
+            decoding["value"] = uint(self._unpack(tlv, _structU8, 1))
         elif decoding["type"] == "Signed Integer 1-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<b", tlv[self._bytesRead: self._bytesRead + 1]
-            )
-            self._bytesRead += 1
+            decoding["value"] = self._unpack(tlv, _structS8, 1)
         elif decoding["type"] == "Unsigned Integer 2-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<H", tlv[self._bytesRead: self._bytesRead + 2]
-            )
-            decoding["value"] = uint(decoding["value"])
-            self._bytesRead += 2
+            decoding["value"] = uint(self._unpack(tlv, _structU16, 2))
         elif decoding["type"] == "Signed Integer 2-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<h", tlv[self._bytesRead: self._bytesRead + 2]
-            )
-            self._bytesRead += 2
+            decoding["value"] = self._unpack(tlv, _structS16, 2)
         elif decoding["type"] == "Unsigned Integer 4-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<L", tlv[self._bytesRead: self._bytesRead + 4]
-            )
-            decoding["value"] = uint(decoding["value"])
-            self._bytesRead += 4
+            decoding["value"] = uint(self._unpack(tlv, _structU32, 4))
         elif decoding["type"] == "Signed Integer 4-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<l", tlv[self._bytesRead: self._bytesRead + 4]
-            )
-            self._bytesRead += 4
+            decoding["value"] = self._unpack(tlv, _structS32, 4)
         elif decoding["type"] == "Unsigned Integer 8-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<Q", tlv[self._bytesRead: self._bytesRead + 8]
-            )
-            decoding["value"] = uint(decoding["value"])
-            self._bytesRead += 8
+            decoding["value"] = uint(self._unpack(tlv, _structU64, 8))
         elif decoding["type"] == "Signed Integer 8-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<q", tlv[self._bytesRead: self._bytesRead + 8]
-            )
-            self._bytesRead += 8
+            decoding["value"] = self._unpack(tlv, _structS64, 8)
         elif decoding["type"] == "Floating Point 4-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<f", tlv[self._bytesRead: self._bytesRead + 4]
-            )
-            decoding["value"] = float32(decoding["value"])
-            self._bytesRead += 4
+            decoding["value"] = float32(self._unpack(tlv, _structF32, 4))
         elif decoding["type"] == "Floating Point 8-byte value":
-            (decoding["value"],) = struct.unpack(
-                "<d", tlv[self._bytesRead: self._bytesRead + 8]
-            )
-            self._bytesRead += 8
+            decoding["value"] = self._unpack(tlv, _structF64, 8)
         elif "UTF-8 String" in decoding["type"]:
-            (val,) = struct.unpack(
-                "<%ds" % decoding["strDataLen"],
-                tlv[self._bytesRead: self._bytesRead + decoding["strDataLen"]],
-            )
+            val = self._decodeStrData(tlv, decoding)
             try:
                 decoding["value"] = str(val, "utf-8")
             except Exception:
                 decoding["value"] = val
-            self._bytesRead += decoding["strDataLen"]
         elif "Byte String" in decoding["type"]:
-            (val,) = struct.unpack(
-                "<%ds" % decoding["strDataLen"],
-                tlv[self._bytesRead: self._bytesRead + decoding["strDataLen"]],
-            )
-
-            decoding["value"] = val
-            self._bytesRead += decoding["strDataLen"]
+            decoding["value"] = self._decodeStrData(tlv, decoding)
         else:
             raise ValueError("Attempt to decode unsupported TLV type")
 
     def _get(self, tlv, decodings, out):
         endOfEncoding = False
+        tlvLen = len(tlv)
 
-        while len(tlv[self._bytesRead:]) > 0 and endOfEncoding is False:
+        while self._bytesRead < tlvLen and endOfEncoding is False:
             decoding = {}
             self._decodeControlAndTag(tlv, decoding)
             self._decodeStrLength(tlv, decoding)
@@ -684,20 +984,139 @@ class TLVReader(object):
             if decoding["type"] == "End of Collection":
                 endOfEncoding = True
             else:
-                if "profileTag" in list(decoding.keys()):
+                if "profileTag" in decoding:
                     out[decoding["profileTag"]] = decoding["value"]
-                elif "tag" in list(decoding.keys()):
+                elif "tag" in decoding:
                     if isinstance(out, Mapping):
                         tag = decoding["tag"] if decoding["tag"] is not None else "Any"
                         out[tag] = decoding["value"]
                     elif isinstance(out, TLVList):
-                        tag = decoding["tag"] if decoding["tag"] is not None else None
-                        out.append(tag, decoding["value"])
+                        out.append(decoding["tag"], decoding["value"])
                     else:
                         out.append(decoding["value"])
                 else:
                     raise ValueError("Attempt to decode unsupported TLV tag")
 
+    def _getFast(self, tlv, out):
+        """Table driven equivalent of `_get` which does not record the decoding trace."""
+        table = _controlByteTable
+        tlvLen = len(tlv)
+        pos = self._bytesRead
+        isMapping = isinstance(out, Mapping)
+        isPath = isinstance(out, TLVList)
+
+        while pos < tlvLen:
+            controlByte = tlv[pos]
+            entry = table[controlByte]
+            if entry is None:
+                raise KeyError(controlByte & 0x1F)
+            tagForm, tagStruct, tagLen, valForm, valArg, valLen = entry
+            pos += 1
+
+            if tagForm == _TAG_ANONYMOUS:
+                tag = None
+            elif tagForm == _TAG_CONTEXT:
+                tag = tlv[pos] if pos < tlvLen else _structU8.unpack_from(tlv, pos)[0]
+            elif tagForm == _TAG_FULLY_QUALIFIED:
+                (vendorId, profileNum) = _structU16U16.unpack_from(tlv, pos)
+                (tagNum,) = tagStruct.unpack_from(tlv, pos + 4)
+                tag = ((vendorId << 16) | profileNum, tagNum)
+            else:
+                (tagNum,) = tagStruct.unpack_from(tlv, pos)
+                tag = (0 if tagForm == _TAG_COMMON_PROFILE else None, tagNum)
+            pos += tagLen
+
+            if valForm == _VAL_UNSIGNED:
+                val = uint(valArg.unpack_from(tlv, pos)[0])
+                pos += valLen
+            elif valForm == _VAL_SIGNED:
+                (val,) = valArg.unpack_from(tlv, pos)
+                pos += valLen
+            elif valForm == _VAL_CONSTANT:
+                val = valArg
+            elif valForm == _VAL_UTF8_STRING or valForm == _VAL_BYTE_STRING:
+                (strLen,) = valArg.unpack_from(tlv, pos)
+                pos += valLen
+                end = pos + strLen
+                if end > tlvLen:
+                    raise struct.error("unpack requires a buffer of %d bytes" % strLen)
+                val = tlv[pos:end].tobytes()
+                pos = end
+                if valForm == _VAL_UTF8_STRING:
+                    try:
+                        val = val.decode("utf-8")
+                    except Exception:
+                        pass
+            elif valForm == _VAL_STRUCTURE or valForm == _VAL_ARRAY or valForm == _VAL_PATH:
+                if valForm == _VAL_STRUCTURE:
+                    val = {}
+                elif valForm == _VAL_ARRAY:
+                    val = []
+                else:
+                    val = TLVList()
+                self._bytesRead = pos
+                self._getFast(tlv, val)
+                pos = self._bytesRead
+            elif valForm == _VAL_FLOAT32:
+                val = float32(valArg.unpack_from(tlv, pos)[0])
+                pos += valLen
+            elif valForm == _VAL_FLOAT64:
+                (val,) = valArg.unpack_from(tlv, pos)
+                pos += valLen
+            else:
+                # End of Collection
+                break
+
+            if isinstance(tag, tuple):
+                out[tag] = val
+            elif isMapping:
+                out[tag if tag is not None else "Any"] = val
+            elif isPath:
+                out.append(tag, val)
+            else:
+                out.append(val)
+
+        self._bytesRead = pos
+
+
+def _skipElement(tlv, pos):
+    """Returns (tag, end) for the element starting at pos, skipping over the content of containers."""
+    tlvLen = len(tlv)
+    depth = 0
+    tag = None
+    while True:
+        if pos >= tlvLen:
+            raise ValueError("Truncated TLV container")
+        controlByte = tlv[pos]
+        entry = _controlByteTable[controlByte]
+        if entry is None:
+            raise KeyError(controlByte & 0x1F)
+        tagForm, tagStruct, tagLen, valForm, valArg, valLen = entry
+        if depth == 0:
+            if tagForm == _TAG_ANONYMOUS:
+                tag = None
+            elif tagForm == _TAG_CONTEXT:
+                (tag,) = _structU8.unpack_from(tlv, pos + 1)
+            elif tagForm == _TAG_FULLY_QUALIFIED:
+                (vendorId, profileNum) = _structU16U16.unpack_from(tlv, pos + 1)
+                tag = ((vendorId << 16) | profileNum, tagStruct.unpack_from(tlv, pos + 5)[0])
+            else:
+                tag = (0 if tagForm == _TAG_COMMON_PROFILE else None, tagStruct.unpack_from(tlv, pos + 1)[0])
+        pos += 1 + tagLen
+        if valForm == _VAL_UTF8_STRING or valForm == _VAL_BYTE_STRING:
+            (strLen,) = valArg.unpack_from(tlv, pos)
+            pos += valLen + strLen
+        elif valForm == _VAL_STRUCTURE or valForm == _VAL_ARRAY or valForm == _VAL_PATH:
+            depth += 1
+        elif valForm == _VAL_END_OF_CONTAINER:
+            depth -= 1
+        elif valForm != _VAL_CONSTANT:
+            pos += valLen
+        if depth <= 0:
+            if pos > tlvLen:
+                raise ValueError("Truncated TLV element")
+            return tag, pos
+
 
 def tlvTagToSortKey(tag):
     if tag is None:
@@ -715,6 +1134,45 @@ def tlvTagToSortKey(tag):
     return (majorOrder << 32) + tag
 
 
+def _loadCompiledCodec():
+    """Returns the compiled codec module if it has been built and is not disabled, otherwise None.
+
+    Setting the CHIP_TLV_PURE_PYTHON environment variable forces the pure-Python implementation.
+    """
+    if os.environ.get("CHIP_TLV_PURE_PYTHON"):
+        return None
+    try:
+        codec = importlib.import_module(__name__ + "._tlvcodec")
+    except ImportError:
+        return None
+    codec.bind(uint, float32, TLVList, tlvTagToSortKey)
+    return codec
+
+
+_tlvcodec = _loadCompiledCodec()
+
+
+def backend():
+    """Name of the TLV codec backend in use, either "compiled" or "python"."""
+    return "compiled" if _tlvcodec is not None else "python"
+
+
+def useBackend(name):
+    """Select the TLV codec backend used by TLVReader and TLVWriter, "compiled" or "python".
+
+    Mostly useful to compare both backends, the compiled one is selected automatically when it is available.
+    """
+    global _tlvcodec
+    if name == "python":
+        _tlvcodec = None
+    elif name == "compiled":
+        codec = importlib.import_module(__name__ + "._tlvcodec")
+        codec.bind(uint, float32, TLVList, tlvTagToSortKey)
+        _tlvcodec = codec
+    else:
+        raise ValueError("Unknown TLV codec backend: %s" % name)
+
+
 if __name__ == "__main__":
     val = dict(
         [
@@ -0,0 +1,824 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+# coding=utf-8
+
+#
+#   @file
+#         Compiled implementation of the hot paths of chip.tlv.TLVReader and chip.tlv.TLVWriter.
+#
+#         The pure-Python classes in chip/tlv/__init__.py are the reference implementation. This module is only
+#         used when it has been built (see setup.py) and must produce exactly the same values, bytes and
+#         exception types; chip/tlv/conformance.py checks both backends against each other.
+#
+
+import struct
+
+from cpython cimport array as carray
+from cpython.buffer cimport PyBUF_SIMPLE, PyBuffer_Release, PyObject_GetBuffer
+from cpython.bytes cimport PyBytes_AS_STRING, PyBytes_FromStringAndSize
+from libc.stdint cimport int8_t, int16_t, int32_t, int64_t, uint8_t, uint16_t, uint32_t, uint64_t
+from libc.stdlib cimport free, realloc
+from libc.string cimport memcpy
+
+cdef extern from "Python.h":
+    int Py_EnterRecursiveCall(const char *where)
+    void Py_LeaveRecursiveCall()
+
+from array import array as _array
+from collections.abc import Mapping, Sequence
+from enum import Enum
+
+# Bound by chip.tlv once the Python types are defined, see bind().
+cdef object _uint = None
+cdef object _float32 = None
+cdef object _TLVList = None
+cdef object _tlvTagToSortKey = None
+
+cdef object _structError = struct.error
+# uint.__init__ only rejects negative values, which an unsigned decode can never produce, so decoded values are
+# created with int.__new__ directly instead of going through the Python level constructor.
+cdef object _intNew = int.__new__
+# Decoded 1 and 2 byte unsigned integers (vendor and product ids, lengths, enums) are shared instances, which also
+# keeps large arrays of them from putting pressure on the garbage collector.
+cdef list _smallUintCache = [None] * 0x10000
+
+
+cdef inline object _makeUint(uint64_t value):
+    cdef object cached
+    if value < 0x10000:
+        cached = _smallUintCache[value]
+        if cached is None:
+            cached = _intNew(_uint, value)
+            _smallUintCache[value] = cached
+        return cached
+    return _intNew(_uint, value)
+
+
+def bind(uint, float32, TLVList, tlvTagToSortKey):
+    global _uint, _float32, _TLVList, _tlvTagToSortKey
+    if uint is not _uint:
+        _smallUintCache[:] = [None] * 0x10000
+    _uint = uint
+    _float32 = float32
+    _TLVList = TLVList
+    _tlvTagToSortKey = tlvTagToSortKey
+
+
+cdef object _floatStruct = struct.Struct("<f")
+cdef object _doubleStruct = struct.Struct("<d")
+
+cdef enum:
+    TLV_TYPE_SIGNED_INTEGER = 0x00
+    TLV_TYPE_UNSIGNED_INTEGER = 0x04
+    TLV_TYPE_BOOLEAN = 0x08
+    TLV_TYPE_UTF8_STRING = 0x0C
+    TLV_TYPE_BYTE_STRING = 0x10
+    TLV_TYPE_NULL = 0x14
+    TLV_TYPE_STRUCTURE = 0x15
+    TLV_TYPE_ARRAY = 0x16
+    TLV_TYPE_PATH = 0x17
+    TLV_END_OF_CONTAINER = 0x18
+    TLV_TAG_CONTROL_CONTEXT_SPECIFIC = 0x20
+
+
+cdef inline uint64_t _readLE(const uint8_t *p, int n) noexcept:
+    cdef uint64_t v = 0
+    cdef int i
+    for i in range(n - 1, -1, -1):
+        v = (v << 8) | p[i]
+    return v
+
+
+# The reference implementation recurses once per nested container, so it raises RecursionError when nesting exceeds
+# sys.getrecursionlimit(). The compiled encoder and decoder recurse on the C stack, which would overflow long before
+# that; instead every nested container is counted against the interpreter's recursion limit with
+# Py_EnterRecursiveCall. depth is the number of containers entered and not yet left, so the counter can be restored
+# in one place when an error unwinds several levels at once.
+cdef inline int _enterContainer(int *depth) except -1:
+    if Py_EnterRecursiveCall(""):
+        return -1
+    depth[0] += 1
+    return 0
+
+
+cdef inline void _leaveContainers(int *depth, int count) noexcept:
+    while count > 0:
+        Py_LeaveRecursiveCall()
+        depth[0] -= 1
+        count -= 1
+
+
+cdef class _Decoder:
+    cdef const uint8_t *data
+    cdef Py_ssize_t length
+    cdef Py_ssize_t pos
+    cdef int depth
+
+    cdef inline int need(self, Py_ssize_t n) except -1:
+        if self.length - self.pos < n:
+            raise _structError("unpack_from requires a buffer of at least %d bytes" % (self.pos + n))
+        return 0
+
+    cdef object decodeContainer(self, object out, int outKind):
+        _enterContainer(&self.depth)
+        self.decode(out, outKind)
+        _leaveContainers(&self.depth, 1)
+        return out
+
+    cdef object decode(self, object out, int outKind):
+        # outKind: 0 mapping, 1 TLVList, 2 list
+        cdef uint8_t controlByte, elementType, tagControl
+        cdef uint64_t u, strLen
+        cdef int size
+        cdef object tag, val
+        cdef const uint8_t *p
+
+        while self.pos < self.length:
+            controlByte = self.data[self.pos]
+            elementType = controlByte & 0x1F
+            tagControl = controlByte & 0xE0
+            if elementType > TLV_END_OF_CONTAINER:
+                raise KeyError(elementType)
+            self.pos += 1
+
+            if tagControl == 0x00:
+                tag = None
+            elif tagControl == 0x20:
+                self.need(1)
+                tag = self.data[self.pos]
+                self.pos += 1
+            elif tagControl == 0x40 or tagControl == 0x60:
+                size = 2 if tagControl == 0x40 else 4
+                self.need(size)
+                tag = (0, _readLE(self.data + self.pos, size))
+                self.pos += size
+            elif tagControl == 0x80 or tagControl == 0xA0:
+                size = 2 if tagControl == 0x80 else 4
+                self.need(size)
+                tag = (None, _readLE(self.data + self.pos, size))
+                self.pos += size
+            else:
+                size = 2 if tagControl == 0xC0 else 4
+                self.need(4)
+                u = (_readLE(self.data + self.pos, 2) << 16) | _readLE(self.data + self.pos + 2, 2)
+                self.need(4 + size)
+                tag = (u, _readLE(self.data + self.pos + 4, size))
+                self.pos += 4 + size
+
+            if elementType <= 0x03:
+                size = 1 << elementType
+                self.need(size)
+                p = self.data + self.pos
+                if size == 1:
+                    val = (<int8_t>p[0])
+                elif size == 2:
+                    val = (<int16_t>_readLE(p, 2))
+                elif size == 4:
+                    val = (<int32_t>_readLE(p, 4))
+                else:
+                    val = (<int64_t>_readLE(p, 8))
+                self.pos += size
+            elif elementType <= 0x07:
+                size = 1 << (elementType - 0x04)
+                self.need(size)
+                val = _makeUint(_readLE(self.data + self.pos, size))
+                self.pos += size
+            elif elementType == 0x08:
+                val = False
+            elif elementType == 0x09:
+                val = True
+            elif elementType == 0x0A:
+                self.need(4)
+                val = _float32(_floatStruct.unpack(PyBytes_FromStringAndSize(<char *>self.data + self.pos, 4))[0])
+                self.pos += 4
+            elif elementType == 0x0B:
+                self.need(8)
+                val = _doubleStruct.unpack(PyBytes_FromStringAndSize(<char *>self.data + self.pos, 8))[0]
+                self.pos += 8
+            elif elementType <= 0x13:
+                size = 1 << (elementType & 0x03)
+                self.need(size)
+                strLen = _readLE(self.data + self.pos, size)
+                self.pos += size
+                if strLen > <uint64_t>(self.length - self.pos):
+                    raise _structError("unpack requires a buffer of %d bytes" % strLen)
+                val = PyBytes_FromStringAndSize(<char *>self.data + self.pos, <Py_ssize_t>strLen)
+                self.pos += <Py_ssize_t>strLen
+                if elementType <= 0x0F:
+                    try:
+                        val = val.decode("utf-8")
+                    except Exception:
+                        pass
+            elif elementType == 0x14:
+                val = None
+            elif elementType == TLV_TYPE_STRUCTURE:
+                val = self.decodeContainer({}, 0)
+            elif elementType == TLV_TYPE_ARRAY:
+                val = self.decodeContainer([], 2)
+            elif elementType == TLV_TYPE_PATH:
+                val = self.decodeContainer(_TLVList(), 1)
+            else:
+                # End of Collection
+                break
+
+            if type(tag) is tuple:
+                out[tag] = val
+            elif outKind == 0:
+                out[tag if tag is not None else "Any"] = val
+            elif outKind == 1:
+                out.append(tag, val)
+            else:
+                out.append(val)
+        return out
+
+
+def decode(tlv, Py_ssize_t offset=0):
+    """Decode tlv starting at offset the same way TLVReader.get() does.
+
+    Returns a tuple of the decoded dictionary and the offset after the last consumed byte.
+    """
+    cdef const uint8_t[::1] view = tlv
+    cdef _Decoder decoder = _Decoder()
+    cdef dict out = {}
+    decoder.length = view.shape[0]
+    decoder.pos = offset
+    if decoder.length > 0:
+        decoder.data = &view[0]
+        try:
+            # The top level counts as a container too, the reference implementation spends a frame on it.
+            decoder.decodeContainer(out, 0)
+        finally:
+            _leaveContainers(&decoder.depth, decoder.depth)
+    return out, decoder.pos
+
+
+cdef class _Encoder:
+    cdef object writer
+    cdef list containerStack
+    cdef char *buf
+    cdef Py_ssize_t size
+    cdef Py_ssize_t capacity
+    cdef int depth
+
+    def __cinit__(self, writer):
+        self.writer = writer
+        self.containerStack = writer._containerStack
+        self.buf = NULL
+        self.size = 0
+        self.capacity = 0
+        self.depth = 0
+
+    def __dealloc__(self):
+        free(self.buf)
+
+    cdef int reserve(self, Py_ssize_t n) except -1:
+        cdef Py_ssize_t capacity
+        cdef char *buf
+        if self.size + n <= self.capacity:
+            return 0
+        capacity = max(self.capacity * 2, self.size + n, 256)
+        buf = <char *>realloc(self.buf, capacity)
+        if buf == NULL:
+            raise MemoryError()
+        self.buf = buf
+        self.capacity = capacity
+        return 0
+
+    cdef inline void writeLE(self, uint64_t v, int n) noexcept:
+        cdef int i
+        for i in range(n):
+            self.buf[self.size] = <char>(v & 0xFF)
+            self.size += 1
+            v >>= 8
+
+    cdef int flush(self) except -1:
+        if self.size:
+            self.writer._encoding.extend(PyBytes_FromStringAndSize(self.buf, self.size))
+            self.size = 0
+        return 0
+
+    cdef inline int lenOfLen(self, uint64_t v) noexcept:
+        if v <= 0xFF:
+            return 1
+        elif v <= 0xFFFF:
+            return 2
+        elif v <= 0xFFFFFFFF:
+            return 4
+        return 8
+
+    cdef int writeControlAndTag(self, int elementType, object tag, int lenOfLenOrVal) except -1:
+        cdef int controlByte = elementType
+        cdef bytes encoded
+        if lenOfLenOrVal == 2:
+            controlByte |= 1
+        elif lenOfLenOrVal == 4:
+            controlByte |= 2
+        elif lenOfLenOrVal == 8:
+            controlByte |= 3
+        if tag is None:
+            if (elementType != TLV_END_OF_CONTAINER and len(self.containerStack) != 0
+                    and self.containerStack[0] == TLV_TYPE_STRUCTURE):
+                raise ValueError("Attempt to encode anonymous tag within TLV structure")
+            self.reserve(1)
+            self.writeLE(controlByte, 1)
+            return 0
+        if type(tag) is int:
+            if tag < 0 or tag > 0xFF:
+                raise ValueError("Context-specific TLV tag number out of range")
+            if len(self.containerStack) == 0:
+                raise ValueError("Attempt to encode context-specific TLV tag at top level")
+            if self.containerStack[0] == TLV_TYPE_ARRAY:
+                raise ValueError("Attempt to encode context-specific tag within TLV array")
+            self.reserve(2)
+            self.writeLE(controlByte | TLV_TAG_CONTROL_CONTEXT_SPECIFIC, 1)
+            self.writeLE(<uint64_t>tag, 1)
+            return 0
+        # Profile tags and unusual tag objects are rare, defer to the reference implementation.
+        encoded = bytes(self.writer._encodeControlAndTag(elementType, tag, lenOfLenOrVal=lenOfLenOrVal))
+        self.reserve(len(encoded))
+        memcpy(self.buf + self.size, PyBytes_AS_STRING(encoded), len(encoded))
+        self.size += len(encoded)
+        return 0
+
+    cdef int writeRaw(self, const char *data, Py_ssize_t n) except -1:
+        self.reserve(n)
+        memcpy(self.buf + self.size, data, n)
+        self.size += n
+        return 0
+
+    cdef int putSignedInt(self, object tag, object val) except -1:
+        cdef int64_t v
+        cdef int n
+        if not (-9223372036854775808 <= val <= 9223372036854775807):
+            raise ValueError("Integer value out of range")
+        v = val
+        if -128 <= v <= 127:
+            n = 1
+        elif -32768 <= v <= 32767:
+            n = 2
+        elif -2147483648 <= v <= 2147483647:
+            n = 4
+        else:
+            n = 8
+        self.writeControlAndTag(TLV_TYPE_SIGNED_INTEGER, tag, n)
+        self.reserve(n)
+        self.writeLE(<uint64_t>v, n)
+        return 0
+
+    cdef int putUnsignedInt(self, object tag, object val) except -1:
+        cdef uint64_t v
+        cdef int n
+        if val < 0 or val > 18446744073709551615:
+            raise ValueError("Integer value out of range")
+        v = val
+        n = self.lenOfLen(v)
+        self.writeControlAndTag(TLV_TYPE_UNSIGNED_INTEGER, tag, n)
+        self.reserve(n)
+        self.writeLE(v, n)
+        return 0
+
+    cdef int putData(self, int elementType, object tag, bytes data) except -1:
+        cdef Py_ssize_t dataLen = len(data)
+        cdef int n = self.lenOfLen(<uint64_t>dataLen)
+        self.writeControlAndTag(elementType, tag, n)
+        self.reserve(n)
+        self.writeLE(<uint64_t>dataLen, n)
+        self.writeRaw(PyBytes_AS_STRING(data), dataLen)
+        return 0
+
+    cdef int startContainer(self, object tag, int containerType) except -1:
+        _enterContainer(&self.depth)
+        self.writeControlAndTag(containerType, tag, 0)
+        self.containerStack.insert(0, containerType)
+        return 0
+
+    cdef int endContainer(self) except -1:
+        self.containerStack.pop(0)
+        self.reserve(1)
+        self.writeLE(TLV_END_OF_CONTAINER, 1)
+        _leaveContainers(&self.depth, 1)
+        return 0
+
+    cdef int put(self, object tag, object val) except -1:
+        cdef object valType = type(val)
+        if val is None:
+            self.writeControlAndTag(TLV_TYPE_NULL, tag, 0)
+        elif valType is bool:
+            self.writeControlAndTag(TLV_TYPE_BOOLEAN + (1 if val else 0), tag, 0)
+        elif valType is int:
+            self.putSignedInt(tag, val)
+        elif valType is _uint:
+            self.putUnsignedInt(tag, val)
+        elif valType is str:
+            self.putData(TLV_TYPE_UTF8_STRING, tag, val.encode("utf-8"))
+        elif valType is bytes:
+            self.putData(TLV_TYPE_BYTE_STRING, tag, val)
+        elif valType is dict:
+            self.startContainer(tag, TLV_TYPE_STRUCTURE)
+            for containedTag, containedVal in sorted(val.items(), key=_sortKey):
+                self.put(containedTag, containedVal)
+            self.endContainer()
+        elif valType is list or valType is tuple:
+            self.startContainer(tag, TLV_TYPE_ARRAY)
+            for containedVal in val:
+                self.put(None, containedVal)
+            self.endContainer()
+        else:
+            self.putGeneric(tag, val)
+        return 0
+
+    cdef int putGeneric(self, object tag, object val) except -1:
+        """Mirrors the isinstance chain of TLVWriter.put for subclasses and less common types."""
+        if isinstance(val, Enum) or isinstance(val, float):
+            # Rare in practice, let the reference implementation encode them.
+            self.flush()
+            self.writer._putPython(tag, val)
+        elif isinstance(val, bool):
+            self.writeControlAndTag(TLV_TYPE_BOOLEAN + (1 if val else 0), tag, 0)
+        elif isinstance(val, _uint):
+            self.putUnsignedInt(tag, val)
+        elif isinstance(val, int):
+            self.putSignedInt(tag, val)
+        elif isinstance(val, str):
+            self.putData(TLV_TYPE_UTF8_STRING, tag, val.encode("utf-8"))
+        elif isinstance(val, bytes) or isinstance(val, bytearray):
+            self.putData(TLV_TYPE_BYTE_STRING, tag, bytes(val))
+        elif isinstance(val, Mapping):
+            self.startContainer(tag, TLV_TYPE_STRUCTURE)
+            items = sorted(val.items(), key=_sortKey) if type(val) is dict else val.items()
+            for containedTag, containedVal in items:
+                self.put(containedTag, containedVal)
+            self.endContainer()
+        elif isinstance(val, _TLVList):
+            self.startContainer(tag, TLV_TYPE_PATH)
+            for containedTag, containedVal in val:
+                self.put(containedTag, containedVal)
+            self.endContainer()
+        elif isinstance(val, Sequence):
+            self.startContainer(tag, TLV_TYPE_ARRAY)
+            for containedVal in val:
+                self.put(None, containedVal)
+            self.endContainer()
+        else:
+            raise ValueError("Attempt to TLV encode unsupported value")
+        return 0
+
+
+def _sortKey(item):
+    return _tlvTagToSortKey(item[0])
+
+
+def put(writer, tag, val):
+    """Encode val with tag into writer.encoding the same way TLVWriter.put does.
+
+    Output is buffered internally and appended to the writer's encoding in one call. If encoding fails, whatever
+    was produced before the error is still appended, matching the behaviour of the reference implementation.
+    """
+    cdef _Encoder encoder = _Encoder(writer)
+    try:
+        encoder.put(tag, val)
+    finally:
+        _leaveContainers(&encoder.depth, encoder.depth)
+        encoder.flush()
+
+
+# Plan kinds of chip.tlv.schema.
+cdef enum:
+    KIND_UNSIGNED = 0
+    KIND_SIGNED = 1
+    KIND_BOOLEAN = 2
+    KIND_FLOAT = 3
+    KIND_UTF8_STRING = 4
+    KIND_BYTE_STRING = 5
+    KIND_ARRAY = 6
+    KIND_STRUCTURE = 7
+
+cdef tuple _decodeErrors = (IndexError, _structError, ValueError, KeyError)
+
+
+cdef class _SchemaDecoder:
+    # Walks a plan built by chip.tlv.schema. Errors are created by the schema module's error() and nest() so both
+    # decoders report them identically.
+    cdef const uint8_t *data
+    cdef Py_ssize_t length
+    cdef Py_ssize_t pos
+    cdef object error
+    cdef object nest
+
+    cdef inline int need(self, Py_ssize_t n) except -1:
+        if self.length - self.pos < n:
+            raise self.error("truncated")
+        return 0
+
+    cdef object read(self, tuple plan, uint8_t elementType):
+        cdef int kind = plan[0]
+        if kind == KIND_UNSIGNED:
+            return self.readUnsigned(plan, elementType)
+        if kind == KIND_STRUCTURE:
+            return self.readStructure(plan, elementType)
+        if kind == KIND_ARRAY:
+            return self.readArray(plan, elementType)
+        if kind == KIND_UTF8_STRING or kind == KIND_BYTE_STRING:
+            return self.readString(plan, kind, elementType)
+        if kind == KIND_SIGNED:
+            return self.readSigned(plan, elementType)
+        if kind == KIND_BOOLEAN:
+            if elementType != 0x08 and elementType != 0x09:
+                raise self.error("type", KIND_BOOLEAN, elementType)
+            return elementType == 0x09
+        if elementType == 0x0A:
+            self.need(4)
+            self.pos += 4
+            return _float32(_floatStruct.unpack(PyBytes_FromStringAndSize(<char *>self.data + self.pos - 4, 4))[0])
+        if elementType == 0x0B:
+            self.need(8)
+            self.pos += 8
+            return _doubleStruct.unpack(PyBytes_FromStringAndSize(<char *>self.data + self.pos - 8, 8))[0]
+        raise self.error("type", KIND_FLOAT, elementType)
+
+    cdef inline uint64_t readUnsignedValue(self, uint64_t minimum, uint64_t maximum, uint8_t elementType) except? 0:
+        cdef int size
+        cdef uint64_t val
+        if elementType < 0x04 or elementType > 0x07:
+            raise self.error("type", KIND_UNSIGNED, elementType)
+        size = 1 << (elementType - 0x04)
+        self.need(size)
+        val = _readLE(self.data + self.pos, size)
+        self.pos += size
+        if val < minimum or val > maximum:
+            raise self.error("range", val, minimum, maximum)
+        return val
+
+    cdef object readUnsigned(self, tuple plan, uint8_t elementType):
+        return _makeUint(self.readUnsignedValue(plan[1], plan[2], elementType))
+
+    cdef object readSigned(self, tuple plan, uint8_t elementType):
+        cdef int size
+        cdef int64_t val
+        cdef int64_t minimum = plan[1], maximum = plan[2]
+        cdef const uint8_t *p
+        if elementType > 0x03:
+            raise self.error("type", KIND_SIGNED, elementType)
+        size = 1 << elementType
+        self.need(size)
+        p = self.data + self.pos
+        if size == 1:
+            val = <int8_t>p[0]
+        elif size == 2:
+            val = <int16_t>_readLE(p, 2)
+        elif size == 4:
+            val = <int32_t>_readLE(p, 4)
+        else:
+            val = <int64_t>_readLE(p, 8)
+        self.pos += size
+        if val < minimum or val > maximum:
+            raise self.error("range", val, minimum, maximum)
+        return val
+
+    cdef object readString(self, tuple plan, int kind, uint8_t elementType):
+        cdef int lengthForm = elementType - (0x0C if kind == KIND_UTF8_STRING else 0x10)
+        cdef int size
+        cdef uint64_t length, minLength = plan[1], maxLength = plan[2]
+        cdef object val
+        if lengthForm < 0 or lengthForm > 3:
+            raise self.error("type", kind, elementType)
+        size = 1 << lengthForm
+        self.need(size)
+        length = _readLE(self.data + self.pos, size)
+        self.pos += size
+        if length < minLength or length > maxLength:
+            raise self.error("length", length, minLength, maxLength)
+        if length > <uint64_t>(self.length - self.pos):
+            raise self.error("truncated")
+        val = PyBytes_FromStringAndSize(<char *>self.data + self.pos, <Py_ssize_t>length)
+        self.pos += <Py_ssize_t>length
+        if kind == KIND_UTF8_STRING:
+            try:
+                val = val.decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise self.error("utf8", e.reason)
+        return val
+
+    cdef object readArray(self, tuple plan, uint8_t elementType):
+        cdef tuple elementPlan = plan[1]
+        cdef uint64_t minCount = plan[2], maxCount = plan[3]
+        cdef object typecode = plan[4]
+        cdef bint unsigned = elementPlan[0] == KIND_UNSIGNED
+        cdef uint64_t minimum = 0, maximum = 0, val
+        cdef uint64_t count = 0
+        cdef uint8_t controlByte
+        cdef bint inElement = False
+        cdef list values = []
+        cdef carray.array typed = None
+        cdef int itemsize = 0
+        if elementType != TLV_TYPE_ARRAY:
+            raise self.error("type", KIND_ARRAY, elementType)
+        if unsigned:
+            minimum = elementPlan[1]
+            maximum = elementPlan[2]
+            if typecode is not None:
+                # Filled in place, the schema has checked that the element range fits the type code.
+                typed = _array(typecode)
+                itemsize = typed.ob_descr.itemsize
+        # One try around the loop, entering a try block per element is measurably slower.
+        try:
+            while True:
+                self.need(1)
+                controlByte = self.data[self.pos]
+                if controlByte == TLV_END_OF_CONTAINER:
+                    break
+                if controlByte & 0xE0:
+                    raise self.error("anonymous")
+                if count >= maxCount:
+                    raise self.error("tooMany", maxCount)
+                self.pos += 1
+                inElement = True
+                if typed is not None:
+                    val = self.readUnsignedValue(minimum, maximum, controlByte & 0x1F)
+                    carray.resize_smart(typed, count + 1)
+                    if itemsize == 1:
+                        typed.data.as_uchars[count] = <uint8_t>val
+                    elif itemsize == 2:
+                        (<uint16_t *>typed.data.as_voidptr)[count] = <uint16_t>val
+                    elif itemsize == 4:
+                        (<uint32_t *>typed.data.as_voidptr)[count] = <uint32_t>val
+                    else:
+                        (<uint64_t *>typed.data.as_voidptr)[count] = val
+                elif unsigned:
+                    values.append(_makeUint(self.readUnsignedValue(minimum, maximum, controlByte & 0x1F)))
+                else:
+                    values.append(self.read(elementPlan, controlByte & 0x1F))
+                inElement = False
+                count += 1
+        except _decodeErrors as e:
+            if inElement:
+                raise self.nest(e, "[%d]" % count)
+            raise
+        if count < minCount:
+            raise self.error("tooFew", count, minCount)
+        self.pos += 1
+        if typed is not None:
+            return typed
+        if typecode is not None:
+            return _array(typecode, values)
+        return values
+
+    cdef object readTag(self, uint8_t tagControl):
+        cdef int size
+        cdef uint64_t u
+        cdef object tag
+        if tagControl == 0x40 or tagControl == 0x60:
+            size = 2 if tagControl == 0x40 else 4
+            self.need(size)
+            tag = (0, _readLE(self.data + self.pos, size))
+        elif tagControl == 0x80 or tagControl == 0xA0:
+            size = 2 if tagControl == 0x80 else 4
+            self.need(size)
+            tag = (None, _readLE(self.data + self.pos, size))
+        else:
+            size = 2 if tagControl == 0xC0 else 4
+            self.need(4 + size)
+            u = (_readLE(self.data + self.pos, 2) << 16) | _readLE(self.data + self.pos + 2, 2)
+            tag = (u, _readLE(self.data + self.pos + 4, size))
+            size += 4
+        self.pos += size
+        return tag
+
+    cdef int skip(self) except -1:
+        # Skips the member at pos like chip.tlv._skipElement(), any malformed encoding is reported as truncated.
+        cdef Py_ssize_t depth = 0
+        cdef uint8_t controlByte, elementType, tagControl
+        cdef int size
+        cdef uint64_t strLen
+        while True:
+            self.need(1)
+            controlByte = self.data[self.pos]
+            elementType = controlByte & 0x1F
+            tagControl = controlByte & 0xE0
+            if elementType > TLV_END_OF_CONTAINER:
+                raise self.error("truncated")
+            self.pos += 1
+            if tagControl == 0x20:
+                self.pos += 1
+            elif tagControl == 0x40 or tagControl == 0x80:
+                self.pos += 2
+            elif tagControl == 0x60 or tagControl == 0xA0:
+                self.pos += 4
+            elif tagControl == 0xC0:
+                self.pos += 6
+            elif tagControl == 0xE0:
+                self.pos += 8
+            if self.pos > self.length:
+                raise self.error("truncated")
+            if elementType <= 0x07:
+                self.pos += 1 << (elementType & 0x03)
+            elif elementType == 0x0A:
+                self.pos += 4
+            elif elementType == 0x0B:
+                self.pos += 8
+            elif 0x0C <= elementType <= 0x13:
+                size = 1 << (elementType & 0x03)
+                self.need(size)
+                strLen = _readLE(self.data + self.pos, size)
+                self.pos += size
+                if strLen > <uint64_t>(self.length - self.pos):
+                    raise self.error("truncated")
+                self.pos += <Py_ssize_t>strLen
+            elif elementType == TLV_TYPE_STRUCTURE or elementType == TLV_TYPE_ARRAY or elementType == TLV_TYPE_PATH:
+                depth += 1
+            elif elementType == TLV_END_OF_CONTAINER:
+                depth -= 1
+            if self.pos > self.length:
+                raise self.error("truncated")
+            if depth <= 0:
+                return 0
+
+    cdef object readStructure(self, tuple plan, uint8_t elementType):
+        cdef tuple contextFields = plan[1]
+        cdef dict profileFields = plan[2]
+        cdef tuple names = plan[3]
+        cdef object factory = plan[6]
+        cdef bint ignoreUnknown = plan[7]
+        cdef list values = list(plan[4])
+        cdef Py_ssize_t count = len(names)
+        cdef bytearray seenFlags = bytearray(count)
+        cdef unsigned char *seen = seenFlags
+        cdef uint8_t controlByte, tagControl
+        cdef Py_ssize_t start, index
+        cdef bint inMember = False
+        cdef object tag, entry, name
+        cdef dict result
+        if elementType != TLV_TYPE_STRUCTURE:
+            raise self.error("type", KIND_STRUCTURE, elementType)
+        try:
+            while True:
+                self.need(1)
+                start = self.pos
+                controlByte = self.data[self.pos]
+                if controlByte == TLV_END_OF_CONTAINER:
+                    break
+                tagControl = controlByte & 0xE0
+                self.pos += 1
+                if tagControl == 0x20:
+                    self.need(1)
+                    tag = self.data[self.pos]
+                    entry = contextFields[self.data[self.pos]]
+                    self.pos += 1
+                elif tagControl == 0:
+                    raise self.error("untagged")
+                else:
+                    if controlByte & 0x1F > TLV_END_OF_CONTAINER:
+                        raise self.error("truncated")
+                    tag = self.readTag(tagControl)
+                    entry = profileFields.get(tag)
+                if entry is None:
+                    if not ignoreUnknown:
+                        raise self.error("unknown", tag)
+                    self.pos = start
+                    self.skip()
+                    continue
+                index = entry[0]
+                name = entry[1]
+                if seen[index]:
+                    raise self.nest(self.error("duplicate"), name)
+                seen[index] = 1
+                inMember = True
+                values[index] = self.read(entry[2], controlByte & 0x1F)
+                inMember = False
+        except _decodeErrors as e:
+            if inMember:
+                raise self.nest(e, name)
+            raise
+        for index, name, tag in plan[5]:
+            if not seen[index]:
+                raise self.nest(self.error("missing", tag), name)
+        self.pos += 1
+        result = {}
+        for index in range(count):
+            result[names[index]] = values[index]
+        if factory is not None:
+            return factory(**result)
+        return result
+
+
+def decodeSchema(tlv, tuple plan, error, nest):
+    """Decode the anonymous top-level element of tlv, any object supporting the buffer protocol, with a plan built
+    by chip.tlv.schema.
+    """
+    cdef Py_buffer buffer
+    cdef _SchemaDecoder decoder = _SchemaDecoder()
+    cdef const uint8_t *data
+    PyObject_GetBuffer(tlv, &buffer, PyBUF_SIMPLE)
+    try:
+        if buffer.len == 0:
+            raise error("truncated")
+        data = <const uint8_t *>buffer.buf
+        if data[0] & 0xE0:
+            raise error("topLevel")
+        decoder.data = data
+        decoder.length = buffer.len
+        decoder.pos = 1
+        decoder.error = error
+        decoder.nest = nest
+        return decoder.read(plan, data[0] & 0x1F)
+    finally:
+        PyBuffer_Release(&buffer)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+#
+#   @file
+#         Conformance checks shared by all TLV codec backends.
+#
+#         Every case is encoded and decoded with each available backend and the results, including the exception
+#         type raised for invalid input, are compared with the pure-Python reference implementation.
+#         TLVWriter.putMany() is checked against put() the same way, and schema decoding (chip.tlv.schema) of every
+#         buffer is compared including the TLVSchemaError messages. Deeply nested containers must raise
+#         RecursionError on every backend instead of overflowing the C stack.
+#
+#         Usage: python -m chip.tlv.conformance [--seed N] [--cases N]
+#
+
+import argparse
+import random
+import sys
+from collections import OrderedDict
+from enum import IntEnum
+
+from . import TLVList, TLVReader, TLVWriter, backend, float32, uint, useBackend
+from .schema import (Array, Boolean, ByteString, Field, Float, SignedInt, Structure, TLVSchemaError, UnsignedInt,
+                     Utf8String)
+
+
+class _Color(IntEnum):
+    Red = 1
+    Blue = 300
+
+
+# Values covering every element type, tag form and the boundaries of each integer width.
+FIXED_VALUES = [
+    None, True, False, 0, -1, 127, 128, -128, -129, 32767, 32768, -32768, -32769, 2147483647, 2147483648,
+    -2147483648, -2147483649, 9223372036854775807, -9223372036854775808, uint(0), uint(255), uint(256),
+    uint(65535), uint(65536), uint(4294967295), uint(4294967296), uint(18446744073709551615), 1.5, -0.0,
+    float32(2.5), "", "Hello!", "é" * 200, "x" * 70000, b"", b"\xde\xad\xbe\xef", bytearray(b"\x00" * 300),
+    [], ["Goodbye!", 71024724507, False], (1, 2, 3), {}, {1: 0, 0: 1, (None, 42): "BAR", (0x235A0000, 42): "FOO"},
+    {(0, 1): 1, (None, 70000): 2}, OrderedDict([(2, "b"), (1, "a")]), TLVList([(1, "a"), (None, "c"), (2, [1])]),
+    _Color.Blue,
+]
+
+# Values that the writer must reject, with the same exception type on every backend.
+INVALID_VALUES = [
+    {256: 1}, {-1: 1}, {None: 1}, {"a": 1}, [{1: 2}, {None: 3}], object(), 2 ** 63, -2 ** 63 - 1,
+    uint(2 ** 64), "\ud800", [[1, (None, 2)]],
+]
+
+# Covers every schema type, profile tags, optional members and a nested structure that rejects unknown members.
+SCHEMA = Structure([
+    Field(1, "unsigned", UnsignedInt(maximum=70000)),
+    Field(2, "signed", SignedInt(-70000, 70000), optional=True, default=0),
+    Field(3, "flag", Boolean(), optional=True),
+    Field(4, "number", Float(), optional=True),
+    Field(5, "text", Utf8String(maxLength=64), optional=True, default=""),
+    Field(6, "data", ByteString(minLength=1, maxLength=8), optional=True),
+    Field(7, "ids", Array(UnsignedInt(maximum=0xFFFF), minCount=1, maxCount=8, typecode="H"), optional=True),
+    Field(8, "values", Array(SignedInt(), maxCount=4), optional=True),
+    Field((None, 7), "nested", Structure([
+        Field(0, "name", Utf8String()),
+        Field((0, 1), "list", Array(Structure([Field(0, "x", UnsignedInt())])), optional=True),
+    ], ignoreUnknown=False), optional=True),
+])
+
+
+def _randomSchemaValue(rng):
+    val = {1: uint(rng.choice([0, 1, 255, 256, 70000, 70001, rng.randint(0, 70000)]))}
+    optional = {
+        2: lambda: rng.choice([-70001, -1, 0, 70000, rng.randint(-70000, 70000)]),
+        3: lambda: rng.random() < 0.5,
+        4: lambda: rng.choice([1.5, float32(2.5)]),
+        5: lambda: "héllo" * rng.randint(0, 14),
+        6: lambda: bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 9))),
+        7: lambda: [uint(rng.choice([0, 255, 256, 0xFFFF, 0x10000])) for _ in range(rng.randint(0, 9))],
+        8: lambda: [rng.randint(-2 ** 63, 2 ** 63 - 1) for _ in range(rng.randint(0, 5))],
+        (None, 7): lambda: {0: "n", (0, 1): [{0: uint(rng.randint(0, 9))} for _ in range(rng.randint(0, 3))]},
+        9: lambda: [1, {2: "unknown"}],
+    }
+    for tag, make in optional.items():
+        if rng.random() < 0.6:
+            val[tag] = make()
+    return val
+
+
+def _randomValue(rng, depth=0):
+    choice = rng.random()
+    if depth < 4 and choice < 0.15:
+        return {rng.randint(0, 255): _randomValue(rng, depth + 1) for _ in range(rng.randint(0, 6))}
+    if depth < 4 and choice < 0.3:
+        return [_randomValue(rng, depth + 1) for _ in range(rng.randint(0, 6))]
+    if depth < 4 and choice < 0.35:
+        return TLVList([(rng.choice([None, 1, 2]), _randomValue(rng, depth + 1)) for _ in range(rng.randint(0, 3))])
+    return rng.choice([
+        None, rng.random() < 0.5, rng.randint(-2 ** 63, 2 ** 63 - 1), rng.randint(-70000, 70000),
+        uint(rng.randint(0, 2 ** 64 - 1)), uint(rng.randint(0, 70000)), "héllo" * rng.randint(0, 60),
+        bytes(rng.getrandbits(8) for _ in range(rng.randint(0, 300))), rng.random(),
+    ])
+
+
+def _nested(depth):
+    """An array nested depth levels deep."""
+    val = []
+    for _ in range(depth - 1):
+        val = [val]
+    return val
+
+
+def deepDepths():
+    # Well within and well beyond the recursion limit. Close to the limit the exact depth at which a backend raises
+    # RecursionError depends on incidental frames, so those depths are not checked.
+    limit = sys.getrecursionlimit()
+    return [limit // 4, limit * 2, 200000]
+
+
+def _normalize(val):
+    """Make decoded values comparable including their types, e.g. uint versus int and float32 versus float."""
+    if isinstance(val, TLVList):
+        return ("TLVList", [(tag, _normalize(v)) for tag, v in val])
+    if isinstance(val, dict):
+        return ("dict", {tag: _normalize(v) for tag, v in val.items()})
+    if isinstance(val, list):
+        return ("list", [_normalize(v) for v in val])
+    return (type(val).__name__, repr(val))
+
+
+def _encode(tag, val):
+    writer = TLVWriter()
+    try:
+        writer.put(tag, val)
+    except Exception as e:
+        return ("error", type(e).__name__, bytes(writer.encoding), list(writer._containerStack))
+    return ("ok", bytes(writer.encoding))
+
+
+def _encodeMany(tag, val):
+    # putMany() must match put() for each value, and write nothing at all when a value cannot be encoded.
+    writer = TLVWriter()
+    try:
+        offsets = writer.putMany([val, val], tag)
+    except Exception as e:
+        return ("error", type(e).__name__, bytes(writer.encoding), list(writer._containerStack))
+    return ("ok", bytes(writer.encoding), offsets)
+
+
+def _encodeDeep(depth):
+    # Only the outcome is compared, the partial encoding written before RecursionError depends on where it was raised.
+    result = _encode(None, _nested(depth))
+    return result if result[0] == "ok" else result[:2]
+
+
+def _expectedMany(result):
+    if result[0] != "ok":
+        return ("error", result[1], b"", [])
+    return ("ok", result[1] * 2, [0, len(result[1])])
+
+
+def _decode(data):
+    reader = TLVReader(data)
+    try:
+        out = reader.get()
+    except Exception as e:
+        return ("error", type(e).__name__)
+    try:
+        normalized = _normalize(out)
+    except RecursionError:
+        # Only a backend that decodes nesting deeper than the recursion limit gets here.
+        normalized = "nested beyond the recursion limit"
+    return ("ok", normalized, reader._bytesRead)
+
+
+def _decodeSchema(data):
+    try:
+        out = SCHEMA.decode(data)
+    except TLVSchemaError as e:
+        return ("error", str(e))
+    except Exception as e:
+        return ("error", type(e).__name__)
+    return ("ok", _normalize(out))
+
+
+def buildCorpus(seed=0, count=2000):
+    """Returns the (tag, value) pairs to encode and the raw buffers to decode."""
+    rng = random.Random(seed)
+    values = [(None, val) for val in FIXED_VALUES]
+    values += [(None, {1: val}) for val in FIXED_VALUES + INVALID_VALUES]
+    values += [(None, val) for val in INVALID_VALUES] + [(1, 1), ((None, 1), 1), ("tag", 1)]
+    values += [(None, {1: _randomValue(rng), (None, 7): _randomValue(rng)}) for _ in range(count)]
+    values += [(None, _randomSchemaValue(rng)) for _ in range(count // 4)]
+
+    useBackend("python")
+    buffers = []
+    for tag, val in values:
+        result = _encode(tag, val)
+        if result[0] != "ok":
+            continue
+        encoded = result[1]
+        buffers.append(encoded)
+        buffers.append(encoded[:rng.randint(0, len(encoded))])
+        mutated = bytearray(encoded)
+        for _ in range(3):
+            if mutated:
+                mutated[rng.randrange(len(mutated))] = rng.getrandbits(8)
+        buffers.append(bytes(mutated))
+    buffers += [b"", b"\x19", b"\x15\x24", b"\x15\x30\x01\x05ab", b"\x36\x01\x18\x18", b"\xd5\x01"]
+    buffers += [b"\x16" * depth + b"\x18" * depth for depth in deepDepths()] + [b"\x16" * 100000]
+    return values, buffers
+
+
+def availableBackends():
+    backends = ["python"]
+    try:
+        useBackend("compiled")
+        backends.append("compiled")
+    except ImportError:
+        pass
+    return backends
+
+
+def run(seed=0, count=2000):
+    """Runs the conformance cases, returns a list of failure descriptions (empty when all backends conform)."""
+    initial = backend()
+    values, buffers = buildCorpus(seed, count)
+    failures = []
+    try:
+        backends = availableBackends()
+        results = {}
+        for name in backends:
+            useBackend(name)
+            results[name] = ([_encode(tag, val) for tag, val in values], [_decode(buf) for buf in buffers],
+                             [_encodeMany(tag, val) for tag, val in values], [_decodeSchema(buf) for buf in buffers],
+                             [_encodeDeep(depth) for depth in deepDepths()])
+
+        reference = results["python"]
+        for name in backends:
+            encodings, decodings, manyEncodings, schemaDecodings, deepEncodings = results[name]
+            for (tag, val), expected, got in zip(values, reference[0], encodings):
+                if expected != got:
+                    failures.append("%s: encode(%r, %r) = %r, expected %r" % (name, tag, val, got, expected))
+            for (tag, val), single, got in zip(values, reference[0], manyEncodings):
+                expected = _expectedMany(single)
+                if expected != got:
+                    failures.append("%s: putMany(%r, %r) = %r, expected %r" % (name, tag, val, got, expected))
+            for buf, expected, got in zip(buffers, reference[1], decodings):
+                if expected != got:
+                    failures.append("%s: decode(%s) = %r, expected %r" % (name, buf.hex(), got, expected))
+            for buf, expected, got in zip(buffers, reference[3], schemaDecodings):
+                if expected != got:
+                    failures.append("%s: SCHEMA.decode(%s) = %r, expected %r" % (name, buf.hex(), got, expected))
+            for depth, expected, got in zip(deepDepths(), reference[4], deepEncodings):
+                if expected != got:
+                    failures.append("%s: encode(array nested %d deep) = %r, expected %r"
+                                    % (name, depth, got[:2], expected[:2]))
+    finally:
+        useBackend(initial)
+    return backends, len(values) + len(buffers) + len(deepDepths()), failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check every TLV codec backend against the reference")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random cases")
+    parser.add_argument("--cases", type=int, default=2000, help="Number of random values to generate")
+    args = parser.parse_args()
+
+    backends, total, failures = run(args.seed, args.cases)
+    for failure in failures[:20]:
+        print(failure)
+    print("Backends: %s, cases: %d, failures: %d" % (", ".join(backends), total, len(failures)))
+    sys.exit(1 if failures else 0)
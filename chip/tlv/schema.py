@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+#
+#   @file
+#         Schema driven decoding of Chip TLV structures.
+#
+#         A structure is declared once as a Structure of Fields (tag, name, type, mandatory or optional) and compiled
+#         into a decoder specialised for it, which checks element types, integer ranges, string lengths and element
+#         counts while it walks the encoding and builds the result directly, without the generic dictionary
+#         TLVReader.get() returns. Malformed input is rejected at the first offending element with a TLVSchemaError
+#         naming the field.
+#
+#         The pure-Python decoder is made of nested closures. When the compiled codec is in use the same schema is
+#         flattened into a tuple plan that _tlvcodec.decodeSchema() walks instead; both produce the same values and
+#         the same errors.
+#
+#         e.g.
+#             schema = Structure([
+#                 Field(0, "vendor_id", UnsignedInt(maximum=0xFFFF)),
+#                 Field(1, "product_ids", Array(UnsignedInt(maximum=0xFFFF), minCount=1)),
+#                 Field(2, "label", Utf8String(maxLength=32), optional=True, default=""),
+#             ])
+#             values = schema.decode(tlv)  # {"vendor_id": ..., "product_ids": [...], "label": ...}
+#
+
+import importlib
+import struct
+from array import array
+
+from . import (_TAG_COMMON_PROFILE, _TAG_FULLY_QUALIFIED, INT64_MAX, INT64_MIN, TLV_TYPE_ARRAY, TLV_TYPE_STRUCTURE,
+               UINT64_MAX, ElementTypes, TLVEndOfContainer, _controlByteTable, _skipElement, _structU16U16, float32,
+               uint)
+
+_package = importlib.import_module(__package__)
+
+# Plan kinds, shared with _tlvcodec.decodeSchema().
+_KIND_UNSIGNED = 0
+_KIND_SIGNED = 1
+_KIND_BOOLEAN = 2
+_KIND_FLOAT = 3
+_KIND_UTF8_STRING = 4
+_KIND_BYTE_STRING = 5
+_KIND_ARRAY = 6
+_KIND_STRUCTURE = 7
+
+_MISSING = object()
+
+_unsignedStructs = (struct.Struct("<B"), struct.Struct("<H"), struct.Struct("<L"), struct.Struct("<Q"))
+_signedStructs = (struct.Struct("<b"), struct.Struct("<h"), struct.Struct("<l"), struct.Struct("<q"))
+_floatStruct = struct.Struct("<f")
+_doubleStruct = struct.Struct("<d")
+_TLV_TYPE_UTF8_STRING = 0x0C
+_TLV_TYPE_BYTE_STRING = 0x10
+
+_integerTypecodes = "bBhHiIlLqQ"
+
+# Exceptions of the generic TLV helpers and of struct on truncated input or reserved element types.
+_decodeErrors = (IndexError, struct.error, ValueError, KeyError)
+
+_messages = {
+    "type": "expected %s, got %s",
+    "range": "%d is out of range [%d, %d]",
+    "length": "length %d is out of range [%d, %d]",
+    "utf8": "invalid UTF-8 (%s)",
+    "tooMany": "more than %d elements",
+    "tooFew": "%d elements, expected at least %d",
+    "anonymous": "array elements must have anonymous tags",
+    "untagged": "structure members must have tags",
+    "unknown": "unexpected member with tag %r",
+    "duplicate": "duplicate member",
+    "missing": "missing mandatory member with tag %r",
+    "topLevel": "the top-level element must have an anonymous tag",
+    "truncated": "truncated or malformed encoding",
+}
+
+_expected = {
+    _KIND_UNSIGNED: "an unsigned integer",
+    _KIND_SIGNED: "a signed integer",
+    _KIND_BOOLEAN: "a boolean",
+    _KIND_FLOAT: "a floating point number",
+    _KIND_UTF8_STRING: "a UTF-8 string",
+    _KIND_BYTE_STRING: "a byte string",
+    _KIND_ARRAY: "an array",
+    _KIND_STRUCTURE: "a structure",
+}
+
+
+class TLVSchemaError(ValueError):
+    """The encoding does not match the schema.
+
+    path names the offending field relative to the decoded structure, e.g. "product_id_array[3]", and is empty for
+    the top-level element.
+    """
+
+    def __init__(self, path, message):
+        super().__init__("%s: %s" % (path or "<root>", message))
+        self.path = path
+        self.message = message
+
+
+def _error(kind, *args):
+    """Returns the TLVSchemaError for one of _messages, raised by both decoders."""
+    if kind == "type":
+        expected, elementType = args
+        args = (_expected[expected], ElementTypes.get(elementType, "element type 0x%02X" % elementType))
+    return TLVSchemaError("", _messages[kind] % args)
+
+
+def _nest(e, segment):
+    """Prefixes the path of e with the field name or array index segment as it propagates out of a container.
+
+    Exceptions of the generic TLV helpers become a TLVSchemaError here.
+    """
+    if not isinstance(e, TLVSchemaError):
+        e = _error("truncated")
+    if not e.path:
+        path = segment
+    elif e.path[0] == "[":
+        path = segment + e.path
+    else:
+        path = segment + "." + e.path
+    return TLVSchemaError(path, e.message)
+
+
+def _profileTag(tlv, pos):
+    # (tag, value offset) of a member with a profile tag, the tag as TLVReader.get() uses it as key
+    entry = _controlByteTable[tlv[pos]]
+    if entry is None:
+        raise KeyError(tlv[pos] & 0x1F)
+    tagForm, tagStruct, tagLen = entry[:3]
+    if tagForm == _TAG_FULLY_QUALIFIED:
+        (vendorId, profileNum) = _structU16U16.unpack_from(tlv, pos + 1)
+        tag = ((vendorId << 16) | profileNum, tagStruct.unpack_from(tlv, pos + 5)[0])
+    else:
+        tag = (0 if tagForm == _TAG_COMMON_PROFILE else None, tagStruct.unpack_from(tlv, pos + 1)[0])
+    return tag, pos + 1 + tagLen
+
+
+class SchemaType(object):
+    """Base class of the value types.
+
+    compile() returns the pure-Python reader, read(tlv, pos, elementType) -> (value, end), for an element whose
+    control byte and tag end at pos; plan() returns the tuple _tlvcodec.decodeSchema() walks.
+    """
+
+    def compile(self):
+        raise NotImplementedError
+
+    def plan(self):
+        raise NotImplementedError
+
+
+class UnsignedInt(SchemaType):
+    """An unsigned integer in [minimum, maximum], decoded as uint like TLVReader does."""
+
+    def __init__(self, minimum=0, maximum=UINT64_MAX):
+        if not 0 <= minimum <= maximum <= UINT64_MAX:
+            raise ValueError("Invalid unsigned integer range [%d, %d]" % (minimum, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self):
+        minimum, maximum = self.minimum, self.maximum
+
+        def read(tlv, pos, elementType):
+            if elementType < 0x04 or elementType > 0x07:
+                raise _error("type", _KIND_UNSIGNED, elementType)
+            valStruct = _unsignedStructs[elementType - 0x04]
+            (val,) = valStruct.unpack_from(tlv, pos)
+            if val < minimum or val > maximum:
+                raise _error("range", val, minimum, maximum)
+            return uint(val), pos + valStruct.size
+
+        return read
+
+    def plan(self):
+        return (_KIND_UNSIGNED, self.minimum, self.maximum)
+
+
+class SignedInt(SchemaType):
+    def __init__(self, minimum=INT64_MIN, maximum=INT64_MAX):
+        if not INT64_MIN <= minimum <= maximum <= INT64_MAX:
+            raise ValueError("Invalid signed integer range [%d, %d]" % (minimum, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def compile(self):
+        minimum, maximum = self.minimum, self.maximum
+
+        def read(tlv, pos, elementType):
+            if elementType > 0x03:
+                raise _error("type", _KIND_SIGNED, elementType)
+            valStruct = _signedStructs[elementType]
+            (val,) = valStruct.unpack_from(tlv, pos)
+            if val < minimum or val > maximum:
+                raise _error("range", val, minimum, maximum)
+            return val, pos + valStruct.size
+
+        return read
+
+    def plan(self):
+        return (_KIND_SIGNED, self.minimum, self.maximum)
+
+
+class Boolean(SchemaType):
+    def compile(self):
+        def read(tlv, pos, elementType):
+            if elementType != 0x08 and elementType != 0x09:
+                raise _error("type", _KIND_BOOLEAN, elementType)
+            return elementType == 0x09, pos
+
+        return read
+
+    def plan(self):
+        return (_KIND_BOOLEAN,)
+
+
+class Float(SchemaType):
+    """A single or double precision number, single precision ones are decoded as float32 like TLVReader does."""
+
+    def compile(self):
+        def read(tlv, pos, elementType):
+            if elementType == 0x0A:
+                return float32(_floatStruct.unpack_from(tlv, pos)[0]), pos + 4
+            if elementType == 0x0B:
+                return _doubleStruct.unpack_from(tlv, pos)[0], pos + 8
+            raise _error("type", _KIND_FLOAT, elementType)
+
+        return read
+
+    def plan(self):
+        return (_KIND_FLOAT,)
+
+
+class _String(SchemaType):
+    _kind = None
+    _elementType = None
+
+    def __init__(self, minLength=0, maxLength=UINT64_MAX):
+        if not 0 <= minLength <= maxLength <= UINT64_MAX:
+            raise ValueError("Invalid length range [%d, %d]" % (minLength, maxLength))
+        self.minLength = minLength
+        self.maxLength = maxLength
+
+    def compile(self):
+        kind, baseType = self._kind, self._elementType
+        minLength, maxLength = self.minLength, self.maxLength
+        utf8 = kind == _KIND_UTF8_STRING
+
+        def read(tlv, pos, elementType):
+            lengthForm = elementType - baseType
+            if lengthForm < 0 or lengthForm > 3:
+                raise _error("type", kind, elementType)
+            lengthStruct = _unsignedStructs[lengthForm]
+            (length,) = lengthStruct.unpack_from(tlv, pos)
+            pos += lengthStruct.size
+            if length < minLength or length > maxLength:
+                raise _error("length", length, minLength, maxLength)
+            end = pos + length
+            if end > len(tlv):
+                raise _error("truncated")
+            data = tlv[pos:end].tobytes()
+            if utf8:
+                try:
+                    data = data.decode("utf-8")
+                except UnicodeDecodeError as e:
+                    raise _error("utf8", e.reason)
+            return data, end
+
+        return read
+
+    def plan(self):
+        return (self._kind, self.minLength, self.maxLength)
+
+
+class Utf8String(_String):
+    """A UTF-8 string, minLength and maxLength count encoded bytes."""
+
+    _kind = _KIND_UTF8_STRING
+    _elementType = _TLV_TYPE_UTF8_STRING
+
+
+class ByteString(_String):
+    _kind = _KIND_BYTE_STRING
+    _elementType = _TLV_TYPE_BYTE_STRING
+
+
+class Array(SchemaType):
+    """A TLV array whose elements are all of elementType.
+
+    With typecode the elements are collected into an array.array of that type code (e.g. "H" for 16-bit product
+    ids) instead of a list, elementType must then be an UnsignedInt or SignedInt whose range fits the type code.
+    """
+
+    def __init__(self, elementType, minCount=0, maxCount=UINT64_MAX, typecode=None):
+        if not 0 <= minCount <= maxCount:
+            raise ValueError("Invalid element count range [%d, %d]" % (minCount, maxCount))
+        if typecode is not None:
+            if typecode not in _integerTypecodes or not isinstance(elementType, (UnsignedInt, SignedInt)):
+                raise ValueError("Array typecode %r requires integer elements and an integer type code" % typecode)
+            try:
+                array(typecode, [elementType.minimum, elementType.maximum])
+            except OverflowError:
+                raise ValueError("Array typecode %r cannot hold the range of its elements" % typecode)
+        self.elementType = elementType
+        self.minCount = minCount
+        self.maxCount = maxCount
+        self.typecode = typecode
+
+    def compile(self):
+        if isinstance(self.elementType, UnsignedInt):
+            return self._compileUnsigned()
+        minCount, maxCount, typecode = self.minCount, self.maxCount, self.typecode
+        readElement = self.elementType.compile()
+
+        def read(tlv, pos, elementType):
+            if elementType != TLV_TYPE_ARRAY:
+                raise _error("type", _KIND_ARRAY, elementType)
+            values = []
+            append = values.append
+            count = 0
+            while True:
+                controlByte = tlv[pos]
+                if controlByte == TLVEndOfContainer:
+                    break
+                if controlByte & 0xE0:
+                    raise _error("anonymous")
+                if count >= maxCount:
+                    raise _error("tooMany", maxCount)
+                try:
+                    val, pos = readElement(tlv, pos + 1, controlByte & 0x1F)
+                except _decodeErrors as e:
+                    raise _nest(e, "[%d]" % count)
+                append(val)
+                count += 1
+            if count < minCount:
+                raise _error("tooFew", count, minCount)
+            return (array(typecode, values) if typecode is not None else values), pos + 1
+
+        return read
+
+    def _compileUnsigned(self):
+        # Integer arrays such as product ids are the common case, their elements are read inline.
+        minCount, maxCount, typecode = self.minCount, self.maxCount, self.typecode
+        minimum, maximum = self.elementType.minimum, self.elementType.maximum
+
+        def read(tlv, pos, elementType):
+            if elementType != TLV_TYPE_ARRAY:
+                raise _error("type", _KIND_ARRAY, elementType)
+            values = []
+            append = values.append
+            while True:
+                controlByte = tlv[pos]
+                if controlByte == TLVEndOfContainer:
+                    break
+                if controlByte & 0xE0:
+                    raise _error("anonymous")
+                if len(values) >= maxCount:
+                    raise _error("tooMany", maxCount)
+                if controlByte < 0x04 or controlByte > 0x07:
+                    raise _nest(_error("type", _KIND_UNSIGNED, controlByte), "[%d]" % len(values))
+                valStruct = _unsignedStructs[controlByte - 0x04]
+                try:
+                    (val,) = valStruct.unpack_from(tlv, pos + 1)
+                except struct.error as e:
+                    raise _nest(e, "[%d]" % len(values))
+                if val < minimum or val > maximum:
+                    raise _nest(_error("range", val, minimum, maximum), "[%d]" % len(values))
+                append(val)
+                pos += 1 + valStruct.size
+            if len(values) < minCount:
+                raise _error("tooFew", len(values), minCount)
+            if typecode is not None:
+                return array(typecode, values), pos + 1
+            return [uint(val) for val in values], pos + 1
+
+        return read
+
+    def plan(self):
+        return (_KIND_ARRAY, self.elementType.plan(), self.minCount, self.maxCount, self.typecode)
+
+
+class Field(object):
+    """A member of a Structure.
+
+    tag is a context tag number (0-255) or a (profile, tag) tuple like the keys TLVReader.get() returns. Missing
+    optional members take default, missing mandatory members are an error.
+    """
+
+    def __init__(self, tag, name, type, optional=False, default=None):
+        if not (isinstance(tag, tuple) or 0 <= tag <= 255):
+            raise ValueError("Invalid TLV tag %r for field %s" % (tag, name))
+        self.tag = tag
+        self.name = name
+        self.type = type
+        self.optional = optional
+        self.default = default
+
+
+class Structure(SchemaType):
+    """A TLV structure made of fields.
+
+    Decodes to {name: value}, or to factory(**values) when a factory is given. Members with tags that are not
+    declared are skipped when ignoreUnknown is True (the default), as newer encodings may add fields.
+    """
+
+    def __init__(self, fields, factory=None, ignoreUnknown=True):
+        self.fields = list(fields)
+        self.factory = factory
+        self.ignoreUnknown = ignoreUnknown
+        names = set()
+        tags = set()
+        for field in self.fields:
+            if field.name in names or field.tag in tags:
+                raise ValueError("Duplicate field %s (tag %r) in TLV schema" % (field.name, field.tag))
+            names.add(field.name)
+            tags.add(field.tag)
+        self._reader = None
+        self._plan = None
+        self._members = None
+
+    def _layout(self, typeOf):
+        # (context tag table, profile tag dict, names, defaults, mandatory members), shared by both decoders
+        contextFields = [None] * 256
+        profileFields = {}
+        for index, field in enumerate(self.fields):
+            entry = (index, field.name, typeOf(field.type))
+            if isinstance(field.tag, tuple):
+                profileFields[field.tag] = entry
+            else:
+                contextFields[field.tag] = entry
+        names = tuple(field.name for field in self.fields)
+        defaults = tuple(field.default if field.optional else _MISSING for field in self.fields)
+        mandatory = tuple((index, field.name, field.tag) for index, field in enumerate(self.fields)
+                          if not field.optional)
+        return tuple(contextFields), profileFields, names, defaults, mandatory
+
+    def compile(self):
+        contextFields, profileFields, names, defaults, mandatory = self._layout(lambda t: t.compile())
+        factory, ignoreUnknown = self.factory, self.ignoreUnknown
+
+        def read(tlv, pos, elementType):
+            if elementType != TLV_TYPE_STRUCTURE:
+                raise _error("type", _KIND_STRUCTURE, elementType)
+            values = list(defaults)
+            seen = [False] * len(names)
+            while True:
+                controlByte = tlv[pos]
+                if controlByte == TLVEndOfContainer:
+                    break
+                tagControl = controlByte & 0xE0
+                if tagControl == 0x20:
+                    tag = tlv[pos + 1]
+                    entry = contextFields[tag]
+                    valPos = pos + 2
+                elif tagControl == 0:
+                    raise _error("untagged")
+                else:
+                    tag, valPos = _profileTag(tlv, pos)
+                    entry = profileFields.get(tag)
+                if entry is None:
+                    if not ignoreUnknown:
+                        raise _error("unknown", tag)
+                    _, pos = _skipElement(tlv, pos)
+                    continue
+                index, name, readValue = entry
+                if seen[index]:
+                    raise _nest(_error("duplicate"), name)
+                seen[index] = True
+                try:
+                    values[index], pos = readValue(tlv, valPos, controlByte & 0x1F)
+                except _decodeErrors as e:
+                    raise _nest(e, name)
+            for index, name, tag in mandatory:
+                if not seen[index]:
+                    raise _nest(_error("missing", tag), name)
+            result = dict(zip(names, values))
+            return (factory(**result) if factory is not None else result), pos + 1
+
+        return read
+
+    def plan(self):
+        if self._plan is None:
+            contextFields, profileFields, names, defaults, mandatory = self._layout(lambda t: t.plan())
+            self._plan = (_KIND_STRUCTURE, contextFields, profileFields, names, defaults, mandatory, self.factory,
+                          self.ignoreUnknown)
+        return self._plan
+
+    def iterMembers(self, tlv):
+        """Decode the members of the anonymous top-level structure in tlv one at a time, in encoding order.
+
+        Yields (name, value) for each declared member, checked like decode() checks it; undeclared members are skipped
+        (or rejected when ignoreUnknown is False). Missing mandatory members raise TLVSchemaError once the end of the
+        structure is reached, so a caller that stops early only pays for, and only checks, the members before the one
+        it needs. Always uses the pure-Python readers; tlv is any object supporting the buffer protocol and must not be
+        modified while the generator is alive.
+        """
+        if self._members is None:
+            self._members = self._layout(lambda t: t.compile())
+        contextFields, profileFields, names, _, mandatory = self._members
+        tlv = memoryview(tlv)
+        if tlv.format != "B" or tlv.ndim != 1:
+            tlv = tlv.cast("B")
+        if len(tlv) == 0:
+            raise _error("truncated")
+        if tlv[0] & 0xE0:
+            raise _error("topLevel")
+        if tlv[0] & 0x1F != TLV_TYPE_STRUCTURE:
+            raise _error("type", _KIND_STRUCTURE, tlv[0] & 0x1F)
+        seen = [False] * len(names)
+        pos = 1
+        try:
+            while True:
+                controlByte = tlv[pos]
+                if controlByte == TLVEndOfContainer:
+                    break
+                tagControl = controlByte & 0xE0
+                if tagControl == 0x20:
+                    tag = tlv[pos + 1]
+                    entry = contextFields[tag]
+                    valPos = pos + 2
+                elif tagControl == 0:
+                    raise _error("untagged")
+                else:
+                    tag, valPos = _profileTag(tlv, pos)
+                    entry = profileFields.get(tag)
+                if entry is None:
+                    if not self.ignoreUnknown:
+                        raise _error("unknown", tag)
+                    _, pos = _skipElement(tlv, pos)
+                    continue
+                index, name, readValue = entry
+                if seen[index]:
+                    raise _nest(_error("duplicate"), name)
+                seen[index] = True
+                try:
+                    value, pos = readValue(tlv, valPos, controlByte & 0x1F)
+                except _decodeErrors as e:
+                    raise _nest(e, name)
+                yield name, value
+        except TLVSchemaError:
+            raise
+        except _decodeErrors:
+            raise _error("truncated")
+        for index, name, tag in mandatory:
+            if not seen[index]:
+                raise _nest(_error("missing", tag), name)
+
+    def decode(self, tlv):
+        """Decode the anonymous top-level structure in tlv, any object supporting the buffer protocol.
+
+        Raises TLVSchemaError when the encoding does not match the schema.
+        """
+        codec = _package._tlvcodec
+        if codec is not None:
+            return codec.decodeSchema(tlv, self._plan or self.plan(), _error, _nest)
+        if self._reader is None:
+            self._reader = self.compile()
+        with memoryview(tlv) as view:
+            if view.format != "B" or view.ndim != 1:
+                view = view.cast("B")
+            if len(view) == 0:
+                raise _error("truncated")
+            if view[0] & 0xE0:
+                raise _error("topLevel")
+            try:
+                value, _ = self._reader(view, 1, view[0] & 0x1F)
+            except TLVSchemaError:
+                raise
+            except _decodeErrors:
+                raise _error("truncated")
+            return value
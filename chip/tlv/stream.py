@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+#
+#   @file
+#         Incremental, pull style reader for Chip TLV.
+#
+#         TLVStreamReader is fed the encoding chunk by chunk and reports each element as soon as it is complete,
+#         without building the nested dictionary TLVReader.get() returns. extractTags() uses it to pick a few
+#         elements out of a stream and stops reading as soon as all of them have been seen.
+#
+
+import dataclasses
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from . import (_VAL_ARRAY, _VAL_BYTE_STRING, _VAL_CONSTANT, _VAL_END_OF_CONTAINER, _VAL_FLOAT32, _VAL_PATH,
+               _VAL_SIGNED, _VAL_STRUCTURE, _VAL_UNSIGNED, _VAL_UTF8_STRING, _TAG_ANONYMOUS, _TAG_COMMON_PROFILE,
+               _TAG_CONTEXT, _TAG_FULLY_QUALIFIED, TLV_TYPE_ARRAY, TLV_TYPE_PATH, TLV_TYPE_STRUCTURE, _controlByteTable,
+               _structU16U16, float32, uint)
+from .tlvlist import TLVList
+
+START_CONTAINER = "StartContainer"
+VALUE = "Value"
+END_CONTAINER = "EndContainer"
+
+_containerTypes = {
+    _VAL_STRUCTURE: TLV_TYPE_STRUCTURE,
+    _VAL_ARRAY: TLV_TYPE_ARRAY,
+    _VAL_PATH: TLV_TYPE_PATH,
+}
+
+# Consumed input is dropped from the internal buffer once it grows past this many bytes.
+_COMPACT_THRESHOLD = 64 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class TLVEvent:
+    """An element reported by TLVStreamReader.
+
+    type: START_CONTAINER, VALUE or END_CONTAINER.
+    tag: The tag of the element, None for anonymous tags. END_CONTAINER carries the tag of the closed container.
+    path: The tags from the outermost container down to and including this element.
+    value: The decoded value for VALUE events, the container type (TLV_TYPE_STRUCTURE, TLV_TYPE_ARRAY or
+        TLV_TYPE_PATH) for START_CONTAINER and END_CONTAINER events.
+    """
+    type: str
+    tag: Union[None, int, Tuple[Optional[int], int]]
+    path: Tuple
+    value: Any
+
+
+class TLVStreamReader(object):
+    """Decodes TLV incrementally.
+
+    e.g.
+    ```
+    reader = TLVStreamReader()
+    for chunk in chunks:
+        reader.feed(chunk)
+        for event in reader.events():
+            print(event.type, event.path, event.value)
+    reader.close()
+    ```
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._pos = 0
+        self._path = []
+        self._containers = []
+
+    @property
+    def depth(self):
+        """Number of containers currently open."""
+        return len(self._containers)
+
+    def feed(self, data):
+        """Append the next chunk of the encoding."""
+        self._buffer.extend(data)
+
+    def close(self):
+        """Signal the end of the input, raises ValueError if it ends in the middle of an element or container."""
+        if self._pos < len(self._buffer):
+            raise ValueError("Truncated TLV element at end of input")
+        if self._containers:
+            raise ValueError("TLV input ended with %d open container(s)" % len(self._containers))
+
+    def events(self):
+        """Yields an event for every element that is complete in the data fed so far."""
+        while True:
+            event = self._next()
+            if event is None:
+                break
+            yield event
+        if self._pos >= _COMPACT_THRESHOLD or self._pos == len(self._buffer):
+            del self._buffer[:self._pos]
+            self._pos = 0
+
+    def _next(self):
+        buf = self._buffer
+        pos = self._pos
+        avail = len(buf) - pos
+        if avail <= 0:
+            return None
+
+        controlByte = buf[pos]
+        entry = _controlByteTable[controlByte]
+        if entry is None:
+            raise ValueError("Reserved TLV element type 0x%02X" % (controlByte & 0x1F))
+        tagForm, tagStruct, tagLen, valForm, valArg, valLen = entry
+
+        headerLen = 1 + tagLen + (valLen if valForm != _VAL_CONSTANT else 0)
+        if avail < headerLen:
+            return None
+
+        pos += 1
+        if tagForm == _TAG_ANONYMOUS:
+            tag = None
+        elif tagForm == _TAG_CONTEXT:
+            tag = buf[pos]
+        elif tagForm == _TAG_FULLY_QUALIFIED:
+            (vendorId, profileNum) = _structU16U16.unpack_from(buf, pos)
+            tag = ((vendorId << 16) | profileNum, tagStruct.unpack_from(buf, pos + 4)[0])
+        else:
+            tag = (0 if tagForm == _TAG_COMMON_PROFILE else None, tagStruct.unpack_from(buf, pos)[0])
+        pos += tagLen
+
+        if valForm == _VAL_UTF8_STRING or valForm == _VAL_BYTE_STRING:
+            (strLen,) = valArg.unpack_from(buf, pos)
+            if avail < headerLen + strLen:
+                return None
+            pos += valLen
+            val = bytes(buf[pos:pos + strLen])
+            pos += strLen
+            if valForm == _VAL_UTF8_STRING:
+                try:
+                    val = val.decode("utf-8")
+                except Exception:
+                    pass
+        elif valForm == _VAL_CONSTANT:
+            val = valArg
+        elif valForm in _containerTypes:
+            self._pos = pos
+            self._path.append(tag)
+            self._containers.append(_containerTypes[valForm])
+            return TLVEvent(START_CONTAINER, tag, tuple(self._path), self._containers[-1])
+        elif valForm == _VAL_END_OF_CONTAINER:
+            if not self._containers:
+                raise ValueError("TLV end of container without an open container")
+            self._pos = pos
+            event = TLVEvent(END_CONTAINER, self._path[-1], tuple(self._path), self._containers[-1])
+            self._path.pop()
+            self._containers.pop()
+            return event
+        else:
+            (val,) = valArg.unpack_from(buf, pos)
+            pos += valLen
+            if valForm == _VAL_UNSIGNED:
+                val = uint(val)
+            elif valForm == _VAL_FLOAT32:
+                val = float32(val)
+
+        self._pos = pos
+        return TLVEvent(VALUE, tag, tuple(self._path) + (tag,), val)
+
+
+def _insert(out, tag, val):
+    """Place a decoded element into its parent container the same way TLVReader does."""
+    if isinstance(tag, tuple):
+        out[tag] = val
+    elif isinstance(out, dict):
+        out[tag if tag is not None else "Any"] = val
+    elif isinstance(out, TLVList):
+        out.append(tag, val)
+    else:
+        out.append(val)
+
+
+def _newContainer(containerType):
+    if containerType == TLV_TYPE_STRUCTURE:
+        return {}
+    if containerType == TLV_TYPE_ARRAY:
+        return []
+    return TLVList()
+
+
+def extractTags(source: Union[bytes, bytearray, Iterable[bytes]], paths: Iterable[Tuple]) -> Dict[Tuple, Any]:
+    """Extract the elements at the given paths from a TLV encoding, stopping as soon as all of them have been read.
+
+    source is either the whole encoding or an iterable of chunks, e.g. a file read in blocks. Containers at a
+    requested path are materialised the same way TLVReader.get() would decode them. Paths that are not found are
+    missing from the returned dictionary.
+
+    e.g. vendor id and product ids of a certification declaration:
+    ```
+    found = extractTags(chunks, [(None, 1), (None, 2)])
+    ```
+    """
+    wanted = set(paths)
+    found = {}
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = (source,)
+
+    reader = TLVStreamReader()
+    building = []
+    for chunk in source:
+        reader.feed(chunk)
+        for event in reader.events():
+            if building:
+                if event.type == START_CONTAINER:
+                    building.append((event.tag, _newContainer(event.value)))
+                elif event.type == VALUE:
+                    _insert(building[-1][1], event.tag, event.value)
+                else:
+                    tag, container = building.pop()
+                    if building:
+                        _insert(building[-1][1], tag, container)
+                    else:
+                        found[event.path] = container
+            elif event.path in wanted:
+                if event.type == START_CONTAINER:
+                    building.append((event.tag, _newContainer(event.value)))
+                elif event.type == VALUE:
+                    found[event.path] = event.value
+            if len(found) == len(wanted) and not building:
+                return found
+    return found
@@ -18,9 +18,8 @@
 #   limitations under the License.
 #
 
-import dataclasses
 import enum
-from typing import Any, Iterator, List, Tuple, Union
+from typing import Any, Dict, Iterator, List, Tuple, Union
 
 
 class TLVList:
@@ -76,10 +75,22 @@ class TLVList:
     ```
     """
 
-    @dataclasses.dataclass
+    __slots__ = ("_tags", "_values", "_tagIndex")
+
     class TLVListItem:
-        tag: Union[None, int]
-        value: Any
+        # Plain class rather than a dataclass: importing dataclasses pulls in inspect and slows down CLI startup.
+        __slots__ = ("tag", "value")
+
+        def __init__(self, tag: Union[None, int], value: Any):
+            self.tag = tag
+            self.value = value
+
+        def __eq__(self, other):
+            if other.__class__ is not self.__class__:
+                return NotImplemented
+            return (self.tag, self.value) == (other.tag, other.value)
+
+        __hash__ = None
 
         def as_tuple(self):
             return (self.tag, self.value)
@@ -111,26 +122,37 @@ class TLVList:
             return self
 
         def __next__(self):
-            res = next(self._iterator)
-            return res.tag, res.value
+            return next(self._iterator)
 
     def __init__(self, items: List[Tuple[Union[int, None], Any]] = []):
         """Constructs a TLVList.
 
         items: A list of tuples for the tag and value for the items in the TLVList.
         """
-        self._data: List[TLVList.TLVListItem] = []
+        # Tags and values are kept in parallel lists, the tag to index map is only built on the first lookup by tag.
+        self._tags: List[Union[None, int]] = []
+        self._values: List[Any] = []
+        self._tagIndex: Union[None, Dict[int, int]] = None
 
         for tag, val in items:
             self.append(tag, val)
 
+    @property
+    def _data(self) -> List["TLVList.TLVListItem"]:
+        return [TLVList.TLVListItem(tag, val) for tag, val in zip(self._tags, self._values)]
+
     def _get_item_by_tag(self, tag) -> Any:
         if not isinstance(tag, int):
             raise ValueError("Tag should be a integer for non-anonymous fields.")
-        for data in self._data:
-            if data.tag == tag:
-                return data.value
-        raise KeyError(f"Tag {tag} not found in the list.")
+        if self._tagIndex is None:
+            self._tagIndex = {}
+            for index, itemTag in enumerate(self._tags):
+                if itemTag is not None:
+                    self._tagIndex.setdefault(itemTag, index)
+        index = self._tagIndex.get(tag)
+        if index is None:
+            raise KeyError(f"Tag {tag} not found in the list.")
+        return self._values[index]
 
     def __getitem__(self, access) -> Any:
         """Gets a item in the list by the tag or the index.
@@ -147,7 +169,7 @@ class TLVList:
             if tag == TLVList.IndexMethod.Tag:
                 return self._get_item_by_tag(index)
             elif tag == TLVList.IndexMethod.Index:
-                return self._data[index].as_tuple()
+                return (self._tags[index], self._values[index])
             raise ValueError("Method should be TLVList.IndexMethod.Tag or TLVList.IndexMethod.Index")
         elif isinstance(access, int):
             return self._get_item_by_tag(access)
@@ -157,7 +179,10 @@ class TLVList:
         """Appends an item to the list."""
         if (tag is not None) and (not isinstance(tag, int)):
             raise KeyError(f"Tag should be a integer or none for anonymous tag, {type(tag)} got")
-        self._data.append(TLVList.TLVListItem(tag, value))
+        if self._tagIndex is not None and tag is not None:
+            self._tagIndex.setdefault(tag, len(self._tags))
+        self._tags.append(tag)
+        self._values.append(value)
 
     def __repr__(self):
         return "TLVList" + repr(self._data)
@@ -167,9 +192,9 @@ class TLVList:
             yield items.as_rich_repr_tuple()
 
     def __iter__(self) -> """TLVList.Iterator""":
-        return TLVList.Iterator(iter(self._data))
+        return TLVList.Iterator(zip(self._tags, self._values))
 
     def __eq__(self, rhs: "TLVList") -> bool:
         if not isinstance(rhs, TLVList):
             return False
-        return self._data == rhs._data
+        return self._tags == rhs._tags and self._values == rhs._values
@@ -1,2 +1,66 @@
-baseUrl = "https://on.dcl.csa-iot.org"
+import os
+
+baseUrl = os.environ.get("DCL_BASE_URL", "https://on.dcl.csa-iot.org")
 field_max_len = 32
+
+# DCL请求参数
+dcl_timeout = 10
+dcl_retries = 3
+dcl_retry_backoff = 0.5
+dcl_max_connections = 20
+dcl_per_host_limit = 10
+
+# DCL响应缓存，DCL_CACHE_PATH未设置时不启用
+dcl_cache_path = os.environ.get("DCL_CACHE_PATH")
+# 按路径前缀配置的缓存有效期（秒），匹配最长前缀
+dcl_cache_ttls = {
+    "/dcl/vendorinfo/": 24 * 3600,
+    "/dcl/model/": 24 * 3600,
+    "/dcl/compliance/": 3600,
+    "/dcl/pki/": 3600,
+}
+dcl_cache_default_ttl = 3600
+# 404结果的缓存有效期
+dcl_cache_negative_ttl = 600
+# 过期后仍可先返回旧数据、同时在后台刷新的时长，0表示不启用
+dcl_cache_stale_while_revalidate = 24 * 3600
+
+# PAA根证书列表的刷新间隔（秒）
+pki_refresh_interval = 3600
+# DAC证书链校验时缓存的PAI校验结果数量
+attestation_cache_size = int(os.environ.get("ATTESTATION_CACHE_SIZE", 1024))
+# 批量扫描DAC时每个任务包含的证书数量，以及汇总中保留的异常设备数量（其余只计数）
+dac_scan_chunk_size = 256
+dac_scan_max_exceptions = 1000
+
+# 本地DCL镜像，DCL_MIRROR_PATH设置后所有DCL查询都从镜像读取，不再访问网络
+dcl_mirror_path = os.environ.get("DCL_MIRROR_PATH")
+# 同步镜像时列表接口每页的记录数
+dcl_mirror_page_limit = 500
+
+# CD签名证书目录（PEM或DER格式），用于校验CD的CMS签名，CD_SIGNING_KEYS_PATH未设置时不校验签名
+cd_signing_keys_path = os.environ.get("CD_SIGNING_KEYS_PATH")
+
+# CD解析结果与校验报告缓存，按CD文件的SHA-256索引；CD_RESULT_CACHE_PATH设置时额外保存到磁盘
+cd_result_cache_path = os.environ.get("CD_RESULT_CACHE_PATH")
+cd_result_cache_size = int(os.environ.get("CD_RESULT_CACHE_SIZE", 1024))
+# 校验报告依赖DCL数据，超过有效期（秒）或DCL镜像更新后重新校验
+cd_result_cache_ttl = 600
+
+# 服务端口与工作进程数，python -m backend.serve的默认值
+api_host = os.environ.get("API_HOST", "127.0.0.1")
+api_port = int(os.environ.get("API_PORT", 8000))
+api_workers = int(os.environ.get("API_WORKERS", 1))
+# 收到退出信号后等待进行中请求完成的最长时间（秒）
+api_graceful_shutdown = 30
+# 批量校验接口中同时校验的文件数
+api_batch_concurrency = 16
+# 批量校验接口中单个文件（包括zip/tar包中的文件）的最大字节数，超出的文件不校验，在结果中报告错误
+api_batch_max_file_size = int(os.environ.get("API_BATCH_MAX_FILE_SIZE", 1 << 20))
+# 批量校验接口一次请求中所有文件解压后的最大总字节数，超出后不再读取后面的文件
+api_batch_max_total_size = int(os.environ.get("API_BATCH_MAX_TOTAL_SIZE", 256 << 20))
+# 多进程服务时共享的缓存目录，DCL_CACHE_PATH与CD_RESULT_CACHE_PATH未设置时在此目录下创建
+api_cache_dir = os.environ.get("API_CACHE_DIR", ".cache")
+
+# 各处理阶段的耗时直方图与错误计数，由/metrics接口输出；METRICS_ENABLED=0时不统计
+metrics_enabled = os.environ.get("METRICS_ENABLED", "1") != "0"
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from http import HTTPStatus
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from config.define import (dcl_cache_default_ttl, dcl_cache_negative_ttl, dcl_cache_path,
+                           dcl_cache_stale_while_revalidate, dcl_cache_ttls)
+from dcl.export import iter_entities
+
+CacheEntry = namedtuple("CacheEntry", ["status_code", "resp_data", "etag", "last_modified", "fetched_at"])
+
+FRESH = "fresh"
+STALE = "stale"
+EXPIRED = "expired"
+
+# 只缓存成功结果与404（负缓存），其他错误每次都重新请求
+CACHEABLE_STATUS = (HTTPStatus.OK, HTTPStatus.NOT_FOUND)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dcl_response (
+    path TEXT PRIMARY KEY,
+    status_code INTEGER NOT NULL,
+    body TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+)
+"""
+
+_INDEX = "CREATE INDEX IF NOT EXISTS dcl_response_fetched_at ON dcl_response (fetched_at)"
+
+
+class DclCache:
+    """基于SQLite的DCL响应缓存，以请求路径为键
+
+    每个路径前缀可以配置不同的有效期，404结果单独按negative_ttl缓存。过期后stale_while_revalidate
+    时间内的数据仍可先返回，由CachedDclClient在后台刷新。数据库使用WAL模式，可被多个进程共享。
+    """
+
+    def __init__(self, path=None, ttls=None, default_ttl=dcl_cache_default_ttl, negative_ttl=dcl_cache_negative_ttl,
+                 stale_while_revalidate=dcl_cache_stale_while_revalidate):
+        self.path = path or dcl_cache_path
+        if not self.path:
+            raise ValueError("未配置DCL缓存路径，请设置DCL_CACHE_PATH")
+        self.ttls = sorted((ttls if ttls is not None else dcl_cache_ttls).items(), key=lambda item: -len(item[0]))
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.execute(_INDEX)
+
+    def ttl_for(self, path, status_code=HTTPStatus.OK):
+        if status_code == HTTPStatus.NOT_FOUND:
+            return self.negative_ttl
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def freshness(self, path, entry, now=None):
+        age = (now if now is not None else time.time()) - entry.fetched_at
+        ttl = self.ttl_for(path, entry.status_code)
+        if age < ttl:
+            return FRESH
+        if age < ttl + self.stale_while_revalidate:
+            return STALE
+        return EXPIRED
+
+    def lookup(self, path):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status_code, body, etag, last_modified, fetched_at FROM dcl_response WHERE path = ?",
+                (path,),
+            ).fetchone()
+        if row is None:
+            return None
+        status_code, body, etag, last_modified, fetched_at = row
+        return CacheEntry(status_code, json.loads(body) if body is not None else None, etag, last_modified,
+                          fetched_at)
+
+    def store(self, path, status_code, resp_data, etag=None, last_modified=None, fetched_at=None):
+        self.store_many([(path, status_code, resp_data, etag, last_modified)], fetched_at)
+
+    def store_many(self, items, fetched_at=None):
+        fetched_at = fetched_at if fetched_at is not None else time.time()
+        rows = [
+            (path, int(status_code), json.dumps(resp_data, ensure_ascii=False) if resp_data is not None else None,
+             etag, last_modified, fetched_at)
+            for path, status_code, resp_data, etag, last_modified in items
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO dcl_response VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def touch(self, path, fetched_at=None):
+        """条件请求返回304时刷新缓存时间"""
+        with self._lock:
+            self._conn.execute("UPDATE dcl_response SET fetched_at = ? WHERE path = ?",
+                               (fetched_at if fetched_at is not None else time.time(), path))
+
+    def warm(self, resp_data, fetched_at=None):
+        """用DCL批量导出数据预热缓存，resp_data为列表接口的响应或{路径: 响应内容}，返回写入条数"""
+        items = ((path, HTTPStatus.OK, body, None, None) for path, body in iter_entities(resp_data))
+        return self.store_many(items, fetched_at)
+
+    def version(self, paths=None):
+        """缓存数据的版本（最近一次写入或刷新的时间），没有数据时为None
+
+        paths为查询路径时只取这些条目，其他条目的更新不影响结果；为None时取整个缓存。
+        """
+        with self._lock:
+            if paths is None:
+                row = self._conn.execute("SELECT MAX(fetched_at) FROM dcl_response").fetchone()
+            else:
+                paths = list(paths)
+                row = self._conn.execute(
+                    f"SELECT MAX(fetched_at) FROM dcl_response WHERE path IN ({','.join('?' * len(paths))})",
+                    paths).fetchone()
+        return None if row[0] is None else repr(row[0])
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM dcl_response")
+
+    def stats(self):
+        now = time.time()
+        counts = {FRESH: 0, STALE: 0, EXPIRED: 0}
+        with self._lock:
+            rows = self._conn.execute("SELECT path, status_code, fetched_at FROM dcl_response").fetchall()
+        for path, status_code, fetched_at in rows:
+            counts[self.freshness(path, CacheEntry(status_code, None, None, None, fetched_at), now)] += 1
+        return {"entries": len(rows), **counts}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _request_headers(entry, headers=None):
+    # 调用方的请求头加上缓存项的条件请求头，条件请求头以缓存项为准：返回304时用的是缓存项的内容
+    headers = dict(headers or {})
+    if entry is not None and entry.status_code == HTTPStatus.OK:
+        if entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+    return headers or None
+
+
+class _CachedClientBase:
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+    def _cached(self, path):
+        """返回(缓存项, 新鲜度)，没有缓存时为(None, EXPIRED)"""
+        entry = self.cache.lookup(path)
+        if entry is None:
+            return None, EXPIRED
+        return entry, self.cache.freshness(path, entry)
+
+    def _start_revalidate(self, path):
+        with self._lock:
+            if path in self._revalidating:
+                return False
+            self._revalidating.add(path)
+            return True
+
+    def _finish_revalidate(self, path):
+        with self._lock:
+            self._revalidating.discard(path)
+
+    def data_version(self, paths=None):
+        return self.cache.version(paths)
+
+    def _handle_response(self, path, entry, status_code, resp_data, headers):
+        if status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+            self.cache.touch(path)
+            return entry.status_code, entry.resp_data, headers
+        if status_code in CACHEABLE_STATUS:
+            self.cache.store(path, status_code, resp_data, headers.get("ETag"), headers.get("Last-Modified"))
+        return status_code, resp_data, headers
+
+
+class CachedDclClient(_CachedClientBase):
+    """带持久化缓存的同步DCL客户端，接口与DclClient相同
+
+    缓存有效时不发送请求；过期但仍在stale_while_revalidate时间内时先返回旧数据并在后台线程刷新；
+    刷新时带上ETag/Last-Modified发送条件请求，请求失败时退回使用旧数据。
+    fetch()的headers在实际发送请求（未命中或刷新）时一并发送，缓存仍只按路径区分。
+    """
+
+    def get(self, path):
+        status_code, resp_data, _ = self.fetch(path)
+        return status_code, resp_data
+
+    def fetch(self, path, headers=None):
+        entry, state = self._cached(path)
+        if state == FRESH:
+            self.hits += 1
+            return entry.status_code, entry.resp_data, {}
+        if state == STALE:
+            self.stale_hits += 1
+            if self._start_revalidate(path):
+                threading.Thread(target=self._background_revalidate, args=(path, entry, headers), daemon=True).start()
+            return entry.status_code, entry.resp_data, {}
+        self.misses += 1
+        return self._revalidate(path, entry, headers)
+
+    def _revalidate(self, path, entry, headers=None):
+        try:
+            status_code, resp_data, resp_headers = self.client.fetch(path, _request_headers(entry, headers))
+        except Exception:
+            if entry is not None:
+                return entry.status_code, entry.resp_data, {}
+            raise
+        return self._handle_response(path, entry, status_code, resp_data, resp_headers)
+
+    def _background_revalidate(self, path, entry, headers=None):
+        try:
+            self._revalidate(path, entry, headers)
+        finally:
+            self._finish_revalidate(path)
+
+
+class AsyncCachedDclClient(_CachedClientBase):
+    """CachedDclClient的异步版本，包装AsyncDclClient，缓存的读写（SQLite）在线程中执行，不阻塞事件循环"""
+
+    def __init__(self, client, cache):
+        super().__init__(client, cache)
+        self._tasks = set()
+
+    async def get(self, path):
+        status_code, resp_data, _ = await self.fetch(path)
+        return status_code, resp_data
+
+    async def fetch(self, path, headers=None):
+        entry, state = await asyncio.to_thread(self._cached, path)
+        if state == FRESH:
+            self.hits += 1
+            return entry.status_code, entry.resp_data, {}
+        if state == STALE:
+            self.stale_hits += 1
+            if self._start_revalidate(path):
+                task = asyncio.ensure_future(self._background_revalidate(path, entry, headers))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            return entry.status_code, entry.resp_data, {}
+        self.misses += 1
+        return await self._revalidate(path, entry, headers)
+
+    async def _revalidate(self, path, entry, headers=None):
+        try:
+            status_code, resp_data, resp_headers = await self.client.fetch(path, _request_headers(entry, headers))
+        except Exception:
+            if entry is not None:
+                return entry.status_code, entry.resp_data, {}
+            raise
+        return await asyncio.to_thread(self._handle_response, path, entry, status_code, resp_data, resp_headers)
+
+    async def _background_revalidate(self, path, entry, headers=None):
+        try:
+            await self._revalidate(path, entry, headers)
+        except Exception:
+            pass
+        finally:
+            self._finish_revalidate(path)
+
+    async def aclose(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage The Local DCL Response Cache")
+    parser.add_argument("--db", type=str, default=dcl_cache_path, help="Cache database, defaults to DCL_CACHE_PATH")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="Load DCL bulk export files into the cache")
+    warm_parser.add_argument("exports", type=str, nargs="+", help="JSON list responses or {path: response} files")
+    subparsers.add_parser("stats", help="Show the number of fresh, stale and expired entries")
+    subparsers.add_parser("clear", help="Remove all entries")
+    args = parser.parse_args()
+
+    cache = DclCache(args.db)
+    if args.command == "warm":
+        for export in args.exports:
+            with open(export, encoding="utf-8") as f:
+                print(f"{export}: {cache.warm(json.load(f))}")
+    elif args.command == "stats":
+        print(json.dumps(cache.stats(), indent=4))
+    else:
+        cache.clear()
+    cache.close()
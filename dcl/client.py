@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+from config.define import (baseUrl, dcl_cache_path, dcl_max_connections, dcl_mirror_path, dcl_per_host_limit,
+                           dcl_retries, dcl_retry_backoff, dcl_timeout)
+
+# 这些状态码视为DCL暂时不可用，按退避策略重试
+RETRY_STATUS = frozenset({
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+})
+
+
+def _backoff_delay(backoff, attempt):
+    # 指数退避加随机抖动，避免并发请求同时重试
+    return backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+def _json_or_none(status_code, read_json):
+    if status_code != HTTPStatus.OK:
+        return None
+    return read_json()
+
+
+class DclClient:
+    """同步DCL客户端，复用连接池，带超时与重试
+
+    get()返回(状态码, JSON数据)，非200时数据为None；网络错误在重试耗尽后抛出。
+    """
+
+    def __init__(self, base_url=None, timeout=dcl_timeout, retries=dcl_retries, backoff=dcl_retry_backoff,
+                 max_connections=dcl_max_connections):
+        self.base_url = (base_url or baseUrl).rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # requests与httpx只在创建客户端时导入，只解析CD、不访问DCL的命令行不需要加载
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def get(self, path):
+        status_code, resp_data, _ = self.fetch(path)
+        return status_code, resp_data
+
+    def fetch(self, path, headers=None):
+        """与get()相同，额外返回响应头，headers可用于条件请求（If-None-Match等）"""
+        import requests
+
+        attempt = 0
+        while True:
+            try:
+                response = self._session.get(f"{self.base_url}{path}", headers=headers, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return (response.status_code, _json_or_none(response.status_code, response.json),
+                            response.headers)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            time.sleep(_backoff_delay(self.backoff, attempt))
+            attempt += 1
+
+    def close(self):
+        self._session.close()
+
+
+class AsyncDclClient:
+    """异步DCL客户端
+
+    基于httpx.AsyncClient的连接池，按host限制并发请求数，带超时与重试，接口与DclClient相同。
+    需要在事件循环中使用，用完后调用aclose()或使用async with。
+    """
+
+    def __init__(self, base_url=None, timeout=dcl_timeout, retries=dcl_retries, backoff=dcl_retry_backoff,
+                 max_connections=dcl_max_connections, per_host_limit=dcl_per_host_limit):
+        self.base_url = (base_url or baseUrl).rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.per_host_limit = per_host_limit
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._semaphores = {}
+
+    def _semaphore(self, url):
+        import asyncio
+
+        host = urlsplit(url).netloc
+        semaphore = self._semaphores.get(host)
+        if semaphore is None:
+            semaphore = self._semaphores[host] = asyncio.Semaphore(self.per_host_limit)
+        return semaphore
+
+    async def get(self, path):
+        status_code, resp_data, _ = await self.fetch(path)
+        return status_code, resp_data
+
+    async def fetch(self, path, headers=None):
+        import asyncio
+
+        import httpx
+
+        url = f"{self.base_url}{path}"
+        attempt = 0
+        while True:
+            try:
+                async with self._semaphore(url):
+                    response = await self._client.get(url, headers=headers)
+                if response.status_code not in RETRY_STATUS or attempt >= self.retries:
+                    return (response.status_code, _json_or_none(response.status_code, response.json),
+                            response.headers)
+            except (httpx.TransportError, httpx.TimeoutException):
+                if attempt >= self.retries:
+                    raise
+            await asyncio.sleep(_backoff_delay(self.backoff, attempt))
+            attempt += 1
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """进程内共享的同步DCL客户端，配置了DCL_MIRROR_PATH时从本地镜像读取，配置了DCL_CACHE_PATH时带持久化缓存"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                if dcl_mirror_path:
+                    from dcl.mirror import DclMirror, MirrorDclClient
+                    _default_client = MirrorDclClient(DclMirror(dcl_mirror_path))
+                    return _default_client
+                client = DclClient()
+                if dcl_cache_path:
+                    from dcl.cache import CachedDclClient, DclCache
+                    client = CachedDclClient(client, DclCache(dcl_cache_path))
+                _default_client = client
+    return _default_client
+
+
+def create_async_client():
+    """创建异步DCL客户端，配置了DCL_MIRROR_PATH时从本地镜像读取，配置了DCL_CACHE_PATH时带持久化缓存，需在事件循环中调用"""
+    if dcl_mirror_path:
+        from dcl.mirror import AsyncMirrorDclClient, DclMirror
+        return AsyncMirrorDclClient(DclMirror(dcl_mirror_path))
+    client = AsyncDclClient()
+    if dcl_cache_path:
+        from dcl.cache import AsyncCachedDclClient, DclCache
+        client = AsyncCachedDclClient(client, DclCache(dcl_cache_path))
+    return client
@@ -0,0 +1,61 @@
+"""DCL批量导出数据与单条查询路径之间的对应关系
+
+DCL的列表接口（如/dcl/vendorinfo/vendors）返回的是多条记录，这里把每条记录还原为对应单条查询接口
+（如/dcl/vendorinfo/vendors/{vid}）的路径与响应内容，供缓存预热与本地镜像使用。
+"""
+
+
+def vendor_info_path(vendor_id):
+    return f"/dcl/vendorinfo/vendors/{vendor_id}"
+
+
+def model_path(vid, pid):
+    return f"/dcl/model/models/{vid}/{pid}"
+
+
+def compliance_info_path(vid, pid, software_version, certification_type="matter"):
+    return f"/dcl/compliance/compliance-info/{vid}/{pid}/{software_version}/{certification_type}"
+
+
+def certificates_path(subject, subject_key_id):
+    return f"/dcl/pki/certificates/{subject}/{subject_key_id}"
+
+
+ROOT_CERTIFICATES_PATH = "/dcl/pki/root-certificates"
+
+# 分页列表接口：{响应中的列表字段: 接口路径}，单条记录的路径为列表路径加上主键
+LIST_PATHS = {
+    "vendorInfo": "/dcl/vendorinfo/vendors",
+    "model": "/dcl/model/models",
+    "complianceInfo": "/dcl/compliance/compliance-info",
+    "approvedCertificates": "/dcl/pki/certificates",
+}
+
+
+def _list(resp_data, key):
+    items = resp_data.get(key)
+    return items if isinstance(items, list) else []
+
+
+def iter_entities(resp_data):
+    """把列表接口的响应拆分为(单条查询路径, 响应内容)
+
+    支持vendorinfo、model、compliance-info、pki certificates与root-certificates列表；
+    也支持直接以{路径: 响应内容}形式保存的导出文件。
+    """
+    if all(isinstance(key, str) and key.startswith("/") for key in resp_data):
+        yield from resp_data.items()
+        return
+
+    for vendor in _list(resp_data, "vendorInfo"):
+        yield vendor_info_path(vendor["vendorID"]), {"vendorInfo": vendor}
+    for model in _list(resp_data, "model"):
+        yield model_path(model["vid"], model["pid"]), {"model": model}
+    for info in _list(resp_data, "complianceInfo"):
+        path = compliance_info_path(info["vid"], info["pid"], info["softwareVersion"], info["certificationType"])
+        yield path, {"complianceInfo": info}
+    for certificates in _list(resp_data, "approvedCertificates"):
+        path = certificates_path(certificates["subject"], certificates["subjectKeyId"])
+        yield path, {"approvedCertificates": certificates}
+    if "approvedRootCertificates" in resp_data:
+        yield ROOT_CERTIFICATES_PATH, {"approvedRootCertificates": resp_data["approvedRootCertificates"]}
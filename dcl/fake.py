@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from dcl.export import LIST_PATHS
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # 默认的listen队列只有5个，异步客户端同时建立多个连接时多出的连接要等SYN重传（约1秒），测得的耗时失真
+    request_queue_size = 128
+
+
+class FakeDclServer:
+    """本地模拟的DCL REST服务，用于在没有网络的情况下测试DCL客户端与校验流程
+
+    fixtures为{请求路径: JSON数据}，未配置的路径返回404。列表接口（如/dcl/vendorinfo/vendors）没有单独配置时，
+    由对应的单条记录拼出，按pagination.key/pagination.limit分页，每页默认page_size条。
+    latency为每个请求的额外延迟（秒），fail_first为开头若干个请求直接返回503，用于验证重试。
+
+    e.g.
+    ```
+    with FakeDclServer({"/dcl/vendorinfo/vendors/65521": {"vendorInfo": {...}}}) as server:
+        client = DclClient(base_url=server.url)
+    ```
+    """
+
+    def __init__(self, fixtures=None, host="127.0.0.1", port=0, latency=0.0, fail_first=0, page_size=100):
+        self.fixtures = dict(fixtures or {})
+        self.page_size = page_size
+        self.latency = latency
+        self.fail_first = fail_first
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = _HTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _list_page(self, path, query):
+        for key, list_path in LIST_PATHS.items():
+            if path == list_path:
+                break
+        else:
+            return None
+        prefix = list_path + "/"
+        items = [self.fixtures[p][key] for p in sorted(self.fixtures) if p.startswith(prefix)]
+        params = parse_qs(query)
+        offset = int(base64.b64decode(params["pagination.key"][0])) if "pagination.key" in params else 0
+        limit = int(params.get("pagination.limit", [self.page_size])[0])
+        end = offset + limit
+        next_key = base64.b64encode(str(end).encode()).decode() if end < len(items) else None
+        return {key: items[offset:end], "pagination": {"next_key": next_key, "total": str(len(items))}}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 响应头与内容分两次写入，不关闭Nagle算法时keep-alive连接上每个请求会多出约40ms的延迟确认等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests.append(self.path)
+                    failing = len(fake.requests) <= fake.fail_first
+                if fake.latency:
+                    time.sleep(fake.latency)
+                url = urlsplit(self.path)
+                page = None if url.path in fake.fixtures else fake._list_page(url.path, url.query)
+                if failing:
+                    self._send(HTTPStatus.SERVICE_UNAVAILABLE, {"code": 14, "message": "unavailable"})
+                elif page is not None:
+                    self._send(HTTPStatus.OK, page)
+                elif url.path in fake.fixtures:
+                    body = json.dumps(fake.fixtures[url.path]).encode("utf-8")
+                    etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(HTTPStatus.NOT_MODIFIED)
+                        self.send_header("ETag", etag)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                    else:
+                        self._send(HTTPStatus.OK, fake.fixtures[url.path], {"ETag": etag})
+                else:
+                    self._send(HTTPStatus.NOT_FOUND, {"code": 5, "message": "rpc error: code = NotFound"})
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve DCL Fixtures Locally")
+    parser.add_argument("fixtures", type=str, help="JSON file mapping request paths to response bodies")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Extra delay per request in seconds")
+    parser.add_argument("--page-size", type=int, default=100, help="Default page size of the list endpoints")
+    args = parser.parse_args()
+
+    with open(args.fixtures, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    server = FakeDclServer(fixtures, args.host, args.port, args.latency, page_size=args.page_size)
+    print(f"Fake DCL listening on {server.url}, set DCL_BASE_URL={server.url} to use it")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+import time
+from http import HTTPStatus
+from urllib.parse import quote
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from config.define import dcl_mirror_page_limit, dcl_mirror_path
+from dcl.export import LIST_PATHS, ROOT_CERTIFICATES_PATH, iter_entities
+
+# 镜像包含的数据集：{名称: 列表字段}，root_certificates没有分页，单独处理
+COLLECTIONS = {
+    "vendorinfo": "vendorInfo",
+    "model": "model",
+    "compliance": "complianceInfo",
+    "certificates": "approvedCertificates",
+    "root_certificates": None,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dcl_entity (
+    path TEXT PRIMARY KEY,
+    collection TEXT NOT NULL,
+    body TEXT NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS dcl_entity_collection ON dcl_entity (collection);
+CREATE TABLE IF NOT EXISTS dcl_sync (
+    collection TEXT PRIMARY KEY,
+    synced_at REAL NOT NULL,
+    entries INTEGER NOT NULL
+);
+"""
+
+
+def _digest(body):
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+class DclMirror:
+    """DCL数据的本地镜像，保存在SQLite中，以单条查询的路径为键
+
+    sync()每次都通过列表接口分页完整下载各数据集（DCL的列表接口不支持按修改时间过滤，无法只取变化的部分），
+    与镜像中的内容摘要比较后只写入有变化的记录并删除DCL上已不存在的记录，即"完整下载、差异写入"，
+    网络开销与数据集大小成正比，节省的只是数据库写入。之后的查询不需要访问网络。数据库使用WAL模式，可被多个进程共享。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or dcl_mirror_path
+        if not self.path:
+            raise ValueError("未配置DCL镜像路径，请设置DCL_MIRROR_PATH")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def lookup(self, path):
+        """返回单条查询接口的响应内容，镜像中没有时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT body FROM dcl_entity WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _iter_pages(self, client, collection, page_limit):
+        key = COLLECTIONS[collection]
+        if key is None:
+            yield self._get(client, ROOT_CERTIFICATES_PATH)
+            return
+        next_key = None
+        while True:
+            path = f"{LIST_PATHS[key]}?pagination.limit={page_limit}"
+            if next_key:
+                path += f"&pagination.key={quote(next_key, safe='')}"
+            resp_data = self._get(client, path)
+            yield resp_data
+            next_key = (resp_data.get("pagination") or {}).get("next_key")
+            if not next_key:
+                return
+
+    @staticmethod
+    def _get(client, path):
+        status_code, resp_data = client.get(path)
+        if status_code != HTTPStatus.OK:
+            raise RuntimeError(f"同步DCL镜像失败:{path}返回{status_code}")
+        return resp_data
+
+    def sync_collection(self, client, collection, page_limit=dcl_mirror_page_limit):
+        """完整下载一个数据集并差异写入镜像，返回{"added", "updated", "removed", "unchanged"}计数
+
+        全部页面下载成功后才在一个事务内写入，中途失败时镜像保持原样。
+        """
+        entities = {}
+        for resp_data in self._iter_pages(client, collection, page_limit):
+            for path, body in iter_entities(resp_data):
+                entities[path] = json.dumps(body, ensure_ascii=False, sort_keys=True)
+
+        with self._lock:
+            existing = dict(self._conn.execute(
+                "SELECT path, digest FROM dcl_entity WHERE collection = ?", (collection,)).fetchall())
+        counts = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        rows = []
+        for path, body in entities.items():
+            digest = _digest(body)
+            old_digest = existing.pop(path, None)
+            if old_digest == digest:
+                counts["unchanged"] += 1
+                continue
+            counts["added" if old_digest is None else "updated"] += 1
+            rows.append((path, collection, body, digest))
+        counts["removed"] = len(existing)
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO dcl_entity VALUES (?, ?, ?, ?)", rows)
+                self._conn.executemany("DELETE FROM dcl_entity WHERE path = ?", ((path,) for path in existing))
+                self._conn.execute("INSERT OR REPLACE INTO dcl_sync VALUES (?, ?, ?)",
+                                   (collection, time.time(), len(entities)))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return counts
+
+    def sync(self, client=None, collections=None, max_age=None, page_limit=dcl_mirror_page_limit):
+        """完整下载各数据集并差异写入镜像，返回{数据集: 计数}；max_age（秒）内同步过的数据集跳过"""
+        if client is None:
+            from dcl.client import DclClient
+            client = DclClient()
+        synced_at = self.synced_at()
+        now = time.time()
+        result = {}
+        for collection in collections or COLLECTIONS:
+            if collection not in COLLECTIONS:
+                raise ValueError(f"未知的DCL数据集:{collection}")
+            if max_age is not None and now - synced_at.get(collection, 0) < max_age:
+                continue
+            result[collection] = self.sync_collection(client, collection, page_limit)
+        return result
+
+    def version(self):
+        """镜像数据的版本，每次同步后改变，未同步过时为None"""
+        with self._lock:
+            row = self._conn.execute("SELECT MAX(synced_at) FROM dcl_sync").fetchone()
+        return None if row[0] is None else repr(row[0])
+
+    def synced_at(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT collection, synced_at FROM dcl_sync").fetchall())
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT collection, COUNT(*) FROM dcl_entity GROUP BY collection").fetchall())
+            synced = self._conn.execute("SELECT collection, synced_at FROM dcl_sync").fetchall()
+        return {
+            collection: {
+                "entries": counts.get(collection, 0),
+                "synced_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(synced_at)),
+            }
+            for collection, synced_at in synced
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class MirrorDclClient:
+    """从本地镜像读取的DCL客户端，接口与DclClient相同，不存在的记录返回404"""
+
+    def __init__(self, mirror):
+        self.mirror = mirror
+
+    def get(self, path):
+        status_code, resp_data, _ = self.fetch(path)
+        return status_code, resp_data
+
+    def fetch(self, path, headers=None):
+        resp_data = self.mirror.lookup(path)
+        if resp_data is None:
+            return HTTPStatus.NOT_FOUND, None, {}
+        return HTTPStatus.OK, resp_data, {}
+
+    def data_version(self, paths=None):
+        # 镜像按数据集整体同步，版本不区分查询路径
+        return self.mirror.version()
+
+    def close(self):
+        self.mirror.close()
+
+
+class AsyncMirrorDclClient:
+    """MirrorDclClient的异步版本，查询本地数据库（SQLite）在线程中执行，不阻塞事件循环"""
+
+    def __init__(self, mirror):
+        self._client = MirrorDclClient(mirror)
+
+    async def get(self, path):
+        return await asyncio.to_thread(self._client.get, path)
+
+    async def fetch(self, path, headers=None):
+        return await asyncio.to_thread(self._client.fetch, path, headers)
+
+    def data_version(self, paths=None):
+        return self._client.data_version(paths)
+
+    async def aclose(self):
+        self._client.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage The Local DCL Mirror")
+    parser.add_argument("--db", type=str, default=dcl_mirror_path, help="Mirror database, defaults to DCL_MIRROR_PATH")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sync_parser = subparsers.add_parser("sync", help="Download every collection from DCL in full and write only the changed entries")
+    sync_parser.add_argument("collections", type=str, nargs="*",
+                             help=f"Collections to sync ({', '.join(COLLECTIONS)}), defaults to all")
+    sync_parser.add_argument("--base-url", type=str, help="DCL REST endpoint, defaults to DCL_BASE_URL")
+    sync_parser.add_argument("--max-age", type=float, help="Skip collections synced within this many seconds")
+    sync_parser.add_argument("--page-limit", type=int, default=dcl_mirror_page_limit)
+    subparsers.add_parser("stats", help="Show the number of entries and the last sync time of each collection")
+    get_parser = subparsers.add_parser("get", help="Print the mirrored response of a DCL query path")
+    get_parser.add_argument("path", type=str)
+    args = parser.parse_args()
+
+    mirror = DclMirror(args.db)
+    if args.command == "sync":
+        from dcl.client import DclClient
+        result = mirror.sync(DclClient(base_url=args.base_url), args.collections, args.max_age, args.page_limit)
+        print(json.dumps(result, indent=4))
+    elif args.command == "stats":
+        print(json.dumps(mirror.stats(), indent=4))
+    else:
+        print(json.dumps(mirror.lookup(args.path), indent=4, ensure_ascii=False))
+    mirror.close()
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""DAC/PAI/PAA设备证明证书链校验
+
+按Matter规范6.2检查DAC由PAI签发、PAI由DCL上已批准的PAA签发，证书的算法、基本约束、密钥用途与有效期，
+各级证书中的VID/PID是否一致，并可与CD中的vendor_id、product_id_array、origin_vid/origin_pid及
+paa_authority_list比对。
+
+PAI的校验结果按证书内容缓存，同一批次中同一PAI签发的大量DAC只需校验一次PAI，之后每个DAC只做自身的检查与一次
+签名验证。
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID, SignatureAlgorithmOID
+
+from config.define import attestation_cache_size
+from pki.store import get_trust_store
+
+# Matter证书中VID/PID的属性（规范6.5.6.1）
+VID_OID = x509.ObjectIdentifier("1.3.6.1.4.1.37244.2.1")
+PID_OID = x509.ObjectIdentifier("1.3.6.1.4.1.37244.2.2")
+
+_PEM_BEGIN = b"-----BEGIN CERTIFICATE-----"
+
+# 已校验的PAI：cert为PAI证书，key_id为其SKID，not_before/not_after为PAI与PAA有效期的交集
+VerifiedPai = namedtuple("VerifiedPai", ["cert", "vid", "pid", "key_id", "paa_key_id", "not_before", "not_after"])
+
+
+def load_certificate(data) -> x509.Certificate:
+    """解析PEM或DER格式的证书，PEM中有多个证书时取第一个，格式错误时抛出ValueError"""
+    data = bytes(data)
+    if _PEM_BEGIN in data:
+        return x509.load_pem_x509_certificate(data)
+    return x509.load_der_x509_certificate(data)
+
+
+def _parse_id(text):
+    if len(text) != 4 or text.upper() != text:
+        raise ValueError(text)
+    return int(text, 16)
+
+
+def matter_vid_pid(name: x509.Name):
+    """返回证书subject中的(VID, PID)，没有的一项为None，格式错误时抛出ValueError
+
+    优先取Matter专用属性，没有时按规范兼容CN中的"Mvid:FFF1 Mpid:8000"写法。
+    """
+    vid = pid = None
+    for attribute in name:
+        if attribute.oid == VID_OID:
+            vid = _parse_id(attribute.value)
+        elif attribute.oid == PID_OID:
+            pid = _parse_id(attribute.value)
+    if vid is None and pid is None:
+        for attribute in name.get_attributes_for_oid(NameOID.COMMON_NAME):
+            for part in attribute.value.split():
+                if part.startswith("Mvid:") and len(part) >= 9:
+                    vid = _parse_id(part[5:9])
+                elif part.startswith("Mpid:") and len(part) >= 9:
+                    pid = _parse_id(part[5:9])
+    return vid, pid
+
+
+def _extension(cert, extension_class):
+    try:
+        return cert.extensions.get_extension_for_class(extension_class).value
+    except x509.ExtensionNotFound:
+        return None
+
+
+def key_ids(cert):
+    """返回证书的(SubjectKeyIdentifier, AuthorityKeyIdentifier)，没有的一项为None"""
+    skid = _extension(cert, x509.SubjectKeyIdentifier)
+    akid = _extension(cert, x509.AuthorityKeyIdentifier)
+    return (skid.digest if skid is not None else None), (akid.key_identifier if akid is not None else None)
+
+
+def _check_profile(cert, kind, ca):
+    """检查算法、基本约束与密钥用途，返回问题描述，没有问题时返回None"""
+    if cert.signature_algorithm_oid != SignatureAlgorithmOID.ECDSA_WITH_SHA256:
+        return f"{kind}证书的签名算法不是ecdsa-with-SHA256"
+    public_key = cert.public_key()
+    if not isinstance(public_key, ec.EllipticCurvePublicKey) or public_key.curve.name != "secp256r1":
+        return f"{kind}证书的公钥不是P-256密钥"
+    basic_constraints = _extension(cert, x509.BasicConstraints)
+    if basic_constraints is None or basic_constraints.ca != ca:
+        return f"{kind}证书的基本约束中CA应为{ca}"
+    if kind == "PAI" and basic_constraints.path_length not in (None, 0):
+        return "PAI证书的pathLenConstraint应为0"
+    key_usage = _extension(cert, x509.KeyUsage)
+    if key_usage is None:
+        return f"{kind}证书缺少密钥用途扩展"
+    if ca and not key_usage.key_cert_sign:
+        return f"{kind}证书的密钥用途中缺少keyCertSign"
+    if not ca and not key_usage.digital_signature:
+        return f"{kind}证书的密钥用途中缺少digitalSignature"
+    return None
+
+
+def _issued_by(cert, issuer):
+    try:
+        cert.verify_directly_issued_by(issuer)
+    except (ValueError, TypeError, InvalidSignature):
+        return False
+    return True
+
+
+def check_dac(dac, pai_cert, pai_key_id, at) -> (bool, str, tuple):
+    """检查DAC证书本身（算法、基本约束、密钥用途、有效期、VID/PID）以及是否由该PAI签发，成功时返回(VID, PID)
+
+    只用到DAC与PAI证书，不访问DCL，可在批量校验的工作进程中执行。
+    """
+    problem = _check_profile(dac, "DAC", ca=False)
+    if problem:
+        return False, problem, None
+    if not dac.not_valid_before_utc <= at <= dac.not_valid_after_utc:
+        return False, "DAC证书不在有效期内", None
+    try:
+        vid, pid = matter_vid_pid(dac.subject)
+    except ValueError as e:
+        return False, f"DAC证书中的VID/PID格式错误:{e}", None
+    if vid is None or pid is None:
+        return False, "DAC证书中缺少VID或PID", None
+    _, issuer_key_id = key_ids(dac)
+    if issuer_key_id != pai_key_id:
+        return False, "DAC的AuthorityKeyIdentifier与PAI的SubjectKeyIdentifier不一致", None
+    if not _issued_by(dac, pai_cert):
+        return False, "DAC证书不是由该PAI签发", None
+    return True, "", (vid, pid)
+
+
+def check_dac_issuer(dac_vid, dac_pid, pai: VerifiedPai) -> (bool, str):
+    """检查DAC的VID/PID与签发它的PAI是否一致"""
+    if dac_vid != pai.vid:
+        return False, f"DAC的VID(0x{dac_vid:04X})与PAI的VID(0x{pai.vid:04X})不一致"
+    if pai.pid is not None and dac_pid != pai.pid:
+        return False, f"DAC的PID(0x{dac_pid:04X})与PAI的PID(0x{pai.pid:04X})不一致"
+    return True, ""
+
+
+def check_cd_consistency(cd, dac_vid, dac_pid, pai_vid, paa_key_id):
+    """按规范6.3检查证书链与CD是否一致，返回(ok, msg)
+
+    CD中有origin_vid/origin_pid时DAC与PAI应属于该厂商与产品，否则应属于CD的vendor_id与product_id_array；
+    CD中有paa_authority_list时，证书链的PAA必须在列表中。
+    """
+    if cd.origin_vid or cd.origin_pid:
+        if dac_vid != cd.origin_vid or pai_vid != cd.origin_vid:
+            return False, f"DAC/PAI的VID(0x{dac_vid:04X}/0x{pai_vid:04X})与CD的origin_vid(0x{cd.origin_vid:04X})不一致"
+        if dac_pid != cd.origin_pid:
+            return False, f"DAC的PID(0x{dac_pid:04X})与CD的origin_pid(0x{cd.origin_pid:04X})不一致"
+    else:
+        if dac_vid != cd.vendor_id or pai_vid != cd.vendor_id:
+            return False, f"DAC/PAI的VID(0x{dac_vid:04X}/0x{pai_vid:04X})与CD的vendor_id(0x{cd.vendor_id:04X})不一致"
+        if dac_pid not in cd.product_id_array:
+            return False, f"DAC的PID(0x{dac_pid:04X})不在CD的product_id_array中"
+    if cd.paa_authority_count > 0 and paa_key_id not in cd.paa_authority_list:
+        return False, f"PAA({paa_key_id.hex().upper()})不在CD的paa_authority_list中"
+    return True, ""
+
+
+class AttestationVerifier:
+    """DAC证书链校验
+
+    trust_store为提供find/certificate的PaaTrustStore，默认使用进程内共享的实例。PAI的校验结果（包括证书本身
+    不合规的失败结果）按证书内容在内存中按LRU保留max_entries条；DCL查询失败、签发者不是已批准的PAA等取决于DCL
+    数据的结果不缓存。线程安全。
+    """
+
+    def __init__(self, trust_store=None, max_entries=attestation_cache_size):
+        self.trust_store = trust_store if trust_store is not None else get_trust_store()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pai_results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify_pai(self, pai_data) -> (bool, str, VerifiedPai):
+        """校验PAI由已批准的PAA签发，结果按证书内容缓存"""
+        key = hashlib.sha256(bytes(pai_data)).digest()
+        with self._lock:
+            result = self._pai_results.get(key)
+            if result is not None:
+                self._pai_results.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        try:
+            result = self._verify_pai(pai_data)
+        except RuntimeError as e:
+            return False, str(e), None
+        with self._lock:
+            self._pai_results[key] = result
+            while len(self._pai_results) > self.max_entries:
+                self._pai_results.popitem(last=False)
+        return result
+
+    def _verify_pai(self, pai_data):
+        try:
+            pai = load_certificate(pai_data)
+        except ValueError as e:
+            return False, f"PAI证书格式错误:{e}", None
+        problem = _check_profile(pai, "PAI", ca=True)
+        if problem:
+            return False, problem, None
+        try:
+            vid, pid = matter_vid_pid(pai.subject)
+        except ValueError as e:
+            return False, f"PAI证书中的VID/PID格式错误:{e}", None
+        if vid is None:
+            return False, "PAI证书中缺少VID", None
+        key_id, paa_key_id = key_ids(pai)
+        if key_id is None or paa_key_id is None:
+            return False, "PAI证书缺少SubjectKeyIdentifier或AuthorityKeyIdentifier", None
+
+        # 是否为已批准的PAA取决于DCL当前的数据，与DCL查询失败一样不缓存
+        if self.trust_store.find(paa_key_id) is None:
+            raise RuntimeError(f"PAI的签发者({paa_key_id.hex().upper()})不是DCL上已批准的PAA")
+        try:
+            paa = self.trust_store.certificate(paa_key_id)
+        except ValueError as e:
+            return False, f"DCL中的PAA证书({paa_key_id.hex().upper()})格式错误:{e}", None
+        if paa is None:
+            raise RuntimeError(f"无法从DCL获取PAA证书({paa_key_id.hex().upper()})")
+        problem = _check_profile(paa, "PAA", ca=True)
+        if problem:
+            return False, problem, None
+        if not _issued_by(pai, paa):
+            return False, f"PAI证书不是由PAA({paa_key_id.hex().upper()})签发", None
+        try:
+            paa_vid, _ = matter_vid_pid(paa.subject)
+        except ValueError as e:
+            return False, f"PAA证书中的VID格式错误:{e}", None
+        if paa_vid is not None and paa_vid != vid:
+            return False, f"PAI的VID(0x{vid:04X})与PAA的VID(0x{paa_vid:04X})不一致", None
+
+        not_before = max(pai.not_valid_before_utc, paa.not_valid_before_utc)
+        not_after = min(pai.not_valid_after_utc, paa.not_valid_after_utc)
+        return True, "", VerifiedPai(pai, vid, pid, key_id, paa_key_id, not_before, not_after)
+
+    def check_pai(self, pai: VerifiedPai, at) -> (bool, str):
+        """检查已校验的PAI在at时是否有效，以及其PAA是否仍是DCL上已批准的PAA（PAI的校验结果可能来自缓存）"""
+        if not pai.not_before <= at <= pai.not_after:
+            return False, "PAI或PAA证书不在有效期内"
+        try:
+            if self.trust_store.find(pai.paa_key_id) is None:
+                return False, f"PAA({pai.paa_key_id.hex().upper()})已不是DCL上已批准的PAA"
+        except RuntimeError as e:
+            return False, str(e)
+        return True, ""
+
+    def verify(self, dac_data, pai_data, cd=None, at=None) -> (bool, str, dict):
+        """校验DAC证书链，cd为CertificationElements时同时检查与CD的一致性
+
+        at为校验有效期的时间（带时区的datetime），默认为当前时间。
+        成功时返回的数据包含DAC/PAI的VID、PID与PAA的subjectKeyId。
+        """
+        at = at if at is not None else datetime.datetime.now(datetime.timezone.utc)
+        ok, msg, pai = self.verify_pai(pai_data)
+        if not ok:
+            return False, msg, None
+        ok, msg = self.check_pai(pai, at)
+        if not ok:
+            return False, msg, None
+
+        try:
+            dac = load_certificate(dac_data)
+        except ValueError as e:
+            return False, f"DAC证书格式错误:{e}", None
+        ok, msg, ids = check_dac(dac, pai.cert, pai.key_id, at)
+        if not ok:
+            return False, msg, None
+        dac_vid, dac_pid = ids
+        ok, msg = check_dac_issuer(dac_vid, dac_pid, pai)
+        if not ok:
+            return False, msg, None
+
+        if cd is not None:
+            ok, msg = check_cd_consistency(cd, dac_vid, dac_pid, pai.vid, pai.paa_key_id)
+            if not ok:
+                return False, msg, None
+        return True, "", {
+            "dac_vid": dac_vid,
+            "dac_pid": dac_pid,
+            "pai_vid": pai.vid,
+            "pai_pid": pai.pid,
+            "paa_subject_key_id": pai.paa_key_id.hex().upper(),
+        }
+
+
+_default_verifier = None
+_default_verifier_lock = threading.Lock()
+
+
+def get_attestation_verifier():
+    """进程内共享的AttestationVerifier"""
+    global _default_verifier
+    if _default_verifier is None:
+        with _default_verifier_lock:
+            if _default_verifier is None:
+                _default_verifier = AttestationVerifier()
+    return _default_verifier
+
+
+def verify_attestation(dac_data, pai_data, cd=None, verifier=None) -> (bool, str, dict):
+    """校验DAC证书链，verifier默认为进程内共享的AttestationVerifier"""
+    verifier = verifier if verifier is not None else get_attestation_verifier()
+    return verifier.verify(dac_data, pai_data, cd)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify A DAC/PAI Attestation Chain Against DCL Approved PAAs")
+    parser.add_argument("dac", type=str, help="DAC certificate (PEM or DER)")
+    parser.add_argument("pai", type=str, help="PAI certificate (PEM or DER)")
+    parser.add_argument("--cd", type=str, help="CD file to check the VID/PID and authorized PAAs against")
+    args = parser.parse_args()
+
+    cd = None
+    if args.cd:
+        from cd.parser import parse_cd
+
+        with open(args.cd, "rb") as f:
+            cd = parse_cd(f.read())
+        if not cd:
+            sys.exit(1)
+    ok, msg, info = verify_attestation(pathlib.Path(args.dac).read_bytes(), pathlib.Path(args.pai).read_bytes(), cd)
+    print(json.dumps({"is_valid": ok, "problem": msg or None, "chain": info}, indent=4, ensure_ascii=False))
+    sys.exit(0 if ok else 1)
@@ -1,28 +1,37 @@
-import json
+from http import HTTPStatus
 
-import requests
+from dcl.client import get_client
+from dcl.export import ROOT_CERTIFICATES_PATH, certificates_path
+from utils.metrics import count_error, dcl_span
 
-from config.define import baseUrl
 
-
-def query_root_certificates() -> (bool, str, list):
+def query_root_certificates(client=None) -> (bool, str, list):
     try:
-        response = requests.get(
-            f"{baseUrl}/dcl/pki/root-certificates"
-        )
-        resp_data = response.json()
-        return True, "", resp_data["approvedRootCertificates"]["certs"]
+        with dcl_span("root_certificates"):
+            status_code, resp_data = (client or get_client()).get(ROOT_CERTIFICATES_PATH)
+        if status_code != HTTPStatus.OK:
+            result = False, f"错误码:{status_code}", None
+        else:
+            result = True, "", resp_data["approvedRootCertificates"]["certs"]
     except Exception as e:
-        return False, str(e), None
+        result = False, str(e), None
+    if not result[0]:
+        count_error("dcl.root_certificates")
+    return result
 
 
-def query_certificates(subject, subject_key_id) -> (bool, str, object):
+def query_certificates(subject, subject_key_id, client=None) -> (bool, str, object):
     try:
-        response = requests.get(
-            f"{baseUrl}/dcl/pki/certificates/"
-            f"{subject}/{subject_key_id}"
-        )
-        resp_data = response.json()
-        return True, "", resp_data["approvedCertificates"]
+        with dcl_span("certificates"):
+            status_code, resp_data = (client or get_client()).get(certificates_path(subject, subject_key_id))
+        if status_code == HTTPStatus.NOT_FOUND:
+            result = False, f"证书{subject}/{subject_key_id}不在DCL上", None
+        elif status_code != HTTPStatus.OK:
+            result = False, f"错误码:{status_code}", None
+        else:
+            result = True, "", resp_data["approvedCertificates"]
     except Exception as e:
-        return False, str(e), None
+        result = False, str(e), None
+    if not result[0]:
+        count_error("dcl.certificates")
+    return result
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""批量扫描产线输出的DAC证书
+
+从目录或PEM/DER证书包中流式读取DAC，在进程池中解析证书、提取VID/PID/SKID/AKID并校验DAC签名，按签发者（AKID）
+分组后，每个PAI只向DCL上已批准的PAA校验一次，再检查各DAC与PAI、CD是否一致。读取、处理中的证书数量与汇总中
+保留的异常设备数量都有上限，内存占用与DAC总数无关。
+"""
+import argparse
+import binascii
+import datetime
+import json
+import os
+import pathlib
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+from config.define import dac_scan_chunk_size, dac_scan_max_exceptions
+from pki.attestation import check_cd_consistency, check_dac, check_dac_issuer, get_attestation_verifier, key_ids, \
+    load_certificate, matter_vid_pid
+
+_PEM_BEGIN = b"-----BEGIN CERTIFICATE-----"
+_PEM_END = b"-----END CERTIFICATE-----"
+
+
+def _read_der(f, first):
+    # 按DER的长度字段读出一个完整的SEQUENCE，first为已读出的第一个字节
+    header = first + f.read(1)
+    if len(header) < 2:
+        return header
+    length = header[1]
+    if length & 0x80:
+        size_bytes = f.read(length & 0x7F)
+        header += size_bytes
+        length = int.from_bytes(size_bytes, "big")
+    return header + f.read(length)
+
+
+def _iter_file_certificates(f):
+    first = f.read(1)
+    if first == b"\x30":
+        # 连续存放的DER证书
+        while first:
+            yield _read_der(f, first)
+            first = f.read(1)
+        return
+    lines = None
+    for line in (first + f.readline(), *f):
+        line = line.strip()
+        if line.startswith(_PEM_BEGIN):
+            lines = []
+        elif line.startswith(_PEM_END) and lines is not None:
+            try:
+                yield binascii.a2b_base64(b"".join(lines))
+            except binascii.Error:
+                yield b""
+            lines = None
+        elif lines is not None:
+            lines.append(line)
+
+
+def _iter_named(path, name):
+    # 文件中只有一个证书时名称为文件名，有多个时依次为"文件名#序号"
+    with open(path, "rb") as f:
+        certificates = _iter_file_certificates(f)
+        first = next(certificates, None)
+        second = next(certificates, None)
+        if second is None:
+            if first is not None:
+                yield name, first
+            return
+        yield f"{name}#0", first
+        yield f"{name}#1", second
+        for index, data in enumerate(certificates, 2):
+            yield f"{name}#{index}", data
+
+
+def iter_certificates(source):
+    """流式遍历证书，返回(名称, DER内容)
+
+    source可以是目录（递归查找所有文件）或单个文件，每个文件可以是单个或连续存放的多个PEM/DER证书。
+    """
+    source = pathlib.Path(source)
+    if not source.is_dir():
+        yield from _iter_named(source, source.name)
+        return
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for file_name in sorted(files):
+            path = pathlib.Path(root, file_name)
+            yield from _iter_named(path, str(path.relative_to(source)))
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# 工作进程中的PAI证书，{SKID: x509.Certificate}
+_worker_pais = {}
+
+
+def _init_worker(pai_ders):
+    global _worker_pais
+    _worker_pais = {}
+    for data in pai_ders:
+        pai = x509.load_der_x509_certificate(data)
+        _worker_pais[key_ids(pai)[0]] = pai
+
+
+def _check_chunk(chunk, at):
+    """在工作进程中检查一组DAC，返回[(名称, 问题, VID, PID, SKID, AKID)]，没有问题时问题为None"""
+    results = []
+    for name, data in chunk:
+        try:
+            dac = x509.load_der_x509_certificate(data)
+        except ValueError as e:
+            results.append((name, f"DAC证书格式错误:{e}", None, None, None, None))
+            continue
+        skid, akid = key_ids(dac)
+        try:
+            vid, pid = matter_vid_pid(dac.subject)
+        except ValueError:
+            vid = pid = None
+        pai = _worker_pais.get(akid)
+        if pai is None:
+            problem = f"没有签发该DAC的PAI证书({akid.hex().upper() if akid else None})"
+        else:
+            ok, problem, _ = check_dac(dac, pai, akid, at)
+            problem = None if ok else problem
+        results.append((name, problem, vid, pid, skid, akid))
+    return results
+
+
+def load_pais(sources):
+    """读取PAI证书文件或目录，返回DER内容列表，格式错误时抛出ValueError"""
+    pais = []
+    for source in sources:
+        for name, data in iter_certificates(source):
+            try:
+                pais.append(load_certificate(data).public_bytes(serialization.Encoding.DER))
+            except ValueError as e:
+                raise ValueError(f"PAI证书{name}格式错误:{e}")
+    return pais
+
+
+def scan_dacs(source, pai_ders, cd=None, jobs=None, chunk_size=dac_scan_chunk_size, verifier=None, at=None):
+    """批量检查source中的DAC，按输入顺序逐个返回(名称, 问题, 设备信息)，没有问题时问题为None
+
+    pai_ders为签发这些DAC的PAI证书（DER）。DAC的解析与签名校验在进程池中分块执行，同时处理中的块数量有上限；
+    每个PAI只通过verifier（默认为进程内共享的AttestationVerifier）校验一次。cd为CertificationElements时检查
+    各DAC与CD是否一致。设备信息包含DAC的VID、PID、SKID与签发者AKID（十六进制）。
+    """
+    verifier = verifier if verifier is not None else get_attestation_verifier()
+    at = at if at is not None else datetime.datetime.now(datetime.timezone.utc)
+    pais = {}
+    for data in pai_ders:
+        pais.setdefault(key_ids(x509.load_der_x509_certificate(data))[0], data)
+    # 本次扫描中各PAI的校验结果，{AKID: (ok, msg, VerifiedPai)}
+    issuers = {}
+
+    def check_issuer(akid):
+        result = issuers.get(akid)
+        if result is None:
+            ok, msg, pai = verifier.verify_pai(pais[akid])
+            if ok:
+                ok, msg = verifier.check_pai(pai, at)
+            result = issuers[akid] = (ok, msg, pai)
+        return result
+
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(list(pais.values()),)) as pool:
+        # 最多同时提交2 * jobs个块，读取速度不会超过处理速度
+        max_pending = 2 * jobs
+        pending = deque()
+        chunks = _chunks(iter_certificates(source), chunk_size)
+        while True:
+            while len(pending) < max_pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append(pool.submit(_check_chunk, chunk, at))
+            if not pending:
+                break
+            for name, problem, vid, pid, skid, akid in pending.popleft().result():
+                if problem is None:
+                    ok, problem, pai = check_issuer(akid)
+                    if ok:
+                        ok, problem = check_dac_issuer(vid, pid, pai)
+                    if ok and cd is not None:
+                        ok, problem = check_cd_consistency(cd, vid, pid, pai.vid, pai.paa_key_id)
+                    if ok:
+                        problem = None
+                yield name, problem, {
+                    "vid": vid,
+                    "pid": pid,
+                    "subject_key_id": skid.hex().upper() if skid else None,
+                    "authority_key_id": akid.hex().upper() if akid else None,
+                }
+
+
+class ScanSummary:
+    """扫描结果汇总：总数、按签发者分组的统计，以及最多max_exceptions个异常设备（其余只计数）"""
+
+    def __init__(self, max_exceptions=dac_scan_max_exceptions):
+        self.max_exceptions = max_exceptions
+        self.total = 0
+        self.invalid = 0
+        self.issuers = {}
+        self.exceptions = []
+        self.exceptions_dropped = 0
+
+    def add(self, name, problem, device):
+        self.total += 1
+        issuer = self.issuers.get(device["authority_key_id"])
+        if issuer is None:
+            issuer = self.issuers[device["authority_key_id"]] = {"count": 0, "invalid": 0, "vids": set(),
+                                                                   "pid_min": None, "pid_max": None}
+        issuer["count"] += 1
+        if device["vid"] is not None:
+            issuer["vids"].add(device["vid"])
+        pid = device["pid"]
+        if pid is not None:
+            issuer["pid_min"] = pid if issuer["pid_min"] is None else min(issuer["pid_min"], pid)
+            issuer["pid_max"] = pid if issuer["pid_max"] is None else max(issuer["pid_max"], pid)
+        if problem is None:
+            return
+        self.invalid += 1
+        issuer["invalid"] += 1
+        if len(self.exceptions) < self.max_exceptions:
+            self.exceptions.append({"file": name, "problem": problem, **device})
+        else:
+            self.exceptions_dropped += 1
+
+    def to_dict(self):
+        return {
+            "total": self.total,
+            "valid": self.total - self.invalid,
+            "invalid": self.invalid,
+            "issuers": {akid: {**issuer, "vids": sorted(issuer["vids"])} for akid, issuer in self.issuers.items()},
+            "exceptions": self.exceptions,
+            "exceptions_dropped": self.exceptions_dropped,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk Check Factory DACs Against Their PAIs, The CD And DCL PAAs")
+    parser.add_argument("source", type=str, help="Directory of DAC files, or a concatenated PEM/DER bundle")
+    parser.add_argument("--pai", type=str, nargs="+", required=True, help="PAI certificate files or directories")
+    parser.add_argument("--cd", type=str, help="CD file to check the VID/PID and authorized PAAs against")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=dac_scan_chunk_size, help="DACs per worker task")
+    parser.add_argument("--max-exceptions", type=int, default=dac_scan_max_exceptions,
+                        help="Failed devices listed in the summary, the rest are only counted")
+    parser.add_argument("--exceptions", type=str, help="Also write every failed device to this JSON Lines file")
+    parser.add_argument("--progress", type=float, default=5.0, help="Seconds between progress reports, 0 disables")
+    args = parser.parse_args()
+
+    cd = None
+    if args.cd:
+        from cd.parser import parse_cd
+
+        with open(args.cd, "rb") as f:
+            cd = parse_cd(f.read())
+        if not cd:
+            sys.exit(1)
+
+    summary = ScanSummary(args.max_exceptions)
+    exceptions_file = open(args.exceptions, "w", encoding="utf-8") if args.exceptions else None
+    start = last_report = time.perf_counter()
+    for name, problem, device in scan_dacs(args.source, load_pais(args.pai), cd, args.jobs, args.chunk_size):
+        summary.add(name, problem, device)
+        if problem is not None and exceptions_file:
+            exceptions_file.write(json.dumps({"file": name, "problem": problem, **device}, ensure_ascii=False) + "\n")
+        now = time.perf_counter()
+        if args.progress and now - last_report >= args.progress:
+            print(f"已检查{summary.total}个DAC，{summary.invalid}个存在问题，{summary.total / (now - start):.0f}个/秒",
+                  file=sys.stderr, flush=True)
+            last_report = now
+    if exceptions_file:
+        exceptions_file.close()
+
+    elapsed = time.perf_counter() - start
+    result = summary.to_dict()
+    result["elapsed"] = round(elapsed, 3)
+    result["throughput"] = round(summary.total / elapsed, 1) if elapsed > 0 else None
+    print(json.dumps(result, indent=4, ensure_ascii=False))
+    print(f"检查{summary.total}个DAC，{summary.invalid}个存在问题，耗时{elapsed:.2f}秒", file=sys.stderr)
+    sys.exit(1 if summary.invalid else 0)
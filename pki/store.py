@@ -0,0 +1,125 @@
+import threading
+import time
+
+from config.define import pki_refresh_interval
+from pki import query as pki_query
+
+
+def parse_subject_key_id(subject_key_id):
+    """DCL中的subjectKeyId（如"6A:FD:22:..."）转换为原始字节"""
+    return bytes.fromhex(subject_key_id.replace(":", ""))
+
+
+class PaaTrustStore:
+    """DCL上已批准的PAA根证书索引
+
+    根证书列表只加载一次，按原始subjectKeyId字节与subject建立索引，超过refresh_interval后在下次访问时重新加载。
+    证书记录（subjectAsText、pemCert等）在第一次用到时查询并缓存，之后同一个PAA的名称与证书查询不再访问网络。
+    线程安全。
+    """
+
+    def __init__(self, pki=pki_query, refresh_interval=pki_refresh_interval):
+        self._pki = pki
+        self.refresh_interval = refresh_interval
+        self._by_key_id = {}
+        self._by_subject = {}
+        self._records = {}
+        self._certificates = {}
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def refresh(self):
+        """重新加载根证书列表，失败时保留原有索引并抛出RuntimeError"""
+        ok, msg, root_certificates = self._pki.query_root_certificates()
+        if not ok:
+            raise RuntimeError(f"获取DCL根证书列表失败:{msg}")
+        by_key_id = {}
+        by_subject = {}
+        for cert in root_certificates:
+            by_key_id[parse_subject_key_id(cert["subjectKeyId"])] = cert
+            by_subject.setdefault(cert["subject"], []).append(cert)
+        with self._lock:
+            self._by_key_id = by_key_id
+            self._by_subject = by_subject
+            self._records = {key: record for key, record in self._records.items() if key in by_key_id}
+            self._certificates = {key: cert for key, cert in self._certificates.items() if key in by_key_id}
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        with self._lock:
+            expired = self._loaded_at is None or time.monotonic() - self._loaded_at >= self.refresh_interval
+            if expired:
+                try:
+                    self.refresh()
+                except RuntimeError:
+                    # 已有数据时继续使用旧索引，下次访问再重试
+                    if self._loaded_at is None:
+                        raise
+
+    def find(self, subject_key_id: bytes):
+        """按原始subjectKeyId查找根证书，返回DCL中的{"subject", "subjectKeyId"}或None"""
+        self._ensure_loaded()
+        return self._by_key_id.get(bytes(subject_key_id))
+
+    def find_by_subject(self, subject):
+        self._ensure_loaded()
+        return list(self._by_subject.get(subject, ()))
+
+    def __contains__(self, subject_key_id):
+        return self.find(subject_key_id) is not None
+
+    def approved_certificate(self, subject_key_id: bytes):
+        """返回DCL中PAA证书的记录（subjectAsText、pemCert等），不是已批准的PAA或查询失败时返回None"""
+        key = bytes(subject_key_id)
+        root = self.find(key)
+        if root is None:
+            return None
+        with self._lock:
+            if key in self._records:
+                return self._records[key]
+        ok, msg, certificate = self._pki.query_certificates(root["subject"], root["subjectKeyId"])
+        if not ok:
+            return None
+        record = None
+        for cert in certificate["certs"]:
+            if cert["subjectKeyId"] == root["subjectKeyId"]:
+                record = cert
+                break
+        with self._lock:
+            self._records[key] = record
+        return record
+
+    def subject_as_text(self, subject_key_id: bytes):
+        """返回PAA证书的subjectAsText，不是已批准的PAA时返回None"""
+        record = self.approved_certificate(subject_key_id)
+        return record.get("subjectAsText") if record is not None else None
+
+    def certificate(self, subject_key_id: bytes):
+        """返回解析后的PAA证书（x509.Certificate），DCL记录中没有证书内容时返回None，证书格式错误时抛出ValueError"""
+        key = bytes(subject_key_id)
+        with self._lock:
+            if key in self._certificates:
+                return self._certificates[key]
+        record = self.approved_certificate(key)
+        if record is None or not record.get("pemCert"):
+            return None
+        from cryptography import x509
+
+        certificate = x509.load_pem_x509_certificate(record["pemCert"].encode())
+        with self._lock:
+            self._certificates[key] = certificate
+        return certificate
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_trust_store():
+    """进程内共享的PaaTrustStore"""
+    global _default_store
+    if _default_store is None:
+        with _default_store_lock:
+            if _default_store is None:
+                _default_store = PaaTrustStore()
+    return _default_store
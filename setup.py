@@ -0,0 +1,16 @@
+from setuptools import Extension, setup
+
+# The compiled TLV codec is optional, chip.tlv falls back to its pure-Python implementation when it is not built.
+# pip builds it from pyproject.toml (Cython is a build requirement), a missing C compiler only skips the extension.
+# Build it in place with: python setup.py build_ext --inplace
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    ext_modules = []
+else:
+    ext_modules = cythonize(
+        [Extension("chip.tlv._tlvcodec", ["chip/tlv/_tlvcodec.pyx"], optional=True)],
+        compiler_directives={"language_level": 3},
+    )
+
+setup(ext_modules=ext_modules)
@@ -0,0 +1,185 @@
+"""各处理阶段的耗时统计，以Prometheus文本格式输出
+
+span(stage)与dcl_span(endpoint)记录一段代码的耗时：启用指标时计入直方图，在collect_timings()中时同时累加到
+本次请求的耗时明细中。两者都未启用时span返回空的上下文管理器，几乎没有开销。
+
+多进程部署时每个工作进程分别统计，/metrics返回的是处理该次请求的进程的数据。
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+from config.define import metrics_enabled
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    def __init__(self, name, documentation, label_name, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((label, [list(counts), total, count]) for label, (counts, total, count) in self._series.items())
+        for label, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels([(self.label_name, label), ('le', le)])} {cumulative}")
+            labels = _format_labels([(self.label_name, label)])
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, label_name):
+        self.name = name
+        self.documentation = documentation
+        self.label_name = label_name
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label, amount=1):
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels([(self.label_name, label)])} {value}" for label, value in items)
+        return lines
+
+
+STAGE_DURATION = Histogram("cd_validator_stage_duration_seconds", "Time spent in each processing stage", "stage")
+DCL_DURATION = Histogram("cd_validator_dcl_request_duration_seconds", "Time spent in each DCL query", "endpoint")
+REQUEST_DURATION = Histogram("cd_validator_request_duration_seconds", "HTTP request latency", "path")
+ERRORS = Counter("cd_validator_errors_total", "Number of failed stages and DCL queries", "stage")
+
+_metrics = [STAGE_DURATION, DCL_DURATION, REQUEST_DURATION, ERRORS]
+_collectors = []
+
+_enabled = metrics_enabled
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+
+class _Span:
+    __slots__ = ("histogram", "label", "key", "timings", "start")
+
+    def __init__(self, histogram, label, key, timings):
+        self.histogram = histogram
+        self.label = label
+        self.key = key
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        elapsed = time.perf_counter() - self.start
+        if _enabled:
+            self.histogram.observe(self.label, elapsed)
+        if self.timings is not None:
+            self.timings[self.key] = self.timings.get(self.key, 0.0) + elapsed
+        return False
+
+
+def span(stage):
+    """记录一个处理阶段的耗时，如span("tlv_decode")"""
+    timings = _request_timings.get()
+    if not _enabled and timings is None:
+        return _NULL_SPAN
+    return _Span(STAGE_DURATION, stage, stage, timings)
+
+
+def dcl_span(endpoint):
+    """记录一次DCL查询的耗时，endpoint如"vendor_info"，请求明细中的名称为"dcl.<endpoint>\""""
+    timings = _request_timings.get()
+    if not _enabled and timings is None:
+        return _NULL_SPAN
+    return _Span(DCL_DURATION, endpoint, "dcl." + endpoint, timings)
+
+
+def count_error(stage):
+    if _enabled:
+        ERRORS.inc(stage)
+
+
+def observe_request(path, seconds):
+    if _enabled:
+        REQUEST_DURATION.observe(path, seconds)
+
+
+@contextlib.contextmanager
+def collect_timings():
+    """在此范围内（包括其中创建的asyncio任务）的span耗时累加到返回的dict中，单位为秒"""
+    timings = {}
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def register_collector(collector):
+    """注册在输出时才读取的指标，collector返回[(名称, 类型, 说明, [(标签dict, 数值)])]"""
+    _collectors.append(collector)
+
+
+def unregister_collector(collector):
+    if collector in _collectors:
+        _collectors.remove(collector)
+
+
+def render_metrics():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in list(_collectors):
+        for name, metric_type, documentation, samples in collector():
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import pathlib
+import sys
+import tarfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from pyasn1.error import PyAsn1Error
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from cd import query as cd_query
+from pki import query as pki_query
+from cd.parser import parse_cd_tlv, unwrap_cd
+from cd.signature import get_signing_key_store, verify_cd_parts
+from config.define import cd_signing_keys_path
+from pki.store import PaaTrustStore
+from validator.validate import map_paa_with_name, validate_cd
+
+
+class DedupDclQuery:
+    """批量校验用的DCL查询，同一批次内相同的(vendor_id, pid, version)只请求一次
+
+    提供与cd.query、pki.query相同的接口，可直接传给validate_cd和PaaTrustStore，线程安全。
+    """
+
+    def __init__(self, dcl=cd_query, pki=pki_query):
+        self._dcl = dcl
+        self._pki = pki
+        self._results = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hits = 0
+
+    def _memoize(self, key, func, *args):
+        with self._lock:
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._results[key] = future
+                self.requests += 1
+            else:
+                self.hits += 1
+        if owner:
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def query_vendor_info(self, cd):
+        return self._memoize(("vendor", cd.vendor_id), self._dcl.query_vendor_info, cd)
+
+    def query_model_info(self, cd):
+        return self._memoize(("model", cd.vendor_id, cd.product_id_array[-1]), self._dcl.query_model_info, cd)
+
+    def query_compliance_info(self, cd):
+        key = ("compliance", cd.vendor_id, cd.product_id_array[-1], cd.version_number)
+        return self._memoize(key, self._dcl.query_compliance_info, cd)
+
+    def query_root_certificates(self):
+        return self._memoize(("roots",), self._pki.query_root_certificates)
+
+    def query_certificates(self, subject, subject_key_id):
+        key = ("certificates", subject, subject_key_id)
+        return self._memoize(key, self._pki.query_certificates, subject, subject_key_id)
+
+
+def iter_cd_files(source):
+    """遍历待校验的CD文件，返回(名称, 文件内容)
+
+    source可以是目录（递归查找所有文件）、tar包（支持压缩）或清单文件（每行一个路径，相对路径以清单所在目录为准）。
+    """
+    source = pathlib.Path(source)
+    if source.is_dir():
+        for path in sorted(p for p in source.rglob("*") if p.is_file()):
+            yield str(path.relative_to(source)), path.read_bytes()
+    elif tarfile.is_tarfile(source):
+        with tarfile.open(source, "r:*") as tar:
+            for member in tar:
+                if member.isfile():
+                    yield member.name, tar.extractfile(member).read()
+    else:
+        with open(source, encoding="utf-8") as manifest:
+            for line in manifest:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                path = pathlib.Path(line)
+                if not path.is_absolute():
+                    path = source.parent / path
+                yield line, path.read_bytes()
+
+
+def _parse_one(name, data, signing_keys=None):
+    try:
+        parts = unwrap_cd(data)
+    except PyAsn1Error:
+        return name, None, None, "Failed to parse CD file"
+    try:
+        # 签名证书在每个解析进程中只加载一次
+        signature = verify_cd_parts(parts, get_signing_key_store(signing_keys)) if signing_keys else None
+        cd = parse_cd_tlv(parts.econtent)
+    except Exception as e:
+        return name, None, None, f"{type(e).__name__}: {e}"
+    return name, cd, signature, None
+
+
+def _validate_one(dcl, cd, signature, paa_store):
+    report = validate_cd(cd, dcl=dcl, signature=signature)
+    if paa_store is not None:
+        # 与paa_authority_list一一对应，不是已批准的PAA时为None
+        report["paa_authority_list_name"] = list(map_paa_with_name(cd, store=paa_store))
+    return report
+
+
+def validate_batch(source, jobs=None, dcl_workers=8, resolve_paa=False, dcl=None, signing_keys=None):
+    """批量校验CD文件，按完成顺序逐个返回(名称, 报告)
+
+    CD文件在进程池中解析，DCL查询与校验在线程池中并发执行，DCL查询按(vendor_id, pid, version)去重，
+    相同产品的CD只会请求一次DCL。signing_keys为CD签名证书目录，设置时在解析进程中校验CD签名。
+    文件按需读取：解析中的文件最多2 * jobs个，等待校验的CD达到2 * dcl_workers个时暂停读取，内存占用与文件总数无关。
+    """
+    dcl = dcl if dcl is not None else DedupDclQuery()
+    paa_store = PaaTrustStore(pki=dcl) if resolve_paa else None
+    jobs = jobs or os.cpu_count() or 1
+    max_parsing = 2 * jobs
+    max_validating = 2 * dcl_workers
+    with ProcessPoolExecutor(max_workers=jobs) as parse_pool, ThreadPoolExecutor(max_workers=dcl_workers) as dcl_pool:
+        files = iter_cd_files(source)
+        parsing = set()
+        validating = {}
+        while True:
+            while len(parsing) < max_parsing and len(validating) < max_validating:
+                item = next(files, None)
+                if item is None:
+                    break
+                name, data = item
+                parsing.add(parse_pool.submit(_parse_one, name, data, signing_keys))
+            if not parsing and not validating:
+                break
+
+            done, _ = wait(parsing | validating.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in parsing:
+                    parsing.remove(future)
+                    name, cd, signature, error = future.result()
+                    if cd is None:
+                        yield name, {"error": error}
+                    else:
+                        validating[dcl_pool.submit(_validate_one, dcl, cd, signature, paa_store)] = name
+                    continue
+                name = validating.pop(future)
+                try:
+                    report = future.result()
+                except Exception as e:
+                    report = {"error": f"{type(e).__name__}: {e}"}
+                yield name, report
+
+
+def _report_path(output_dir, name, used):
+    """name对应的报告文件路径，在output_dir下保持name的目录结构
+
+    tar包与清单中的名称可能是绝对路径或包含".."，这些部分被去掉，报告总是写在output_dir内。
+    去掉后与本次已使用的路径（used）重复时加序号，不会覆盖其他文件的报告。
+    """
+    parts = [part for part in pathlib.PurePosixPath(name.replace("\\", "/")).parts if part not in ("/", ".", "..")]
+    relative = os.path.join(*parts) if parts else "_"
+    path = os.path.join(output_dir, relative + ".json")
+    suffix = 1
+    while path in used:
+        path = os.path.join(output_dir, f"{relative}.{suffix}.json")
+        suffix += 1
+    used.add(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Batch Parse CD Files And Check Validity")
+    parser.add_argument(
+        "source",
+        type=str,
+        help="Directory, tarball or manifest file of CD files",
+    )
+    parser.add_argument("-o", "--output", type=str,
+                        help="Directory to write one JSON report per CD file, keeping the directory structure of the "
+                             "source")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of parser processes")
+    parser.add_argument("--dcl-workers", type=int, default=8, help="Number of concurrent DCL requests")
+    parser.add_argument("--paa", action="store_true", help="Resolve the names of the authorized PAAs")
+    parser.add_argument("--signing-keys", type=str, default=cd_signing_keys_path,
+                        help="Directory of CD signing certificates to verify the signatures, "
+                             "defaults to CD_SIGNING_KEYS_PATH")
+    args = parser.parse_args()
+
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+
+    dcl = DedupDclQuery()
+    report_paths = set()
+    start = time.perf_counter()
+    total = invalid = 0
+    for name, report in validate_batch(args.source, args.jobs, args.dcl_workers, args.paa, dcl,
+                                       args.signing_keys):
+        total += 1
+        if "error" in report or not report["validator"]["is_valid"]:
+            invalid += 1
+        if args.output:
+            with open(_report_path(args.output, name, report_paths), "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=4, ensure_ascii=False)
+        else:
+            print(json.dumps({"file": name, "report": report}, ensure_ascii=False), flush=True)
+
+    print(f"校验{total}个文件，{invalid}个存在问题，DCL请求{dcl.requests}次（去重{dcl.hits}次），"
+          f"耗时{time.perf_counter() - start:.2f}秒", file=sys.stderr)
+    sys.exit(1 if invalid else 0)
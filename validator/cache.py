@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from cd.define import CD_SCHEMA
+from chip.tlv.schema import TLVSchemaError
+from config.define import cd_result_cache_path, cd_result_cache_size, cd_result_cache_ttl
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cd_result (
+    key TEXT PRIMARY KEY,
+    payload BLOB NOT NULL,
+    dcl_version TEXT,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def cd_digest(cd_file_data):
+    return hashlib.sha256(cd_file_data).hexdigest()
+
+
+def report_variant(rules=None, signature=False):
+    """校验报告缓存键中区分校验选项的部分"""
+    return f"{','.join(rules) if rules is not None else '*'}|{'sig' if signature else ''}"
+
+
+def dcl_data_version(client, paths=None):
+    """DCL客户端的数据版本，作为校验报告缓存键的一部分
+
+    paths为报告用到的DCL查询路径（validator.validate.dcl_query_paths）。本地镜像为最近一次同步的时间，
+    带持久化缓存的客户端为这些路径的缓存条目最近一次写入或刷新的时间，报告用到的DCL数据变化后报告随之失效，
+    其他CD的查询不影响。写入报告时应在校验之后读取版本，校验本身会写入DCL缓存。
+    直接访问DCL的客户端没有版本（None），缓存的报告只按ttl过期。
+    """
+    data_version = getattr(client, "data_version", None)
+    return data_version(paths) if data_version is not None else None
+
+
+class ResultCache:
+    """按CD文件SHA-256缓存解析结果与校验报告
+
+    内存中按LRU保留max_entries条，设置path时同时写入SQLite，多次运行或多个进程之间共享。
+    解析结果保存为eContent（CD的TLV数据），读取时按CD_SCHEMA重新解码，共享的缓存文件中只有数据，不会被当作代码执行。
+    解析结果只取决于文件内容，不会过期；校验报告依赖DCL数据，超过ttl或DCL数据版本变化后失效。
+    返回的都是新的对象，调用方可以修改。线程安全。
+    """
+
+    def __init__(self, path=None, max_entries=cd_result_cache_size, ttl=cd_result_cache_ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+
+    def _lookup(self, key, dcl_version, ttl):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            elif self._conn is not None:
+                entry = self._conn.execute(
+                    "SELECT payload, dcl_version, created_at FROM cd_result WHERE key = ?", (key,)).fetchone()
+                if entry is not None:
+                    self._remember(key, entry)
+            if entry is not None:
+                payload, entry_version, created_at = entry
+                if entry_version == dcl_version and (ttl is None or time.time() - created_at < ttl):
+                    self.hits += 1
+                    return payload
+            self.misses += 1
+            return None
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, key, payload, dcl_version=None):
+        entry = (payload, dcl_version, time.time())
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO cd_result VALUES (?, ?, ?, ?)", (key, *entry))
+
+    def get_cd(self, digest):
+        """返回缓存的CertificationElements，没有缓存或缓存内容不符合CD_SCHEMA时为None"""
+        payload = self._lookup(f"cd_tlv:{digest}", None, None)
+        if payload is None:
+            return None
+        try:
+            return CD_SCHEMA.decode(payload)
+        except TLVSchemaError:
+            return None
+
+    def put_cd(self, digest, cd_tlv):
+        """保存CD文件的eContent（CD的TLV数据）"""
+        self._store(f"cd_tlv:{digest}", bytes(cd_tlv))
+
+    def get_report(self, digest, variant="", dcl_version=None):
+        payload = self._lookup(f"report:{digest}:{variant}", dcl_version, self.ttl)
+        return json.loads(payload) if payload is not None else None
+
+    def put_report(self, digest, report, variant="", dcl_version=None):
+        """保存校验报告；DCL查询失败的报告不缓存，下次重新查询"""
+        if report["validator"]["dcl_problem"]:
+            return
+        self._store(f"report:{digest}:{variant}", json.dumps(report, ensure_ascii=False), dcl_version)
+
+    def stats(self):
+        with self._lock:
+            stats = {"memory_entries": len(self._memory), "hits": self.hits, "misses": self.misses}
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM cd_result").fetchone()[0]
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM cd_result")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """进程内共享的ResultCache，配置了CD_RESULT_CACHE_PATH时带磁盘缓存"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResultCache(cd_result_cache_path)
+    return _default_cache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage The CD Result Cache")
+    parser.add_argument("--db", type=str, default=cd_result_cache_path,
+                        help="Cache database, defaults to CD_RESULT_CACHE_PATH")
+    parser.add_argument("command", choices=["stats", "clear"])
+    args = parser.parse_args()
+    if not args.db:
+        parser.error("未配置缓存路径，请设置CD_RESULT_CACHE_PATH或使用--db")
+
+    cache = ResultCache(args.db)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=4))
+    else:
+        cache.clear()
+    cache.close()
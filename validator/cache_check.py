@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""校验报告缓存的检查：同时配置DCL缓存与结果缓存时，重复校验同一CD应命中缓存的报告
+
+依次校验CD A、A、B、A，第二次起A都应命中：第一次校验写入的DCL缓存条目不能使刚保存的报告失效，
+校验其他CD（B）写入的DCL数据也不能使A的报告失效。分别检查服务（/validate_cd，需要fastapi）与命令行，
+DCL数据由本地FakeDclServer提供，不访问网络。有不符合预期的结果时返回1。
+"""
+import argparse
+import os
+import pathlib
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from benchmarks.cdgen import dcl_fixtures, generate_cds
+from dcl.cache import AsyncCachedDclClient, DclCache
+from dcl.client import AsyncDclClient
+from dcl.fake import FakeDclServer
+from validator.cache import ResultCache
+
+# 上传顺序与每次是否应命中报告缓存
+_SEQUENCE = [("A", False), ("A", True), ("B", False), ("A", True)]
+
+
+def _check_api(cds, dcl_url, tmp):
+    """通过/validate_cd依次上传，返回不符合预期的说明列表"""
+    from fastapi.testclient import TestClient
+
+    from backend.api import app
+
+    problems = []
+    result_cache = ResultCache(os.path.join(tmp, "api_result.db"))
+    with TestClient(app) as http:
+        async def use_caches():
+            old_client = app.state.dcl_client
+            app.state.dcl_client = AsyncCachedDclClient(AsyncDclClient(base_url=dcl_url),
+                                                        DclCache(os.path.join(tmp, "api_dcl.db")))
+            app.state.result_cache = result_cache
+            await old_client.aclose()
+
+        http.portal.call(use_caches)
+        for i, (name, expect_hit) in enumerate(_SEQUENCE):
+            hits = result_cache.hits
+            response = http.post("/validate_cd", files={"file": (f"{name}.der", cds[name])})
+            if response.status_code != 200 or "validator" not in response.json():
+                problems.append(f"服务第{i + 1}次校验{name}失败:{response.text}")
+            elif (result_cache.hits > hits) != expect_hit:
+                problems.append(f"服务第{i + 1}次校验{name}应{'命中' if expect_hit else '未命中'}报告缓存")
+        app.state.dcl_client.cache.close()
+    result_cache.close()
+    return problems
+
+
+def _report_created_at(db):
+    # 命中时报告不重写，created_at不变；未命中时重新校验并写入
+    with sqlite3.connect(db) as conn:
+        return dict(conn.execute("SELECT key, created_at FROM cd_result WHERE key LIKE 'report:%'").fetchall())
+
+
+def _check_cli(cd_files, dcl_url, tmp):
+    """以新的进程依次运行命令行，通过结果缓存中报告的写入时间判断是否命中，返回不符合预期的说明列表"""
+    result_db = os.path.join(tmp, "cli_result.db")
+    env = dict(os.environ, DCL_BASE_URL=dcl_url, DCL_CACHE_PATH=os.path.join(tmp, "cli_dcl.db"),
+               CD_RESULT_CACHE_PATH=result_db)
+    problems = []
+    seen = {}
+    for i, (name, expect_hit) in enumerate(_SEQUENCE):
+        process = subprocess.run([sys.executable, "-m", "validator.validate", "--text", cd_files[name]], env=env,
+                                 cwd=pathlib.Path(__file__).parents[1], capture_output=True, text=True)
+        if process.returncode != 0:
+            problems.append(f"命令行第{i + 1}次校验{name}失败:{process.stderr.strip()}")
+            continue
+        reports = _report_created_at(result_db)
+        new = {key for key, created_at in reports.items() if seen.get(key) != created_at}
+        seen = reports
+        if (not new) != expect_hit:
+            problems.append(f"命令行第{i + 1}次校验{name}应{'命中' if expect_hit else '未命中'}报告缓存")
+    return problems
+
+
+def run_check(api=True, cli=True):
+    """返回不符合预期的说明列表"""
+    generated = generate_cds("small", 2)
+    cds = {name: data for name, (_, data, _) in zip("AB", generated)}
+    fixtures = dcl_fixtures(content for _, _, content in generated)
+    problems = []
+    with FakeDclServer(fixtures) as server, tempfile.TemporaryDirectory() as tmp:
+        if api:
+            problems.extend(_check_api(cds, server.url, tmp))
+        if cli:
+            cd_files = {}
+            for name, data in cds.items():
+                cd_files[name] = os.path.join(tmp, f"{name}.der")
+                with open(cd_files[name], "wb") as f:
+                    f.write(data)
+            problems.extend(_check_cli(cd_files, server.url, tmp))
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check That Repeated Validations Hit The Report Cache")
+    parser.add_argument("--skip-api", action="store_true", help="Do not check the service (needs fastapi)")
+    parser.add_argument("--skip-cli", action="store_true", help="Do not check the command line")
+    args = parser.parse_args()
+
+    problems = run_check(api=not args.skip_api, cli=not args.skip_cli)
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)}个结果不符合预期", file=sys.stderr)
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,148 @@
+"""CD与DCL信息的校验规则
+
+每条规则声明需要的DCL数据（vendor_info、model_info、compliance_info），校验时只查询所选规则需要的数据，
+缺少输入（查询失败）的规则不执行。规则检查函数的参数为cd与各项输入，没有问题时返回None，
+有问题时返回(名称, 数值, 问题描述)。
+
+e.g.
+```
+@registry.rule("productLabelNotEmpty", "model_info")
+def product_label_not_empty(cd, model_info):
+    if not model_info["productLabel"]:
+        return "productLabel", "", "不能为空"
+```
+"""
+import re
+import time
+
+from config.define import field_max_len
+
+DCL_INPUTS = ("vendor_info", "model_info", "compliance_info")
+
+_ABNORMAL_SPACES = re.compile(r"\s{2,}")
+
+
+class Rule:
+    __slots__ = ("name", "inputs", "check")
+
+    def __init__(self, name, inputs, check):
+        unknown = set(inputs) - set(DCL_INPUTS)
+        if unknown:
+            raise ValueError(f"规则{name}的输入{sorted(unknown)}不是DCL数据")
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.check = check
+
+    def __repr__(self):
+        return f"Rule({self.name!r}, {self.inputs!r})"
+
+
+class RuleSet:
+    """选定的一组规则，inputs为这些规则需要的全部DCL数据，按DCL_INPUTS的顺序排列"""
+
+    __slots__ = ("rules", "inputs")
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        needed = {name for rule in self.rules for name in rule.inputs}
+        self.inputs = tuple(name for name in DCL_INPUTS if name in needed)
+
+    def run(self, cd, inputs, report_data, timings=None):
+        """依次执行规则，问题写入report_data；timings为dict时记录每条规则的耗时（秒）"""
+        for rule in self.rules:
+            if not all(name in inputs for name in rule.inputs):
+                continue
+            if timings is None:
+                problem = rule.check(cd, *[inputs[name] for name in rule.inputs])
+            else:
+                start = time.perf_counter()
+                problem = rule.check(cd, *[inputs[name] for name in rule.inputs])
+                timings[rule.name] = time.perf_counter() - start
+            if problem is not None:
+                name, data, description = problem
+                report_data[name] = {"数值": data, "问题": description}
+
+
+class RuleRegistry:
+    """按注册顺序保存校验规则"""
+
+    def __init__(self):
+        self._rules = {}
+        self._rule_sets = {}
+
+    def add(self, name, inputs, check):
+        if name in self._rules:
+            raise ValueError(f"规则{name}已存在")
+        self._rules[name] = Rule(name, inputs, check)
+        self._rule_sets.clear()
+
+    def rule(self, name, *inputs):
+        """注册规则的装饰器"""
+
+        def decorator(check):
+            self.add(name, inputs, check)
+            return check
+
+        return decorator
+
+    def names(self):
+        return list(self._rules)
+
+    def select(self, names=None):
+        """返回由names（默认全部规则）组成的RuleSet，结果会被缓存"""
+        key = tuple(names) if names is not None else None
+        rule_set = self._rule_sets.get(key)
+        if rule_set is None:
+            if key is None:
+                rules = self._rules.values()
+            else:
+                unknown = [name for name in key if name not in self._rules]
+                if unknown:
+                    raise KeyError(f"未知的规则:{unknown}")
+                rules = [self._rules[name] for name in key]
+            rule_set = self._rule_sets[key] = RuleSet(rules)
+        return rule_set
+
+
+def abnormal_spaces(value):
+    # 检查尾部是否含有空格，或包含两个及以上的连续空格
+    if value != value.rstrip() or _ABNORMAL_SPACES.search(value) is not None:
+        return "有额外空格"
+    return None
+
+
+def max_length(limit):
+    def check(value):
+        if len(value) > limit:
+            return f"长度超出{limit}"
+        return None
+
+    return check
+
+
+def field_rule(field, *checks):
+    """对DCL数据中的一个字段依次执行checks，记录第一个问题"""
+
+    def check(cd, data):
+        value = data[field]
+        for field_check in checks:
+            description = field_check(value)
+            if description is not None:
+                return field, value, description
+        return None
+
+    return check
+
+
+def check_certificate_id(cd, compliance_info):
+    cd_certificate_id = compliance_info["cDCertificateId"]
+    if cd_certificate_id != cd.certificate_id:
+        return cd.certificate_id, "certificateID", f"CD内ID{cd.certificate_id}与DCL信息{cd_certificate_id}不匹配"
+    return None
+
+
+registry = RuleRegistry()
+registry.add("vendorName", ("vendor_info",), field_rule("vendorName", abnormal_spaces, max_length(field_max_len)))
+registry.add("productName", ("model_info",), field_rule("productName", abnormal_spaces, max_length(field_max_len)))
+registry.add("productLabel", ("model_info",), field_rule("productLabel", abnormal_spaces, max_length(field_max_len)))
+registry.add("certificateId", ("compliance_info",), check_certificate_id)
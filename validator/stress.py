@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""并发校验的压力测试：检查多个线程同时校验时各报告互不干扰
+
+生成一批CD与对应的DCL数据，其中一部分CD的DCL数据有问题（证书ID不匹配、名称有多余空格、标签过长），
+每个CD的问题各不相同。先逐个串行校验得到预期结果，再在线程池中多轮并发解析与校验（缩短线程切换间隔以增加交错），
+比较每个报告的cd_problem与串行结果是否一致，有不一致时返回1。DCL数据在内存中提供，不访问网络。
+"""
+import argparse
+import os
+import pathlib
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+
+from benchmarks.cdgen import cd_content, encode_cd, signing_key, wrap_cms
+from cd.parser import parse_cd
+from config.define import field_max_len
+from validator.validate import validate_cd
+
+
+class FixtureDcl:
+    """在内存中按(vid, pid)提供DCL数据的查询对象，接口与cd.query相同"""
+
+    def __init__(self):
+        self.vendors = {}
+        self.models = {}
+        self.compliance = {}
+
+    def query_vendor_info(self, cd):
+        return True, "", self.vendors[cd.vendor_id]
+
+    def query_model_info(self, cd):
+        return True, "", self.models[(cd.vendor_id, cd.product_id_array[-1])]
+
+    def query_compliance_info(self, cd):
+        return True, "", self.compliance[(cd.vendor_id, cd.product_id_array[-1], cd.version_number)]
+
+
+def build_cases(count, vendor_id=0xFFF1):
+    """生成count个CD文件与对应的FixtureDcl，返回([(名称, CD文件内容)], dcl)
+
+    按序号轮流生成：0没有问题，1证书ID不匹配，2产品名称有多余空格，3产品标签过长且证书ID不匹配。
+    """
+    key = signing_key()
+    dcl = FixtureDcl()
+    dcl.vendors[vendor_id] = {"vendorID": vendor_id, "vendorName": "Stress Vendor"}
+    cases = []
+    for i in range(count):
+        pid = 0x8000 + i
+        certificate_id = f"CSA{i:05d}SWC00000-00"
+        content = cd_content(vendor_id=vendor_id, product_ids=(pid,), certificate_id=certificate_id)
+        kind = i % 4
+        product_name = f"Stress Product {i} " if kind == 2 else f"Stress Product {i}"
+        product_label = f"Label {i} " + "x" * field_max_len if kind == 3 else f"Label {i}"
+        dcl_certificate_id = f"CSA{i:05d}SWC99999-00" if kind in (1, 3) else certificate_id
+        dcl.models[(vendor_id, pid)] = {"vid": vendor_id, "pid": pid, "productName": product_name,
+                                        "productLabel": product_label}
+        dcl.compliance[(vendor_id, pid, 1)] = {"vid": vendor_id, "pid": pid, "softwareVersion": 1,
+                                               "certificationType": "matter", "cDCertificateId": dcl_certificate_id}
+        cases.append((f"cd_{i}", wrap_cms(encode_cd(content), key)))
+    return cases, dcl
+
+
+def _cd_problem(data, dcl):
+    return validate_cd(parse_cd(data), dcl=dcl)["validator"]["cd_problem"]
+
+
+def run_stress(cases, dcl, threads=64, rounds=3, switch_interval=1e-6, seed=0):
+    """串行校验一遍cases得到预期结果，再用threads个线程并发校验rounds轮，返回(校验次数, 不一致的[(名称, 预期, 实际)])"""
+    expected = {name: _cd_problem(data, dcl) for name, data in cases}
+    work = [case for _ in range(rounds) for case in cases]
+    random.Random(seed).shuffle(work)
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(switch_interval)
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [(name, pool.submit(_cd_problem, data, dcl)) for name, data in work]
+            mismatches = [(name, expected[name], future.result()) for name, future in futures
+                          if future.result() != expected[name]]
+    finally:
+        sys.setswitchinterval(old_interval)
+    return len(work), mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check Concurrent Validation Reports Against A Serial Run")
+    parser.add_argument("-n", "--count", type=int, default=400, help="Number of distinct CDs")
+    parser.add_argument("--threads", type=int, default=64, help="Number of validation threads")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each CD is validated concurrently")
+    parser.add_argument("--switch-interval", type=float, default=1e-6,
+                        help="Thread switch interval (seconds) during the concurrent run")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the order of the concurrent validations")
+    args = parser.parse_args()
+
+    cases, dcl = build_cases(args.count)
+    start = time.perf_counter()
+    total, mismatches = run_stress(cases, dcl, args.threads, args.rounds, args.switch_interval, args.seed)
+    for name, expected, actual in mismatches[:20]:
+        print(f"{name}: 预期{expected}，实际{actual}")
+    invalid = sum(1 for i in range(args.count) if i % 4)
+    print(f"{args.threads}个线程并发校验{total}次（{args.count}个CD，其中{invalid}个有问题），"
+          f"{len(mismatches)}个报告与串行结果不一致，耗时{time.perf_counter() - start:.2f}秒", file=sys.stderr)
+    sys.exit(1 if mismatches else 0)
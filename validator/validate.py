@@ -4,144 +4,191 @@ import argparse
 import json
 import os
 import pathlib
-import pprint
-import re
 import sys
 
-sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
+from pyasn1.error import PyAsn1Error
+
+# 直接以脚本运行时把仓库根目录加入sys.path，作为包导入（python -m、安装后的命令行）时不需要
+if not __package__:
+    sys.path.append(os.path.join(pathlib.Path(__file__).parents[1]))
 
 from cd import query as cd_query
-from pki import query as pki_query
-from cd.parser import parse_cd
-from config.define import field_max_len
-from utils.string import add_colon_every_two_chars
+from cd.parser import parse_cd, parse_cd_tlv, unwrap_cd
+from chip.tlv.schema import TLVSchemaError
+from config.define import cd_result_cache_path, cd_signing_keys_path
+from dcl.client import get_client
 from cd.define import CertificationElements
+from pki.store import get_trust_store
+from utils.metrics import span
+from validator.rules import registry
 
-report_data = {}
-
-
-def add_report_data(name, data, problem):
-    global report_data
-    report_data[name] = {"数值": data, "问题": problem}
-
-
-def has_abnormal_spaces(string, name):
-    # 检查尾部是否含有空格
-    has_trailing_spaces = string != string.rstrip()
-
-    # 使用正则表达式检查是否包含两个及以上的连续空格
-    has_double_or_more_spaces = re.search(r'\s{2,}', string) is not None
+# 每项DCL数据对应的查询函数名，同步版本在dcl对象上调用，异步版本为cd.query中加async_前缀的函数
+_INPUT_QUERIES = {
+    "vendor_info": "query_vendor_info",
+    "model_info": "query_model_info",
+    "compliance_info": "query_compliance_info",
+}
 
-    # 返回两者的逻辑或结果
-    if has_trailing_spaces or has_double_or_more_spaces:
-        problem = f"有额外空格"
-        add_report_data(name, string, problem)
-        return True
-    return False
 
+def map_paa_with_name(cd: CertificationElements, store=None) -> tuple:
+    """查询CD中授权PAA的名称，返回与paa_authority_list一一对应的subjectAsText，不是已批准的PAA时为None
 
-def len_exceeded(string, name):
-    if len(string) > field_max_len:
-        problem = f"长度超出{field_max_len}"
-        add_report_data(name, string, problem)
-        return True
-    return False
+    不修改cd，同一个CD对象（如来自结果缓存）可在多个线程中共用。store为PaaTrustStore，默认使用进程内共享的实例。
+    """
+    store = store if store is not None else get_trust_store()
+    return tuple(store.subject_as_text(paa) for paa in cd.paa_authority_list)
 
 
-def check_vendor_info_valid(vendor_info_data: dict):
-    vendor_name = vendor_info_data["vendorName"]
-    vendor_name_invalid = has_abnormal_spaces(vendor_name, "vendorName") or len_exceeded(vendor_name, "vendorName")
-    return not vendor_name_invalid
+def dcl_query_paths(cd, rules=None) -> list:
+    """校验cd时rules需要查询的DCL路径，用于确定校验报告依赖的DCL数据版本"""
+    return cd_query.query_paths(cd, registry.select(rules).inputs)
 
 
-def check_models_valid(models_data: dict):
-    product_name = models_data["productName"]
-    product_label = models_data["productLabel"]
+def validate_cd(cd, dcl=cd_query, rules=None, timings=False, signature=None):
+    """校验CD内容与DCL信息
 
-    product_name_invalid = (has_abnormal_spaces(product_name, "productName") or
-                            len_exceeded(product_name, "productName"))
+    dcl为提供query_vendor_info/query_model_info/query_compliance_info的对象，默认为cd.query模块，
+    批量校验时可传入带去重缓存的实现。rules为要执行的规则名称，默认为全部规则，只查询这些规则需要的DCL数据。
+    timings为True时在报告中加入每条规则的耗时。signature为cd.signature.verify_cd_signature的结果(ok, msg)，
+    传入时签名校验失败的CD判定为无效。
+    """
+    rule_set = registry.select(rules)
+    results = {name: getattr(dcl, _INPUT_QUERIES[name])(cd) for name in rule_set.inputs}
+    return build_report(cd, results, rule_set, timings, signature)
 
-    product_label_invalid = (has_abnormal_spaces(product_label, "productLabel") or
-                             len_exceeded(product_label, "productLabel"))
-    return not (product_name_invalid or product_label_invalid)
 
+async def validate_cd_async(cd, client, rules=None, timings=False, signature=None):
+    """validate_cd的异步版本，通过AsyncDclClient并发查询规则需要的DCL数据
 
-def check_compliance_info_valid(compliance_info_data: dict, certificate_id):
-    cd_certificate_id = compliance_info_data["cDCertificateId"]
-    if cd_certificate_id != certificate_id:
-        problem = f"CD内ID{certificate_id}与DCL信息{cd_certificate_id}不匹配"
-        add_report_data(certificate_id, "certificateID", problem)
-        return False
-    return True
+    client应在多次调用之间共用（如服务中所有请求、批量校验中整批共用一个），以复用连接池。
+    """
+    rule_set = registry.select(rules)
+    queries = [getattr(cd_query, "async_" + _INPUT_QUERIES[name])(cd, client) for name in rule_set.inputs]
+    if len(queries) == 1:
+        # 只有一项查询时不需要gather创建任务的开销
+        results = [await queries[0]]
+    else:
+        import asyncio
 
+        results = await asyncio.gather(*queries)
+    return build_report(cd, dict(zip(rule_set.inputs, results)), rule_set, timings, signature)
 
-def map_paa_with_name(cd: CertificationElements):
-    ok, msg, root_certificates = pki_query.query_root_certificates()
-    for paa in cd.paa_authority_list:
-        paa_str = paa.hex().upper()
-        subject_key_id = add_colon_every_two_chars(paa_str)
-        for cert in root_certificates:
-            if cert["subjectKeyId"] == subject_key_id:
-                subject = cert["subject"]
-                ok, msg, certificate = pki_query.query_certificates(subject, subject_key_id)
-                certs = certificate["certs"]
-                for cert in certs:
-                    if cert["subjectKeyId"] == subject_key_id:
-                        subject_text = cert["subjectAsText"]
-                        cd.append_paa_authority_list_name(subject_text)
 
+def build_report(cd, results, rule_set=None, timings=False, signature=None):
+    """根据DCL查询结果{输入名称: (ok, msg, data)}执行规则并生成校验报告
 
-def validate_cd(cd):
-    global report_data
+    发现的问题记录在本次调用的report_data中，可在多个线程中同时校验。
+    """
+    rule_set = rule_set if rule_set is not None else registry.select()
     report_data = {}
     return_data = {}
     fail_msg = []
+    inputs = {}
 
     # return_data["cd_file_content"] = cd
-    ok, msg, vendor_info = cd_query.query_vendor_info(cd)
-    if not ok:
-        fail_msg.append(msg)
-    else:
-        return_data["dcl_vendor_info"] = vendor_info
-        check_vendor_info_valid(vendor_info)
-
-    ok, msg, model_info = cd_query.query_model_info(cd)
-    if not ok:
-        fail_msg.append(msg)
-    else:
-        return_data["dcl_model_info"] = model_info
-        check_models_valid(model_info)
-
-    ok, msg, compliance_info = cd_query.query_compliance_info(cd)
-    if not ok:
-        fail_msg.append(msg)
-    else:
-        return_data["dcl_compliance_info"] = compliance_info
-        check_compliance_info_valid(compliance_info, cd.certificate_id)
-
+    for name in rule_set.inputs:
+        ok, msg, data = results[name]
+        if not ok:
+            fail_msg.append(msg)
+        else:
+            return_data["dcl_" + name] = data
+            inputs[name] = data
+
+    rule_timings = {} if timings else None
+    with span("rules"):
+        rule_set.run(cd, inputs, report_data, rule_timings)
+
+    signature_ok, signature_msg = signature if signature is not None else (True, "")
     return_data["validator"] = {
-        "is_valid": False if report_data else True,
+        "is_valid": False if report_data or not signature_ok else True,
         "dcl_problem": fail_msg if fail_msg else None,
         "cd_problem": report_data if report_data else None,
     }
+    if signature is not None:
+        return_data["validator"]["signature_problem"] = None if signature_ok else signature_msg
+    if timings:
+        return_data["validator"]["rule_timings"] = rule_timings
     return return_data
 
 
-if __name__ == "__main__":
+def print_cd(cd, text=False, paa_names=()):
+    print(cd if text else cd.to_ascii_table(paa_names=paa_names))
+
+
+def main(argv=None):
+    """命令行入口，返回退出码
+
+    签名校验、结果缓存与DCL访问需要的模块在用到时才导入；--offline只解析CD（配置了签名证书时同时校验签名），
+    不访问DCL，--text以纯文本输出CD、不加载PrettyTable，适合在脚本中大量调用。
+    """
     parser = argparse.ArgumentParser(description="Parse CD File And Check Validity")
     parser.add_argument(
         "cd_file",
         type=str,
         help="CD File",
     )
-    args = parser.parse_args()
+    parser.add_argument("--rules", type=str, nargs="+", choices=registry.names(), help="Rules to run, defaults to all")
+    parser.add_argument("--timings", action="store_true", help="Report the time spent in each rule")
+    parser.add_argument("--signing-keys", type=str, default=cd_signing_keys_path,
+                        help="Directory of CD signing certificates to verify the signature, "
+                             "defaults to CD_SIGNING_KEYS_PATH")
+    parser.add_argument("--offline", action="store_true",
+                        help="Only parse the CD (and verify its signature with --signing-keys), without DCL access")
+    parser.add_argument("--text", action="store_true", help="Print the CD as plain text instead of a table")
+    args = parser.parse_args(argv)
     with open(args.cd_file, "rb") as f:
         file_bytes = f.read()
-    cd_data = parse_cd(file_bytes)
-    if not cd_data:
-        sys.exit(1)
-    map_paa_with_name(cd_data)
-    print(cd_data.to_ascii_table())
-    return_data = validate_cd(cd_data)
+
+    signature = None
+    if args.signing_keys:
+        from cd.signature import get_signing_key_store, verify_cd_signature
+
+    if args.offline:
+        cd_data = parse_cd(file_bytes)
+        if not cd_data:
+            return 1
+        print_cd(cd_data, args.text)
+        if args.signing_keys:
+            signature = verify_cd_signature(file_bytes, get_signing_key_store(args.signing_keys))
+            print(json.dumps({"signature_problem": None if signature[0] else signature[1]}, indent=4,
+                             ensure_ascii=False))
+            return 0 if signature[0] else 1
+        return 0
+
+    # 配置了CD_RESULT_CACHE_PATH时，重复校验同一文件直接使用上次的解析结果与报告
+    from validator.cache import ResultCache, cd_digest, dcl_data_version, report_variant
+
+    cache = ResultCache(cd_result_cache_path) if cd_result_cache_path else None
+    digest = cd_digest(file_bytes)
+    cd_data = cache.get_cd(digest) if cache else None
+    if cd_data is None:
+        try:
+            cd_tlv = unwrap_cd(file_bytes).econtent
+            cd_data = parse_cd_tlv(cd_tlv)
+        except (PyAsn1Error, TLVSchemaError) as e:
+            print(f"CD文件格式错误:{e}", file=sys.stderr)
+            return 1
+        if cache:
+            cache.put_cd(digest, cd_tlv)
+    paa_names = map_paa_with_name(cd_data)
+    print_cd(cd_data, args.text, paa_names)
+
+    variant = report_variant(args.rules, bool(args.signing_keys))
+    dcl_paths = dcl_query_paths(cd_data, args.rules)
+    use_report_cache = cache is not None and not args.timings
+    return_data = None
+    if use_report_cache:
+        return_data = cache.get_report(digest, variant, dcl_data_version(get_client(), dcl_paths))
+    if return_data is None:
+        if args.signing_keys:
+            signature = verify_cd_signature(file_bytes, get_signing_key_store(args.signing_keys))
+        return_data = validate_cd(cd_data, rules=args.rules, timings=args.timings, signature=signature)
+        if use_report_cache:
+            # 校验时查询的DCL数据可能刚写入缓存，版本要在校验之后读取
+            cache.put_report(digest, return_data, variant, dcl_data_version(get_client(), dcl_paths))
     print(json.dumps(return_data, indent=4, ensure_ascii=False))
-    sys.exit(0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())